@@ -0,0 +1,4 @@
+import logging
+
+# The library leaves logging configuration to the application.
+logging.getLogger(__name__).addHandler(logging.NullHandler())
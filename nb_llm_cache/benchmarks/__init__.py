@@ -0,0 +1 @@
+"""Benchmarks of the cache backends and features, and a load-test suite with a simulated LLM"""
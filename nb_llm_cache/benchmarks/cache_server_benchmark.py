@@ -0,0 +1,84 @@
+"""Benchmark of cache server hit latency and throughput with many client processes sharing it"""
+from ..cache_server import CacheServer
+from ..db_integrations.remote_cache import RemoteCache
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+
+def run_server(address, ready_event):
+  logging.getLogger().setLevel(logging.WARNING)
+  loop = asyncio.new_event_loop()
+  asyncio.set_event_loop(loop)
+  loop.run_until_complete(CacheServer().start(address))
+  ready_event.set()
+  loop.run_forever()
+
+def call_llm(prompt):
+  return f"Completion of {prompt}"
+
+def run_client(address, num_keys, calls, start_event, results):
+  logging.getLogger().setLevel(logging.WARNING)
+  cache = RemoteCache(address, pool_size=1)
+  cache.ping()
+  start_event.wait()
+  latencies = []
+  for i in range(calls):
+    start_time = time.perf_counter()
+    cache.call(call_llm, prompt=f"Prompt number {i % num_keys}")
+    latencies.append((time.perf_counter() - start_time) * 1e6)
+  results.put(latencies)
+
+def bench(address, num_processes, num_keys, calls):
+  start_event = multiprocessing.Event()
+  results = multiprocessing.Queue()
+  clients = [multiprocessing.Process(target=run_client,
+                                     args=(address, num_keys, calls, start_event, results))
+             for _ in range(num_processes)]
+  for process in clients:
+    process.start()
+  time.sleep(0.5)
+  start_time = time.perf_counter()
+  start_event.set()
+  latencies = sorted(latency for _ in clients for latency in results.get())
+  elapsed = time.perf_counter() - start_time
+  for process in clients:
+    process.join()
+  return {"calls_per_s": len(latencies) / elapsed,
+          "p50_us": latencies[len(latencies) // 2],
+          "p99_us": latencies[int(len(latencies) * 0.99) - 1]}
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark shared cache server hits.")
+  parser.add_argument("--processes", default="1,4,16,64", help="Comma separated numbers of client processes.")
+  parser.add_argument("--keys", type=int, default=1000, help="Number of distinct prompts.")
+  parser.add_argument("--calls", type=int, default=2000, help="Number of calls per process.")
+  parser.add_argument("--tcp", action="store_true", help="Listen on 127.0.0.1 instead of a Unix socket.")
+  args = parser.parse_args()
+  logging.getLogger().setLevel(logging.WARNING)
+
+  with tempfile.TemporaryDirectory() as directory:
+    address = "127.0.0.1:47211" if args.tcp else f"unix:{os.path.join(directory, 'cache.sock')}"
+    ready_event = multiprocessing.Event()
+    server = multiprocessing.Process(target=run_server, args=(address, ready_event), daemon=True)
+    server.start()
+    ready_event.wait()
+    # The first process to request a prompt fills the shared cache for all the others.
+    warm_cache = RemoteCache(address)
+    for i in range(args.keys):
+      warm_cache.call(call_llm, prompt=f"Prompt number {i}")
+    warm_cache.close()
+
+    print(f"{'processes':>10}{'calls/s':>12}{'p50 us':>10}{'p99 us':>10}")
+    for num_processes in [int(n) for n in args.processes.split(",")]:
+      result = bench(address, num_processes, args.keys, args.calls)
+      print(f"{num_processes:>10}{result['calls_per_s']:>12.0f}{result['p50_us']:>10.0f}"
+            f"{result['p99_us']:>10.0f}")
+    server.terminate()
+    server.join()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,93 @@
+"""Benchmark of import time, construction time and first call latency in fresh processes, as on a cold start"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Each scenario runs in a fresh interpreter, which prints its timings in milliseconds.
+SCENARIO = """
+import json, sys, time
+start = time.perf_counter()
+from nb_llm_cache.db_integrations import get_backend
+imported = time.perf_counter()
+backend = get_backend({backend!r})
+backend_imported = time.perf_counter()
+cache = backend(*{args!r})
+created = time.perf_counter()
+first_call = None
+if {call!r}:
+  cache.call(lambda prompt: "Completion of " + prompt, prompt="Prompt")
+  first_call = (time.perf_counter() - created) * 1000
+print(json.dumps({{"import_ms": (imported - start) * 1000,
+                  "backend_ms": (backend_imported - imported) * 1000,
+                  "construct_ms": (created - backend_imported) * 1000,
+                  "first_call_ms": first_call,
+                  "modules": len(sys.modules),
+                  "asyncio": "asyncio" in sys.modules}}))
+"""
+
+DEPENDENCY = """
+import json, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"import_ms": (time.perf_counter() - start) * 1000}}))
+"""
+
+def run(code, runs):
+  results = []
+  for _ in range(runs):
+    output = subprocess.run([sys.executable, "-c", code], check=True, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, universal_newlines=True).stdout
+    results.append(json.loads(output.splitlines()[-1]))
+  return {name: statistics.median(result[name] for result in results)
+          if isinstance(results[0][name], float) else results[0][name]
+          for name in results[0]}
+
+def dependency_import_ms(module, runs):
+  try:
+    return run(DEPENDENCY.format(module=module), runs)["import_ms"]
+  except subprocess.CalledProcessError:
+    return None
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark cold start costs.")
+  parser.add_argument("--runs", type=int, default=15, help="Number of fresh processes per scenario.")
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as directory:
+    scenarios = [
+      ("memory", [], True),
+      ("local", [os.path.join(directory, "cache.json")], True),
+      ("sqlite", [os.path.join(directory, "cache.db")], True),
+      ("log", [os.path.join(directory, "cache.log")], True),
+      # Creating a Firestore cache must neither import the client libraries nor connect,
+      # so it is not called: the first request pays for the client.
+      ("firestore", ["llm_cache"], False),
+    ]
+    print(f"{'backend':>10}{'import ms':>11}{'backend ms':>12}{'construct ms':>14}"
+          f"{'first call ms':>15}{'modules':>9}{'asyncio':>9}")
+    for backend, backend_args, call in scenarios:
+      code = SCENARIO.format(backend=backend, args=backend_args, call=call)
+      try:
+        result = run(code, args.runs)
+      except subprocess.CalledProcessError:
+        print(f"{backend:>10}  not available")
+        continue
+      first_call = f"{result['first_call_ms']:.2f}" if result["first_call_ms"] is not None else "-"
+      print(f"{backend:>10}{result['import_ms']:>11.1f}{result['backend_ms']:>12.1f}"
+            f"{result['construct_ms']:>14.2f}{first_call:>15}{result['modules']:>9}"
+            f"{str(result['asyncio']):>9}")
+
+  # The imports that are deferred to the first use, or never made by synchronous callers.
+  print()
+  print(f"{'deferred import':>30}{'ms':>9}")
+  for module in ["asyncio", "google.cloud.firestore", "google.oauth2.service_account"]:
+    import_ms = dependency_import_ms(module, args.runs)
+    print(f"{module:>30}{import_ms:>9.1f}" if import_ms is not None
+          else f"{module:>30}{'not installed':>17}")
+
+if __name__ == "__main__":
+  main()
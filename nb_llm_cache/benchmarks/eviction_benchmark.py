@@ -0,0 +1,51 @@
+"""Benchmark of the hit latency cost of access tracking and of sweep time against cache size"""
+from ..db_integrations.sqlite_cache import SQLiteCache
+from ..eviction import EvictionPolicy
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+def call_llm(prompt):
+  return f"Completion of {prompt}"
+
+def hit_us(cache, calls):
+  cache.call(call_llm, prompt="Hot prompt")
+  start_time = time.perf_counter()
+  for _ in range(calls):
+    cache.call(call_llm, prompt="Hot prompt")
+  return (time.perf_counter() - start_time) / calls * 1e6
+
+def main():
+  parser = argparse.ArgumentParser(description="Measure access tracking overhead and sweep time.")
+  parser.add_argument("--calls", type=int, default=20000, help="Number of hits per measurement.")
+  parser.add_argument("--entries", type=int, nargs="+", default=[10000, 100000],
+                      help="Cache sizes of the sweep measurements.")
+  args = parser.parse_args()
+  logging.getLogger().setLevel(logging.WARNING)
+
+  with tempfile.TemporaryDirectory() as directory:
+    print(f"{'tracking':<18}{'hit us':>10}")
+    for name, eviction in [("off", None),
+                           ("sampled 10%", EvictionPolicy(sweep_interval=None)),
+                           ("every hit", EvictionPolicy(sweep_interval=None, access_sample_rate=1.0))]:
+      cache = SQLiteCache(os.path.join(directory, f"hits-{len(name)}.db"), eviction=eviction)
+      print(f"{name:<18}{hit_us(cache, args.calls):>10.2f}")
+      cache.close()
+
+    print(f"\n{'entries':>10}{'expired':>10}{'evicted':>10}{'sweep s':>10}")
+    for entries in args.entries:
+      eviction = EvictionPolicy(max_entries=entries // 2, sweep_interval=None)
+      cache = SQLiteCache(os.path.join(directory, f"sweep-{entries}.db"), eviction=eviction)
+      cache.batch_call(call_llm, [{"prompt": f"Prompt {i}"} for i in range(entries // 4)],
+                       cache_ttl=0)
+      cache.batch_call(call_llm, [{"prompt": f"Prompt {i}"} for i in range(entries // 4, entries)])
+      start_time = time.perf_counter()
+      result = eviction.sweep()
+      print(f"{entries:>10}{result['expired']:>10}{result['evicted']:>10}"
+            f"{time.perf_counter() - start_time:>10.2f}")
+      cache.close()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,83 @@
+"""Deterministic stand-in for an LLM API with configurable latency, streaming rate and failures"""
+import hashlib
+import struct
+import threading
+import time
+
+class FakeLLMError(Exception):
+  """Transient failure of a fake LLM call."""
+
+class RateLimitError(FakeLLMError):
+  """Rejection of a fake LLM call for exceeding the rate limit."""
+  status_code = 429
+
+class FakeLLM:
+  """
+  Simulated LLM API whose completions, latencies and injected failures only depend on
+  the seed and the prompt, so runs are reproducible at any concurrency.
+
+  `complete` returns a completion after latency_ms plus the generation time of its
+  tokens at tokens_per_second; `stream` yields the tokens at that rate. Failures are
+  injected per attempt of a prompt with failure_rate, and rate limit rejections, which
+  carry status code 429, with rate_limit_rate.
+  """
+  def __init__(self, latency_ms=20.0, jitter_ms=0.0, tokens_per_second=2000.0,
+               completion_tokens=32, failure_rate=0.0, rate_limit_rate=0.0, seed=0):
+    self.latency_ms = latency_ms
+    self.jitter_ms = jitter_ms
+    self.tokens_per_second = tokens_per_second
+    self.completion_tokens = completion_tokens
+    self.failure_rate = failure_rate
+    self.rate_limit_rate = rate_limit_rate
+    self.seed = seed
+    self.calls = 0
+    self.failures = 0
+    self.rate_limited = 0
+    self._attempts = {}
+    self._lock = threading.Lock()
+
+  def _uniform(self, *parts):
+    digest = hashlib.blake2b(repr((self.seed,) + parts).encode("utf-8"), digest_size=8).digest()
+    return struct.unpack("<Q", digest)[0] / 2 ** 64
+
+  def _tokens(self, prompt):
+    digest = hashlib.sha256(f"{self.seed}:{prompt}".encode("utf-8")).hexdigest()
+    return [f" tok{digest[i % 60:i % 60 + 4]}" for i in range(self.completion_tokens)]
+
+  def _start(self, prompt):
+    """Counts an attempt, waits for the first token and raises the injected failure."""
+    with self._lock:
+      self.calls += 1
+      attempt = self._attempts.get(prompt, 0)
+      self._attempts[prompt] = attempt + 1
+    time.sleep((self.latency_ms + self.jitter_ms * self._uniform("jitter", prompt, attempt)) / 1000)
+    draw = self._uniform("failure", prompt, attempt)
+    if draw < self.rate_limit_rate:
+      with self._lock:
+        self.rate_limited += 1
+      raise RateLimitError("Rate limit exceeded.")
+    if draw < self.rate_limit_rate + self.failure_rate:
+      with self._lock:
+        self.failures += 1
+      raise FakeLLMError("Internal server error.")
+
+  def complete(self, model, prompt, max_tokens=None):
+    self._start(prompt)
+    tokens = self._tokens(prompt)[:max_tokens]
+    if self.tokens_per_second:
+      time.sleep(len(tokens) / self.tokens_per_second)
+    return {"model": model, "text": "".join(tokens), "usage": {"completion_tokens": len(tokens)}}
+
+  def stream(self, model, prompt, max_tokens=None):
+    self._start(prompt)
+    started = time.perf_counter()
+    for i, token in enumerate(self._tokens(prompt)[:max_tokens]):
+      if self.tokens_per_second:
+        # Sleeping until the token is due keeps the rate exact despite the sleep granularity.
+        delay = started + i / self.tokens_per_second - time.perf_counter()
+        if delay > 0:
+          time.sleep(delay)
+      yield token.encode("utf-8")
+
+  def stats(self):
+    return {"calls": self.calls, "failures": self.failures, "rate_limited": self.rate_limited}
@@ -0,0 +1,68 @@
+"""Micro-benchmark of cache key generation and the cache hit path"""
+from ..cache_keys import CanonicalKeyGenerator, KeyGenerator
+from ..db_integrations.memory_cache import MemoryCache
+import argparse
+import hashlib
+import json
+import logging
+import time
+
+def legacy_generate(func_name, cache_params):
+  hash_input = json.dumps([func_name, cache_params], sort_keys=True)
+  return hashlib.sha256(hash_input.encode()).hexdigest()
+
+def legacy_hit(cache, func_name, cache_params):
+  cache_key = legacy_generate(func_name, cache_params)
+  result_dict = json.loads(cache.get_from_cache(cache_key))
+  if result_dict["cache_params"] == cache_params:
+    return result_dict["response"]
+  return None
+
+def make_params(num_messages, message_length):
+  messages = [{"role": "user" if i % 2 else "assistant", "content": f"{i} " + "x" * message_length}
+              for i in range(num_messages)]
+  return {"model": "gpt-4", "openai_messages": messages, "temperature": 0.8}
+
+def time_us(fn, iterations):
+  start_time = time.perf_counter()
+  for _ in range(iterations):
+    fn()
+  return (time.perf_counter() - start_time) / iterations * 1e6
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark cache key generation and hit latency.")
+  parser.add_argument("--messages", default="1,10,100",
+                      help="Comma separated numbers of messages in the prompt history.")
+  parser.add_argument("--message-length", type=int, default=500)
+  parser.add_argument("--iterations", type=int, default=2000)
+  args = parser.parse_args()
+  logging.getLogger().setLevel(logging.WARNING)
+
+  configurations = [("default", KeyGenerator(), True),
+                    ("default, no params", KeyGenerator(), False),
+                    ("canonical sha256", CanonicalKeyGenerator("sha256"), False),
+                    ("canonical blake2b", CanonicalKeyGenerator("blake2b"), False)]
+  print(f"{'implementation':<22}{'messages':>10}{'key gen us':>14}{'hit path us':>14}")
+  for num_messages in [int(n) for n in args.messages.split(",")]:
+    cache_params = make_params(num_messages, args.message_length)
+    response = "y" * 1000
+
+    cache = MemoryCache()
+    cache.add_to_cache(legacy_generate("call_openai", cache_params),
+                       json.dumps({"response": response, "cache_params": cache_params}))
+    key_us = time_us(lambda: legacy_generate("call_openai", cache_params), args.iterations)
+    hit_us = time_us(lambda: legacy_hit(cache, "call_openai", cache_params), args.iterations)
+    print(f"{'previous release':<22}{num_messages:>10}{key_us:>14.2f}{hit_us:>14.2f}")
+
+    for name, generator, store_cache_params in configurations:
+      cache = MemoryCache(key_generator=generator, store_cache_params=store_cache_params)
+      cache_key, _ = generator.generate("call_openai", cache_params)
+      cache.add_to_cache(cache_key, cache._build_cache_value("call_openai", response, cache_params))
+      assert cache._get_cached_response("call_openai", cache_params)[0] == response
+      key_us = time_us(lambda: generator.generate("call_openai", cache_params), args.iterations)
+      hit_us = time_us(lambda: cache._get_cached_response("call_openai", cache_params),
+                       args.iterations)
+      print(f"{name:<22}{num_messages:>10}{key_us:>14.2f}{hit_us:>14.2f}")
+
+if __name__ == "__main__":
+  main()
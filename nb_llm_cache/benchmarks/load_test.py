@@ -0,0 +1,245 @@
+"""Load test of call and stream_call on a simulated LLM, reporting throughput, latency percentiles, memory and backend operations as JSON"""
+from ..db_integrations.local_cache import LocalCache
+from ..db_integrations.log_cache import LogCache
+from ..db_integrations.memory_cache import MemoryCache
+from ..db_integrations.sqlite_cache import SQLiteCache
+from .fake_llm import FakeLLM
+from .stand_in_backends import StandInFirestoreCache, StandInKeyValueCache
+from .workloads import make_requests
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+try:
+  import resource
+except ImportError:
+  resource = None
+
+BACKENDS = ["memory", "local", "log", "sqlite", "firestore", "kv"]
+BACKEND_OPS = ["get_from_cache", "get_many_from_cache", "add_to_cache", "add_many_to_cache",
+               "append_to_cache", "get_appended_from_cache"]
+# Lower is better for these result fields, higher for throughput_rps.
+COMPARED_FIELDS = ["p50_ms", "p99_ms", "backend_ops_per_request"]
+
+def make_cache(backend, directory, args):
+  if backend == "memory":
+    return MemoryCache()
+  if backend == "local":
+    return LocalCache(os.path.join(directory, "local_cache.json"))
+  if backend == "log":
+    return LogCache(os.path.join(directory, "log_cache.log"))
+  if backend == "sqlite":
+    return SQLiteCache(os.path.join(directory, "sqlite_cache.db"))
+  if backend == "firestore":
+    return StandInFirestoreCache(rtt_ms=args.rtt_ms)
+  return StandInKeyValueCache(rtt_ms=args.rtt_ms)
+
+def count_backend_ops(cache):
+  """
+  Wraps the backend operations of a cache instance to count them. Operations called by
+  other operations, such as the default add_many_to_cache, are only counted once.
+  """
+  counts = dict.fromkeys(BACKEND_OPS, 0)
+  lock = threading.Lock()
+  state = threading.local()
+
+  def counted(name, method):
+    def wrapper(*args, **kwargs):
+      depth = getattr(state, "depth", 0)
+      if depth == 0:
+        with lock:
+          counts[name] += 1
+      state.depth = depth + 1
+      try:
+        return method(*args, **kwargs)
+      finally:
+        state.depth = depth
+    return wrapper
+
+  for name in BACKEND_OPS:
+    setattr(cache, name, counted(name, getattr(cache, name)))
+  return counts
+
+def percentile(sorted_values, q):
+  if not sorted_values:
+    return None
+  return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def peak_rss_mib():
+  if resource is None:
+    return None
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # ru_maxrss is in bytes on macOS and in KiB elsewhere.
+  return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+def run(cache, llm, mode, prompts, concurrency, args):
+  backoff_intervals = [args.backoff_ms / 1000] * args.retries
+  latencies = []
+  first_chunk_latencies = []
+  errors = []
+  lock = threading.Lock()
+
+  def request(prompt):
+    start_time = time.perf_counter()
+    first_chunk = None
+    try:
+      if mode == "stream":
+        for _ in cache.stream_call(llm.stream, num_retries_call=args.retries,
+                                   backoff_intervals_call=backoff_intervals, model="fake",
+                                   prompt=prompt, max_tokens=args.completion_tokens):
+          if first_chunk is None:
+            first_chunk = time.perf_counter() - start_time
+      else:
+        cache.call(llm.complete, num_retries_call=args.retries,
+                   backoff_intervals_call=backoff_intervals, model="fake", prompt=prompt,
+                   max_tokens=args.completion_tokens)
+    except Exception as e:
+      with lock:
+        errors.append(type(e).__name__)
+      return
+    latency = time.perf_counter() - start_time
+    with lock:
+      latencies.append(latency * 1000)
+      if first_chunk is not None:
+        first_chunk_latencies.append(first_chunk * 1000)
+
+  ops = count_backend_ops(cache)
+  if args.trace_memory:
+    tracemalloc.start()
+  start_time = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=concurrency) as executor:
+    list(executor.map(request, prompts))
+  elapsed = time.perf_counter() - start_time
+  traced_peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+  if args.trace_memory:
+    tracemalloc.stop()
+
+  latencies.sort()
+  first_chunk_latencies.sort()
+  completions = llm.calls - llm.failures - llm.rate_limited
+  backend_ops = sum(ops.values())
+  result = {"mode": mode,
+            "concurrency": concurrency,
+            "requests": len(prompts),
+            "errors": len(errors),
+            "seconds": elapsed,
+            "throughput_rps": len(prompts) / elapsed,
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "first_chunk_p50_ms": percentile(first_chunk_latencies, 0.50),
+            "first_chunk_p99_ms": percentile(first_chunk_latencies, 0.99),
+            "hit_rate": (len(prompts) - completions - len(errors)) / len(prompts),
+            "llm": llm.stats(),
+            "backend_ops": ops,
+            "backend_ops_per_request": backend_ops / len(prompts),
+            "peak_rss_mib": peak_rss_mib(),
+            "traced_peak_mib": traced_peak / 2 ** 20 if traced_peak is not None else None}
+  store = getattr(cache, "store", None)
+  if store is not None:
+    result["round_trips_per_request"] = store.round_trips / len(prompts)
+  return result
+
+def compare(results, baseline, tolerance):
+  """Returns a description of every result that regressed by more than tolerance against the baseline."""
+  baseline_results = {(r["backend"], r["mode"], r["concurrency"]): r for r in baseline["results"]}
+  regressions = []
+  for result in results:
+    name = f"{result['backend']} {result['mode']} x{result['concurrency']}"
+    previous = baseline_results.get((result["backend"], result["mode"], result["concurrency"]))
+    if previous is None:
+      continue
+    if result["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+      regressions.append(f"{name}: throughput_rps {previous['throughput_rps']:.1f} -> "
+                         f"{result['throughput_rps']:.1f}")
+    for field in COMPARED_FIELDS:
+      if previous.get(field) and result[field] > previous[field] * (1 + tolerance):
+        regressions.append(f"{name}: {field} {previous[field]:.3f} -> {result[field]:.3f}")
+  return regressions
+
+def main():
+  parser = argparse.ArgumentParser(description="Load test LLMCache with a simulated LLM.")
+  parser.add_argument("--backends", default="memory,firestore",
+                      help=f"Comma separated backends among {', '.join(BACKENDS)}.")
+  parser.add_argument("--modes", default="call,stream", help="Comma separated call and stream modes.")
+  parser.add_argument("--concurrency", default="1,8,32", help="Comma separated numbers of threads.")
+  parser.add_argument("--requests", type=int, default=2000, help="Number of requests per run.")
+  parser.add_argument("--keys", type=int, default=500, help="Number of distinct prompts.")
+  parser.add_argument("--zipf-s", type=float, default=1.1, help="Exponent of the key popularity.")
+  parser.add_argument("--prompt-words", default="16,2048", help="Minimum and maximum prompt size in words.")
+  parser.add_argument("--latency-ms", type=float, default=20.0, help="LLM latency before the first token.")
+  parser.add_argument("--jitter-ms", type=float, default=10.0, help="Maximum extra LLM latency.")
+  parser.add_argument("--tokens-per-second", type=float, default=2000.0, help="LLM generation rate.")
+  parser.add_argument("--completion-tokens", type=int, default=32, help="Tokens per completion.")
+  parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of failed LLM attempts.")
+  parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                      help="Fraction of LLM attempts rejected with status 429.")
+  parser.add_argument("--retries", type=int, default=3, help="Retries of failed LLM calls.")
+  parser.add_argument("--backoff-ms", type=float, default=5.0, help="Wait before each retry.")
+  parser.add_argument("--rtt-ms", type=float, default=1.0, help="Round trip time of the stand-in stores.")
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument("--trace-memory", action="store_true",
+                      help="Report the peak of Python allocations, at a large speed cost.")
+  parser.add_argument("--output", help="Path of the JSON results.")
+  parser.add_argument("--baseline", help="JSON results of a previous run to compare against.")
+  parser.add_argument("--tolerance", type=float, default=0.2,
+                      help="Relative regression against the baseline that fails the run.")
+  args = parser.parse_args()
+  # Injected failures are logged as errors by every retried call.
+  logging.getLogger().setLevel(logging.CRITICAL)
+
+  backends = args.backends.split(",")
+  for backend in backends:
+    if backend not in BACKENDS:
+      parser.error(f"Unknown backend: {backend}.")
+  min_words, max_words = (int(n) for n in args.prompt_words.split(","))
+  prompts = make_requests(args.requests, args.keys, args.zipf_s, (min_words, max_words), args.seed)
+
+  results = []
+  print(f"{'backend':<11}{'mode':<8}{'threads':>8}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}"
+        f"{'p99 ms':>9}{'hit rate':>10}{'ops/req':>9}{'errors':>8}{'RSS MiB':>9}")
+  for backend in backends:
+    for mode in args.modes.split(","):
+      for concurrency in [int(n) for n in args.concurrency.split(",")]:
+        with tempfile.TemporaryDirectory() as directory:
+          cache = make_cache(backend, directory, args)
+          llm = FakeLLM(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                        tokens_per_second=args.tokens_per_second,
+                        completion_tokens=args.completion_tokens, failure_rate=args.failure_rate,
+                        rate_limit_rate=args.rate_limit_rate, seed=args.seed)
+          result = dict(backend=backend, **run(cache, llm, mode, prompts, concurrency, args))
+          if hasattr(cache, "close"):
+            cache.close()
+        results.append(result)
+        print(f"{backend:<11}{mode:<8}{concurrency:>8}{result['throughput_rps']:>10.0f}"
+              f"{result['p50_ms'] or 0:>9.2f}{result['p95_ms'] or 0:>9.2f}{result['p99_ms'] or 0:>9.2f}"
+              f"{result['hit_rate']:>10.1%}{result['backend_ops_per_request']:>9.2f}"
+              f"{result['errors']:>8}{result['peak_rss_mib'] or 0:>9.0f}")
+
+  report = {"benchmark": "load_test",
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": vars(args),
+            "results": results}
+  if args.output:
+    with open(args.output, "w", encoding="utf-8") as file:
+      json.dump(report, file, indent=2)
+  if args.baseline:
+    with open(args.baseline, encoding="utf-8") as file:
+      regressions = compare(results, json.load(file), args.tolerance)
+    for regression in regressions:
+      print(f"Regression: {regression}")
+    if regressions:
+      sys.exit(1)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,97 @@
+"""Benchmark comparing the local cache backends at different cache sizes"""
+from ..db_integrations.local_cache import LocalCache
+from ..db_integrations.log_cache import LogCache
+from ..db_integrations.mmap_cache import MmapCache
+import argparse
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+def make_entry(i):
+  key = hashlib.sha256(str(i).encode()).hexdigest()
+  value = {"response": f"Cached completion number {i}.",
+           "cache_params": {"model": "gpt-4",
+                            "openai_messages": [{"content": f"Prompt number {i}", "role": "user"}],
+                            "temperature": 0.8}}
+  return key, value
+
+def time_per_op(fn, keys):
+  start_time = time.perf_counter()
+  for key in keys:
+    fn(key)
+  return (time.perf_counter() - start_time) / len(keys) * 1000
+
+def bench_local_cache(directory, size, samples):
+  path = os.path.join(directory, "local_cache.json")
+  # Populating through add_to_cache is quadratic, so the file is written directly.
+  with open(path, "w", encoding="utf-8") as file:
+    json.dump(dict(make_entry(i) for i in range(size)), file, indent=2)
+  start_time = time.perf_counter()
+  cache = LocalCache(file_path=path)
+  open_ms = (time.perf_counter() - start_time) * 1000
+  hit_keys = [make_entry(i * (size // samples))[0] for i in range(samples)]
+  miss_keys = [make_entry(size + i)[0] for i in range(samples)]
+  value = json.dumps(make_entry(0)[1])
+  return {"open_ms": open_ms,
+          "hit_ms": time_per_op(cache.get_from_cache, hit_keys),
+          "miss_ms": time_per_op(cache.get_from_cache, miss_keys),
+          "insert_ms": time_per_op(lambda key: cache.add_to_cache(key, value), miss_keys)}
+
+def bench_log_cache(directory, size, samples):
+  path = os.path.join(directory, "log_cache.log")
+  with LogCache(file_path=path) as cache:
+    for i in range(size):
+      key, value = make_entry(i)
+      cache.add_to_cache(key, json.dumps(value))
+  start_time = time.perf_counter()
+  cache = LogCache(file_path=path)
+  open_ms = (time.perf_counter() - start_time) * 1000
+  hit_keys = [make_entry(i * (size // samples))[0] for i in range(samples)]
+  miss_keys = [make_entry(size + i)[0] for i in range(samples)]
+  value = json.dumps(make_entry(0)[1])
+  result = {"open_ms": open_ms,
+            "hit_ms": time_per_op(cache.get_from_cache, hit_keys),
+            "miss_ms": time_per_op(cache.get_from_cache, miss_keys),
+            "insert_ms": time_per_op(lambda key: cache.add_to_cache(key, value), miss_keys)}
+  cache.close()
+  return result
+
+def bench_mmap_cache(directory, size, samples):
+  path = os.path.join(directory, "mmap_cache.bin")
+  MmapCache.build(path, ((key, json.dumps(value)) for key, value in map(make_entry, range(size))))
+  start_time = time.perf_counter()
+  cache = MmapCache(file_path=path)
+  open_ms = (time.perf_counter() - start_time) * 1000
+  hit_keys = [make_entry(i * (size // samples))[0] for i in range(samples)]
+  miss_keys = [make_entry(size + i)[0] for i in range(samples)]
+  result = {"open_ms": open_ms,
+            "hit_ms": time_per_op(cache.get_from_cache, hit_keys),
+            "miss_ms": time_per_op(cache.get_from_cache, miss_keys),
+            "insert_ms": float("nan")}
+  cache.close()
+  return result
+
+def main():
+  parser = argparse.ArgumentParser(description="Compare local cache backend latencies.")
+  parser.add_argument("--sizes", default="1000,100000,1000000",
+                      help="Comma separated numbers of cached entries.")
+  parser.add_argument("--samples", type=int, default=20,
+                      help="Number of lookups and inserts measured per size.")
+  args = parser.parse_args()
+  logging.getLogger().setLevel(logging.WARNING)
+
+  print(f"{'backend':<12}{'entries':>10}{'open ms':>12}{'hit ms':>12}{'miss ms':>12}{'insert ms':>12}")
+  for size in [int(size) for size in args.sizes.split(",")]:
+    samples = min(args.samples, size)
+    for name, bench in [("LocalCache", bench_local_cache), ("LogCache", bench_log_cache),
+                        ("MmapCache", bench_mmap_cache)]:
+      with tempfile.TemporaryDirectory() as directory:
+        res = bench(directory, size, samples)
+      print(f"{name:<12}{size:>10}{res['open_ms']:>12.2f}{res['hit_ms']:>12.3f}"
+            f"{res['miss_ms']:>12.3f}{res['insert_ms']:>12.3f}")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,81 @@
+"""Stress benchmark of LocalCache with concurrent writer processes sharing one file"""
+from ..db_integrations.local_cache import LocalCache
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+
+def make_value(writer, i):
+  return json.dumps({"response": f"Completion {i} of writer {writer}.",
+                     "cache_params": {"model": "gpt-4", "writer": writer, "i": i}})
+
+def make_key(writer, i):
+  return hashlib.sha256(f"{writer}-{i}".encode()).hexdigest()
+
+def run_writer(path, writer, num_entries, start_event):
+  logging.getLogger().setLevel(logging.WARNING)
+  cache = LocalCache(file_path=path)
+  start_event.wait()
+  for i in range(num_entries):
+    cache.add_to_cache(make_key(writer, i), make_value(writer, i))
+
+def run_reader(path, stop_event, results):
+  logging.getLogger().setLevel(logging.WARNING)
+  cache = LocalCache(file_path=path)
+  reads = errors = 0
+  while not stop_event.is_set():
+    try:
+      cache.get_from_cache(make_key(0, 0))
+      reads += 1
+    except Exception:
+      errors += 1
+  results.put((reads, errors))
+
+def bench(num_writers, num_entries):
+  with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, "local_cache.json")
+    LocalCache(file_path=path)
+    start_event = multiprocessing.Event()
+    stop_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    writers = [multiprocessing.Process(target=run_writer, args=(path, writer, num_entries, start_event))
+               for writer in range(num_writers)]
+    reader = multiprocessing.Process(target=run_reader, args=(path, stop_event, results))
+    for process in writers + [reader]:
+      process.start()
+    start_time = time.perf_counter()
+    start_event.set()
+    for process in writers:
+      process.join()
+    elapsed = time.perf_counter() - start_time
+    stop_event.set()
+    reads, read_errors = results.get()
+    reader.join()
+    with open(path, "r", encoding="utf-8") as file:
+      stored = len(json.load(file))
+  return {"writes_per_s": num_writers * num_entries / elapsed,
+          "lost": num_writers * num_entries - stored,
+          "reads_per_s": reads / elapsed,
+          "read_errors": read_errors}
+
+def main():
+  parser = argparse.ArgumentParser(description="Stress LocalCache with concurrent writer processes.")
+  parser.add_argument("--writers", default="1,2,4,8,16,32,64",
+                      help="Comma separated numbers of concurrent writer processes.")
+  parser.add_argument("--entries", type=int, default=20,
+                      help="Number of entries written by each writer.")
+  args = parser.parse_args()
+  logging.getLogger().setLevel(logging.WARNING)
+
+  print(f"{'writers':>8}{'writes/s':>12}{'lost':>8}{'reads/s':>12}{'read errors':>14}")
+  for num_writers in [int(n) for n in args.writers.split(",")]:
+    res = bench(num_writers, args.entries)
+    print(f"{num_writers:>8}{res['writes_per_s']:>12.1f}{res['lost']:>8}"
+          f"{res['reads_per_s']:>12.1f}{res['read_errors']:>14}")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,75 @@
+"""Benchmark of LogCache compaction while streams are appended, checking that no appended data is lost or duplicated"""
+from ..db_integrations.log_cache import LogCache
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+
+class AppendDuringCompactionCache(LogCache):
+  """LogCache appending to a key while compaction copies it, after the index snapshot was taken."""
+  def __init__(self, file_path, key, data):
+    super().__init__(file_path)
+    self.key = key
+    self.data = data
+
+  def _read_entry(self, entry):
+    if self.data is not None and self._compaction_lock.locked():
+      data, self.data = self.data, None
+      self.append_to_cache(self.key, data)
+    return super()._read_entry(entry)
+
+def check_append_during_compaction(directory):
+  cache = AppendDuringCompactionCache(os.path.join(directory, "check.log"), "stream", b"C")
+  cache.append_to_cache("stream", b"A")
+  cache.append_to_cache("stream", b"B")
+  cache.compact()
+  assert cache.get_appended_from_cache("stream") == b"ABC", cache.get_appended_from_cache("stream")
+  cache.close()
+  assert LogCache(os.path.join(directory, "check.log")).get_appended_from_cache("stream") == b"ABC"
+
+def bench(directory, writers, keys, chunks, chunk_length):
+  cache = LogCache(os.path.join(directory, f"bench_{writers}.log"))
+  expected = {}
+
+  def write(writer):
+    for i in range(chunks):
+      key = f"stream-{writer}-{i % keys}"
+      chunk = f"{writer}:{i};".ljust(chunk_length, "x").encode("utf-8")
+      cache.append_to_cache(key, chunk)
+      expected[key] = expected.get(key, b"") + chunk
+
+  threads = [threading.Thread(target=write, args=(writer,)) for writer in range(writers)]
+  start_time = time.perf_counter()
+  for thread in threads:
+    thread.start()
+  compactions = 0
+  while any(thread.is_alive() for thread in threads):
+    cache.compact()
+    compactions += 1
+  elapsed = time.perf_counter() - start_time
+  for key, data in expected.items():
+    assert cache.get_appended_from_cache(key) == data, f"Appended data of {key} is corrupted."
+  cache.close()
+  return {"appends_per_s": writers * chunks / elapsed, "compactions": compactions}
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark LogCache compaction under appends.")
+  parser.add_argument("--writers", default="1,4,16", help="Comma separated numbers of appending threads.")
+  parser.add_argument("--keys", type=int, default=8, help="Number of streams per thread.")
+  parser.add_argument("--chunks", type=int, default=2000, help="Number of appends per thread.")
+  parser.add_argument("--chunk-length", type=int, default=64)
+  args = parser.parse_args()
+  logging.getLogger().setLevel(logging.WARNING)
+
+  with tempfile.TemporaryDirectory() as directory:
+    check_append_during_compaction(directory)
+    print("Append during compaction: ok")
+    print(f"{'writers':>8}{'appends/s':>12}{'compactions':>13}")
+    for writers in [int(n) for n in args.writers.split(",")]:
+      result = bench(directory, writers, args.keys, args.chunks, args.chunk_length)
+      print(f"{writers:>8}{result['appends_per_s']:>12.0f}{result['compactions']:>13}")
+
+if __name__ == "__main__":
+  main()
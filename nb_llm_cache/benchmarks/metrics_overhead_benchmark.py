@@ -0,0 +1,56 @@
+"""Benchmark measuring the hit and miss latency of LLMCache.call with and without metrics"""
+from ..llm_cache import LLMCache
+from ..metrics import CacheMetrics
+import argparse
+import itertools
+import logging
+import time
+
+class DictCache(LLMCache):
+  """In-memory cache isolating the overhead of the call path."""
+  def __init__(self, **kwargs):
+    super().__init__(**kwargs)
+    self.entries = {}
+
+  def get_from_cache(self, key):
+    return self.entries.get(key, "")
+
+  def add_to_cache(self, key, value):
+    self.entries[key] = value
+    return True
+
+def call_llm(model, openai_messages, temperature):
+  return f"Completion of {openai_messages[0]['content']}"
+
+def best_us_per_call(fn, calls, repeats):
+  best = float("inf")
+  for _ in range(repeats):
+    start_time = time.perf_counter()
+    for i in range(calls):
+      fn(i)
+    best = min(best, (time.perf_counter() - start_time) / calls * 1e6)
+  return best
+
+def main():
+  parser = argparse.ArgumentParser(description="Measure the overhead of cache metrics.")
+  parser.add_argument("--calls", type=int, default=20000, help="Number of calls per measurement.")
+  parser.add_argument("--repeats", type=int, default=5, help="Number of measurements, the best is kept.")
+  args = parser.parse_args()
+  logging.getLogger().setLevel(logging.WARNING)
+
+  def kwargs(i):
+    return {"model": "gpt-4", "openai_messages": [{"content": f"Prompt number {i}", "role": "user"}],
+            "temperature": 0.8}
+
+  print(f"{'metrics':<10}{'hit us':>10}{'miss us':>10}")
+  for name, metrics in [("off", None), ("on", CacheMetrics())]:
+    cache = DictCache(metrics=metrics)
+    cache.call(call_llm, **kwargs(0))
+    hit_us = best_us_per_call(lambda i: cache.call(call_llm, **kwargs(0)), args.calls, args.repeats)
+    fresh_ids = itertools.count(1)
+    miss_us = best_us_per_call(lambda i: cache.call(call_llm, **kwargs(next(fresh_ids))),
+                               args.calls, args.repeats)
+    print(f"{name:<10}{hit_us:>10.2f}{miss_us:>10.2f}")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,54 @@
+"""Benchmark of export, import and direct migration throughput and peak memory between SQLite caches"""
+from ..db_integrations.sqlite_cache import SQLiteCache
+from ..migration import export_cache, import_cache, migrate_cache
+import argparse
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+
+def measure(label, entries, run):
+  tracemalloc.start()
+  start_time = time.perf_counter()
+  run()
+  elapsed = time.perf_counter() - start_time
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  print(f"{label:<10}{elapsed:>10.2f}{entries / elapsed:>14.0f}{peak / 2 ** 20:>14.1f}")
+
+def main():
+  parser = argparse.ArgumentParser(description="Measure export, import and migration throughput.")
+  parser.add_argument("--entries", type=int, default=200000, help="Number of cached entries.")
+  parser.add_argument("--value-bytes", type=int, default=1000, help="Size of each value.")
+  parser.add_argument("--workers", type=int, default=4, help="Number of worker threads.")
+  parser.add_argument("--chunk-size", type=int, default=10000, help="Number of entries per chunk.")
+  args = parser.parse_args()
+  logging.getLogger().setLevel(logging.WARNING)
+
+  with tempfile.TemporaryDirectory() as directory:
+    source = SQLiteCache(os.path.join(directory, "source.db"))
+    padding = "x" * args.value_bytes
+    for start in range(0, args.entries, 10000):
+      source.add_many_to_cache(
+        {hashlib.sha256(str(i).encode()).hexdigest(): json.dumps({"response": padding, "i": i})
+         for i in range(start, min(start + 10000, args.entries))}, func_name="call_llm")
+    dump_dir = os.path.join(directory, "dump")
+
+    print(f"{'step':<10}{'seconds':>10}{'entries/s':>14}{'peak MiB':>14}")
+    measure("export", args.entries,
+            lambda: export_cache(source, dump_dir, workers=args.workers, partition_digits=1,
+                                 chunk_size=args.chunk_size))
+    dump_bytes = sum(os.path.getsize(os.path.join(dump_dir, name)) for name in os.listdir(dump_dir))
+    target = SQLiteCache(os.path.join(directory, "imported.db"))
+    measure("import", args.entries, lambda: import_cache(target, dump_dir, workers=args.workers))
+    target = SQLiteCache(os.path.join(directory, "migrated.db"))
+    measure("migrate", args.entries,
+            lambda: migrate_cache(source, target, workers=args.workers, partition_digits=1))
+    print(f"Dump size: {dump_bytes / 2 ** 20:.1f} MiB for {args.entries} entries.")
+    source.close()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,55 @@
+"""Benchmark of MongoCache read and write throughput in single and batch mode"""
+from ..db_integrations.mongo_cache import MongoCache
+import argparse
+import hashlib
+import json
+import logging
+import time
+
+def make_entry(i):
+  key = hashlib.sha256(str(i).encode()).hexdigest()
+  value = {"response": f"Cached completion number {i}. " * 20,
+           "params_fingerprint": f"{i:x}"}
+  return key, json.dumps(value)
+
+def rate(fn, count):
+  start_time = time.perf_counter()
+  fn()
+  return count / (time.perf_counter() - start_time)
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark MongoCache throughput.")
+  parser.add_argument("--uri", default="mongodb://localhost:27017")
+  parser.add_argument("--mock", action="store_true",
+                      help="Use an in-process mongomock client instead of --uri.")
+  parser.add_argument("--entries", type=int, default=5000)
+  parser.add_argument("--batch-size", type=int, default=500)
+  args = parser.parse_args()
+  logging.getLogger().setLevel(logging.WARNING)
+
+  if args.mock:
+    import mongomock
+    client = mongomock.MongoClient()
+  else:
+    client = None
+  cache = MongoCache(args.uri, database_name="nb_llm_cache_benchmark",
+                     collection_name="entries", client=client)
+  cache._collection.delete_many({})
+  items = dict(make_entry(i) for i in range(args.entries))
+  keys = list(items)
+  batches = [keys[i:i + args.batch_size] for i in range(0, len(keys), args.batch_size)]
+
+  results = [
+    ("write single", rate(lambda: [cache.add_to_cache(key, items[key]) for key in keys], len(keys))),
+    ("write batch", rate(lambda: [cache.add_many_to_cache({key: items[key] for key in batch})
+                                  for batch in batches], len(keys))),
+    ("read single", rate(lambda: [cache.get_from_cache(key) for key in keys], len(keys))),
+    ("read batch", rate(lambda: [cache.get_many_from_cache(batch) for batch in batches], len(keys))),
+  ]
+  print(f"{'mode':<14}{'entries/s':>12}")
+  for name, entries_per_s in results:
+    print(f"{name:<14}{entries_per_s:>12.0f}")
+  cache._collection.drop()
+
+if __name__ == "__main__":
+  main()
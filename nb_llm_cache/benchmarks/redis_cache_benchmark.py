@@ -0,0 +1,69 @@
+"""Benchmark of RedisCache hit latency percentiles at several concurrency levels"""
+from ..db_integrations.redis_cache import RedisCache
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import hashlib
+import json
+import logging
+import random
+import time
+
+def make_entry(i):
+  key = hashlib.sha256(str(i).encode()).hexdigest()
+  value = {"response": f"Cached completion number {i}. " * 20,
+           "params_fingerprint": f"{i:x}"}
+  return key, json.dumps(value)
+
+def percentile(latencies, fraction):
+  return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+def measure(lookup, keys, threads, requests_per_thread):
+  def worker(seed):
+    rng = random.Random(seed)
+    latencies = []
+    for _ in range(requests_per_thread):
+      start_time = time.perf_counter()
+      lookup(rng.choice(keys))
+      latencies.append((time.perf_counter() - start_time) * 1000)
+    return latencies
+  start_time = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=threads) as executor:
+    latencies = sorted(sum(executor.map(worker, range(threads)), []))
+  elapsed = time.perf_counter() - start_time
+  return percentile(latencies, 0.5), percentile(latencies, 0.99), len(latencies) / elapsed
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark RedisCache hit latency.")
+  parser.add_argument("--url", default="redis://localhost:6379/0")
+  parser.add_argument("--fake", action="store_true",
+                      help="Use an in-process fakeredis server instead of --url.")
+  parser.add_argument("--entries", type=int, default=10000)
+  parser.add_argument("--threads", default="1,4,16,64",
+                      help="Comma separated numbers of concurrent client threads.")
+  parser.add_argument("--requests", type=int, default=500,
+                      help="Number of lookups per thread.")
+  parser.add_argument("--batch-size", type=int, default=100,
+                      help="Number of keys per get_many_from_cache lookup.")
+  parser.add_argument("--compression", default=None)
+  args = parser.parse_args()
+  logging.getLogger().setLevel(logging.WARNING)
+
+  if args.fake:
+    import fakeredis
+    cache = RedisCache(client=fakeredis.FakeRedis(), compression=args.compression)
+  else:
+    cache = RedisCache(args.url, compression=args.compression, max_connections=256)
+  items = dict(make_entry(i) for i in range(args.entries))
+  cache.add_many_to_cache(items)
+  keys = list(items)
+  batches = [keys[i:i + args.batch_size] for i in range(0, len(keys), args.batch_size)]
+
+  print(f"{'lookup':<10}{'threads':>8}{'p50 ms':>10}{'p99 ms':>10}{'lookups/s':>12}")
+  for threads in [int(n) for n in args.threads.split(",")]:
+    for name, lookup, choices in [("get", cache.get_from_cache, keys),
+                                  (f"mget {args.batch_size}", cache.get_many_from_cache, batches)]:
+      p50, p99, rate = measure(lookup, choices, threads, args.requests)
+      print(f"{name:<10}{threads:>8}{p50:>10.3f}{p99:>10.3f}{rate:>12.0f}")
+
+if __name__ == "__main__":
+  main()
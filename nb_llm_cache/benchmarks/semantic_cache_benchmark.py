@@ -0,0 +1,66 @@
+"""Benchmark reporting recall and lookup latency of the semantic cache index, exhaustive and IVF"""
+from ..semantic_cache import VectorIndex
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+
+def make_vectors(rng, size, dimension, clusters):
+  # Prompts form topics, so the vectors are drawn around cluster centres.
+  centres = rng.standard_normal((clusters, dimension)).astype(np.float32)
+  vectors = centres[rng.integers(0, clusters, size)]
+  vectors += 0.5 * rng.standard_normal((size, dimension)).astype(np.float32)
+  return vectors
+
+def measure(index, queries, expected):
+  latencies = []
+  hits = 0
+  for query, key in zip(queries, expected):
+    start_time = time.perf_counter()
+    result = index.search(query)
+    latencies.append((time.perf_counter() - start_time) * 1000)
+    hits += bool(result) and result[0][0] == key
+  latencies.sort()
+  return hits / len(queries), latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1]
+
+def main():
+  parser = argparse.ArgumentParser(description="Measure semantic cache recall and lookup latency.")
+  parser.add_argument("--sizes", default="10000,100000,1000000",
+                      help="Comma separated numbers of indexed entries.")
+  parser.add_argument("--dimension", type=int, default=128, help="Dimension of the embeddings.")
+  parser.add_argument("--queries", type=int, default=200, help="Number of lookups per size.")
+  parser.add_argument("--nprobe", type=int, default=16, help="Inverted lists scanned per IVF lookup.")
+  args = parser.parse_args()
+  logging.getLogger().setLevel(logging.WARNING)
+  rng = np.random.default_rng(0)
+
+  print(f"{'entries':>10}{'index':>8}{'build s':>10}{'load ms':>10}{'recall@1':>10}{'p50 ms':>10}{'p99 ms':>10}")
+  for size in [int(size) for size in args.sizes.split(",")]:
+    vectors = make_vectors(rng, size, args.dimension, max(1, size // 100))
+    keys = [str(i) for i in range(size)]
+    targets = rng.choice(size, args.queries, replace=False)
+    # Near-duplicate prompts: the stored embedding plus a small perturbation.
+    queries = vectors[targets] + 0.05 * rng.standard_normal((args.queries, args.dimension)).astype(np.float32)
+    exact = VectorIndex(args.dimension, ivf_threshold=None)
+    exact.add_many(keys, vectors)
+    expected = [result[0][0] for result in (exact.search(query) for query in queries)]
+    for name, ivf_threshold in [("exact", None), ("ivf", 1)]:
+      start_time = time.perf_counter()
+      index = VectorIndex(args.dimension, ivf_threshold=ivf_threshold, nprobe=args.nprobe)
+      index.add_many(keys, vectors)
+      build_s = time.perf_counter() - start_time
+      with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "index")
+        index.save(path)
+        start_time = time.perf_counter()
+        index = VectorIndex.load(path, nprobe=args.nprobe)
+        load_ms = (time.perf_counter() - start_time) * 1000
+        recall, p50, p99 = measure(index, queries, expected)
+        del index
+      print(f"{size:>10}{name:>8}{build_s:>10.2f}{load_ms:>10.2f}{recall:>10.3f}{p50:>10.3f}{p99:>10.3f}")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,64 @@
+"""Benchmark of key balance, key movement on resharding and write throughput of ShardedCache"""
+from ..llm_cache import LLMCache
+from ..sharded_cache import HashRing, ShardedCache
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import collections
+import hashlib
+import logging
+import threading
+import time
+
+class SingleWriterCache(LLMCache):
+  """In-memory cache whose writes hold a lock for a fixed time, like a single file or collection."""
+  def __init__(self, write_ms, **kwargs):
+    super().__init__(**kwargs)
+    self.write_ms = write_ms
+    self.entries = {}
+    self.lock = threading.Lock()
+
+  def get_from_cache(self, key):
+    return self.entries.get(key, "")
+
+  def add_to_cache(self, key, value):
+    return self.add_many_to_cache({key: value})
+
+  def add_many_to_cache(self, items):
+    with self.lock:
+      time.sleep(self.write_ms / 1000)
+      self.entries.update(items)
+    return True
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark ShardedCache.")
+  parser.add_argument("--keys", type=int, default=100000, help="Number of keys placed on the ring.")
+  parser.add_argument("--shards", default="1,2,4,8,16", help="Comma separated numbers of shards.")
+  parser.add_argument("--virtual-nodes", type=int, default=160, help="Ring points per shard.")
+  parser.add_argument("--writes", type=int, default=2000, help="Number of writes per throughput run.")
+  parser.add_argument("--threads", type=int, default=32, help="Number of writer threads.")
+  parser.add_argument("--write-ms", type=float, default=1.0, help="Time a shard is locked per write.")
+  args = parser.parse_args()
+  logging.getLogger().setLevel(logging.WARNING)
+
+  keys = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(args.keys)]
+  print(f"{'shards':>7}{'max/mean':>10}{'moved on add':>14}{'ideal':>8}{'writes/s':>11}")
+  for num_shards in [int(n) for n in args.shards.split(",")]:
+    names = [f"shard-{i}" for i in range(num_shards)]
+    ring = HashRing(dict.fromkeys(names, 1.0), args.virtual_nodes)
+    owners = [ring.node_for(key) for key in keys]
+    max_over_mean = max(collections.Counter(owners).values()) / (len(keys) / num_shards)
+    grown_ring = ring.with_node(f"shard-{num_shards}")
+    moved = sum(owner != grown_ring.node_for(key) for owner, key in zip(owners, keys)) / len(keys)
+
+    cache = ShardedCache({name: SingleWriterCache(args.write_ms) for name in names},
+                         virtual_nodes=args.virtual_nodes)
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+      list(executor.map(lambda key: cache.add_to_cache(key, "value"), keys[:args.writes]))
+    writes_per_second = args.writes / (time.perf_counter() - start_time)
+    cache.close()
+    print(f"{num_shards:>7}{max_over_mean:>10.2f}{moved:>14.1%}{1 / (num_shards + 1):>8.1%}"
+          f"{writes_per_second:>11.0f}")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,93 @@
+"""Benchmark comparing SQLiteCache with LocalCache: hit latency, miss-write latency and threaded throughput"""
+from ..db_integrations.local_cache import LocalCache
+from ..db_integrations.sqlite_cache import SQLiteCache
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+
+def make_entry(i):
+  key = hashlib.sha256(str(i).encode()).hexdigest()
+  value = {"response": f"Cached completion number {i}.",
+           "cache_params": {"model": "gpt-4",
+                            "openai_messages": [{"content": f"Prompt number {i}", "role": "user"}],
+                            "temperature": 0.8}}
+  return key, value
+
+def time_per_op(fn, keys):
+  start_time = time.perf_counter()
+  for key in keys:
+    fn(key)
+  return (time.perf_counter() - start_time) / len(keys) * 1000
+
+def throughput(cache, keys, threads, duration):
+  def worker():
+    rng = random.Random()
+    count = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+      cache.get_from_cache(rng.choice(keys))
+      count += 1
+    return count
+  with ThreadPoolExecutor(max_workers=threads) as executor:
+    counts = list(executor.map(lambda _: worker(), range(threads)))
+  return sum(counts) / duration
+
+def open_local_cache(directory, size):
+  path = os.path.join(directory, "local_cache.json")
+  # Populating through add_to_cache is quadratic, so the file is written directly.
+  with open(path, "w", encoding="utf-8") as file:
+    json.dump(dict(make_entry(i) for i in range(size)), file, indent=2)
+  return LocalCache(file_path=path)
+
+def open_sqlite_cache(directory, size):
+  cache = SQLiteCache(file_path=os.path.join(directory, "sqlite_cache.db"))
+  batch = {}
+  for i in range(size):
+    key, value = make_entry(i)
+    batch[key] = json.dumps(value)
+    if len(batch) == 10000:
+      cache.add_many_to_cache(batch, func_name="call_openai")
+      batch = {}
+  cache.add_many_to_cache(batch, func_name="call_openai")
+  return cache
+
+def main():
+  parser = argparse.ArgumentParser(description="Compare SQLiteCache and LocalCache.")
+  parser.add_argument("--sizes", default="1000,100000",
+                      help="Comma separated numbers of cached entries.")
+  parser.add_argument("--samples", type=int, default=50,
+                      help="Number of lookups and inserts measured per size.")
+  parser.add_argument("--threads", default="1,4,16",
+                      help="Comma separated numbers of reader threads.")
+  parser.add_argument("--duration", type=float, default=1.0,
+                      help="Duration in seconds of each throughput measurement.")
+  args = parser.parse_args()
+  logging.getLogger().setLevel(logging.WARNING)
+  thread_counts = [int(n) for n in args.threads.split(",")]
+
+  header = "".join(f"{f'{n} thr hits/s':>16}" for n in thread_counts)
+  print(f"{'backend':<12}{'entries':>10}{'hit ms':>10}{'write ms':>10}{header}")
+  for size in [int(size) for size in args.sizes.split(",")]:
+    samples = min(args.samples, size)
+    for name, open_cache in [("LocalCache", open_local_cache), ("SQLiteCache", open_sqlite_cache)]:
+      with tempfile.TemporaryDirectory() as directory:
+        cache = open_cache(directory, size)
+        hit_keys = [make_entry(i * (size // samples))[0] for i in range(samples)]
+        miss_keys = [make_entry(size + i)[0] for i in range(samples)]
+        value = json.dumps(make_entry(0)[1])
+        hit_ms = time_per_op(cache.get_from_cache, hit_keys)
+        write_ms = time_per_op(lambda key: cache.add_to_cache(key, value), miss_keys)
+        rates = [throughput(cache, hit_keys, threads, args.duration) for threads in thread_counts]
+        if hasattr(cache, "close"):
+          cache.close()
+      print(f"{name:<12}{size:>10}{hit_ms:>10.3f}{write_ms:>10.3f}"
+            + "".join(f"{rate:>16.0f}" for rate in rates))
+
+if __name__ == "__main__":
+  main()
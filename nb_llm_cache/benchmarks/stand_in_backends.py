@@ -0,0 +1,153 @@
+"""In-process stand-ins for remote cache stores with simulated round trips and operation counters"""
+from ..llm_cache import LLMCache, page_sorted_keys
+import json
+import threading
+import time
+
+# Maximum number of writes in a single Firestore batch.
+MAX_BATCH_SIZE = 500
+
+class RemoteStore:
+  """
+  Thread-safe in-process store whose requests each wait rtt_ms, as a network round
+  trip would, and count the round trips and the documents read and written.
+  """
+  def __init__(self, rtt_ms=1.0):
+    self.rtt_ms = rtt_ms
+    self.documents = {}
+    self.lock = threading.Lock()
+    self.round_trips = 0
+    self.reads = 0
+    self.writes = 0
+
+  def request(self, reads=0, writes=0):
+    """Waits for one round trip and counts it."""
+    if self.rtt_ms:
+      time.sleep(self.rtt_ms / 1000)
+    with self.lock:
+      self.round_trips += 1
+      self.reads += reads
+      self.writes += writes
+
+  def stats(self):
+    return {"round_trips": self.round_trips, "reads": self.reads, "writes": self.writes}
+
+def to_document(value):
+  """Converts a value into document fields, as FirestoreCache stores it."""
+  if isinstance(value, bytes):
+    return {"value": value}
+  return json.loads(value)
+
+def from_document(data):
+  """Converts document fields back into the stored value, as FirestoreCache reads it."""
+  if isinstance(data.get("value"), bytes):
+    return data["value"]
+  return json.dumps(data)
+
+class StandInFirestoreCache(LLMCache):
+  """
+  Cache with the request pattern of FirestoreCache on a RemoteStore: one round trip
+  per document read or write, one `get_all` round trip per batch read, and batched
+  writes of up to 500 documents. Values are stored as document fields.
+  """
+  supports_binary_values = True
+  supports_delete = True
+  supports_scan = True
+
+  def __init__(self, store=None, rtt_ms=1.0, **kwargs):
+    super().__init__(**kwargs)
+    self.store = store if store is not None else RemoteStore(rtt_ms)
+
+  def get_from_cache(self, key):
+    self.store.request(reads=1)
+    data = self.store.documents.get(key)
+    return from_document(data) if data is not None else ""
+
+  def add_to_cache(self, key, value):
+    document = to_document(value)
+    self.store.request(writes=1)
+    with self.store.lock:
+      self.store.documents[key] = document
+    return True
+
+  def get_many_from_cache(self, keys):
+    self.store.request(reads=len(keys))
+    documents = self.store.documents
+    return [from_document(documents[key]) if key in documents else "" for key in keys]
+
+  def add_many_to_cache(self, items):
+    keys = list(items)
+    for start in range(0, len(keys), MAX_BATCH_SIZE):
+      batch = {key: to_document(items[key]) for key in keys[start:start + MAX_BATCH_SIZE]}
+      self.store.request(writes=len(batch))
+      with self.store.lock:
+        self.store.documents.update(batch)
+    return True
+
+  def delete_from_cache(self, key):
+    self.store.request(writes=1)
+    with self.store.lock:
+      self.store.documents.pop(key, None)
+    return True
+
+  def delete_many_from_cache(self, keys):
+    for start in range(0, len(keys), MAX_BATCH_SIZE):
+      batch = keys[start:start + MAX_BATCH_SIZE]
+      self.store.request(writes=len(batch))
+      with self.store.lock:
+        for key in batch:
+          self.store.documents.pop(key, None)
+    return len(keys)
+
+  def scan_cache(self, cursor=None, prefix="", limit=1000):
+    with self.store.lock:
+      sorted_keys = sorted(self.store.documents)
+    keys, next_cursor = page_sorted_keys(sorted_keys, cursor, prefix, limit)
+    self.store.request(reads=len(keys))
+    return [(key, from_document(self.store.documents[key]), {}) for key in keys], next_cursor
+
+class StandInKeyValueCache(LLMCache):
+  """
+  Cache with the request pattern of a remote key-value store such as Redis on a
+  RemoteStore: one round trip per command, with batch reads and writes pipelined
+  into a single round trip. Values are stored as sent.
+  """
+  supports_binary_values = True
+  supports_delete = True
+  supports_scan = True
+
+  def __init__(self, store=None, rtt_ms=0.2, **kwargs):
+    super().__init__(**kwargs)
+    self.store = store if store is not None else RemoteStore(rtt_ms)
+
+  def get_from_cache(self, key):
+    self.store.request(reads=1)
+    return self.store.documents.get(key, "")
+
+  def add_to_cache(self, key, value):
+    return self.add_many_to_cache({key: value})
+
+  def get_many_from_cache(self, keys):
+    self.store.request(reads=len(keys))
+    return [self.store.documents.get(key, "") for key in keys]
+
+  def add_many_to_cache(self, items):
+    self.store.request(writes=len(items))
+    with self.store.lock:
+      self.store.documents.update(items)
+    return True
+
+  def delete_from_cache(self, key):
+    return self.delete_many_from_cache([key]) > 0
+
+  def delete_many_from_cache(self, keys):
+    self.store.request(writes=len(keys))
+    with self.store.lock:
+      return sum(self.store.documents.pop(key, None) is not None for key in keys)
+
+  def scan_cache(self, cursor=None, prefix="", limit=1000):
+    with self.store.lock:
+      sorted_keys = sorted(self.store.documents)
+    keys, next_cursor = page_sorted_keys(sorted_keys, cursor, prefix, limit)
+    self.store.request(reads=len(keys))
+    return [(key, self.store.documents[key], {}) for key in keys], next_cursor
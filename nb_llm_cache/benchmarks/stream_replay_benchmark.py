@@ -0,0 +1,70 @@
+"""Benchmark of cached stream hits: time to first chunk, full replay time and entry size"""
+from ..cache_keys import KeyGenerator
+from ..db_integrations.log_cache import LogCache
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+def legacy_stream_hit(cache, func_name, cache_params):
+  cache_key, _ = KeyGenerator().generate(func_name, cache_params)
+  result_dict = json.loads(cache.get_from_cache(cache_key))
+  if result_dict["cache_params"] == cache_params:
+    for chunk in result_dict["response"]:
+      yield chunk.encode("utf-8")
+
+def make_stream(num_chunks, chunk_length):
+  def stream_tokens(num_chunks):
+    for i in range(num_chunks):
+      yield f"token {i} ".ljust(chunk_length, "x").encode("utf-8")
+  return stream_tokens
+
+def measure(stream, iterations):
+  first_chunk_us = total_us = 0.0
+  for _ in range(iterations):
+    start_time = time.perf_counter()
+    iterator = iter(stream())
+    next(iterator)
+    first_chunk_us += (time.perf_counter() - start_time) * 1e6
+    for _ in iterator:
+      pass
+    total_us += (time.perf_counter() - start_time) * 1e6
+  return first_chunk_us / iterations, total_us / iterations
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark cached stream replay.")
+  parser.add_argument("--chunks", default="100,1000,10000",
+                      help="Comma separated numbers of chunks per stream.")
+  parser.add_argument("--chunk-length", type=int, default=16)
+  parser.add_argument("--iterations", type=int, default=50)
+  args = parser.parse_args()
+  logging.getLogger().setLevel(logging.WARNING)
+
+  print(f"{'chunks':>8}{'format':>10}{'entry bytes':>14}{'first us':>12}{'total us':>12}")
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    for num_chunks in [int(n) for n in args.chunks.split(",")]:
+      stream_tokens = make_stream(num_chunks, args.chunk_length)
+      cache_params = {"num_chunks": num_chunks}
+      cache = LogCache(os.path.join(tmp_dir, f"{num_chunks}.log"), stream_flush_bytes=None)
+      legacy_cache = LogCache(os.path.join(tmp_dir, f"{num_chunks}.legacy.log"))
+      chunks = list(cache.stream_call(stream_tokens, **cache_params))
+      key = cache._generate_cache_key("stream_tokens", cache_params)
+      legacy_value = json.dumps({"response": [chunk.decode("utf-8") for chunk in chunks],
+                                 "cache_params": cache_params})
+      legacy_cache.add_to_cache(key, legacy_value)
+      results = [
+        ("list", len(legacy_value),
+         measure(lambda: legacy_stream_hit(legacy_cache, "stream_tokens", cache_params),
+                 args.iterations)),
+        ("buffer", len(cache.get_from_cache(key)),
+         measure(lambda: cache.stream_call(stream_tokens, **cache_params), args.iterations)),
+      ]
+      for name, size, (first_chunk_us, total_us) in results:
+        print(f"{num_chunks:>8}{name:>10}{size:>14}{first_chunk_us:>12.1f}{total_us:>12.1f}")
+      cache.close()
+      legacy_cache.close()
+
+if __name__ == "__main__":
+  main()
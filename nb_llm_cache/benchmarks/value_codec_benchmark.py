@@ -0,0 +1,56 @@
+"""Benchmark of stored bytes and encode/decode time per entry for the value codecs"""
+from ..value_codecs import BinaryCodec, JsonCodec, decode_value, msgpack, zstandard
+import argparse
+import time
+
+def make_payload(num_messages, message_length, response_length, store_cache_params):
+  messages = [{"role": "user" if i % 2 else "assistant",
+               "content": f"Message {i}: " + "The quick brown fox jumps over the lazy dog. " *
+                          (message_length // 45)}
+              for i in range(num_messages)]
+  payload = {"response": "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " *
+                         (response_length // 57),
+             "params_fingerprint": "d1a6-8f3c2b1a"}
+  if store_cache_params:
+    payload["cache_params"] = {"model": "gpt-4", "openai_messages": messages, "temperature": 0.8}
+  return payload
+
+def time_us(fn, iterations):
+  start_time = time.perf_counter()
+  for _ in range(iterations):
+    fn()
+  return (time.perf_counter() - start_time) / iterations * 1e6
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark value codecs.")
+  parser.add_argument("--messages", type=int, default=20)
+  parser.add_argument("--message-length", type=int, default=800)
+  parser.add_argument("--response-length", type=int, default=2000)
+  parser.add_argument("--iterations", type=int, default=1000)
+  args = parser.parse_args()
+
+  codecs = [("json", JsonCodec()),
+            ("binary json", BinaryCodec(serializer="json", compression=None)),
+            ("binary json+zlib", BinaryCodec(serializer="json", compression="zlib"))]
+  if msgpack is not None:
+    codecs += [("msgpack", BinaryCodec(serializer="msgpack", compression=None)),
+               ("msgpack+zlib", BinaryCodec(serializer="msgpack", compression="zlib"))]
+  if zstandard is not None:
+    codecs.append(("msgpack+zstd" if msgpack is not None else "binary json+zstd",
+                   BinaryCodec(compression="zstd")))
+
+  print(f"{'codec':<20}{'params':>8}{'bytes':>10}{'encode us':>12}{'decode us':>12}")
+  for store_cache_params in (True, False):
+    payload = make_payload(args.messages, args.message_length, args.response_length,
+                           store_cache_params)
+    for name, codec in codecs:
+      value = codec.encode(payload)
+      assert decode_value(value) == payload
+      size = len(value.encode("utf-8")) if isinstance(value, str) else len(value)
+      encode_us = time_us(lambda: codec.encode(payload), args.iterations)
+      decode_us = time_us(lambda: decode_value(value), args.iterations)
+      print(f"{name:<20}{'yes' if store_cache_params else 'no':>8}{size:>10}"
+            f"{encode_us:>12.2f}{decode_us:>12.2f}")
+
+if __name__ == "__main__":
+  main()
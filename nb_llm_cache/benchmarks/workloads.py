@@ -0,0 +1,42 @@
+"""Seeded request workloads with Zipfian key popularity and varied prompt sizes"""
+import bisect
+import itertools
+import random
+
+WORDS = ("the cache model prompt token answer question context document summary user "
+         "system assistant request response latency stream value").split()
+
+class ZipfSampler:
+  """Samples key ranks from 0 to num_keys - 1 with probability proportional to 1 / (rank + 1) ** s."""
+  def __init__(self, num_keys, s=1.0, seed=0):
+    self.cumulative_weights = list(itertools.accumulate(1.0 / (rank + 1) ** s
+                                                        for rank in range(num_keys)))
+    self.random = random.Random(seed)
+
+  def sample(self):
+    point = self.random.random() * self.cumulative_weights[-1]
+    return min(bisect.bisect_right(self.cumulative_weights, point), len(self.cumulative_weights) - 1)
+
+def make_prompt(key, num_words):
+  """Returns a prompt of num_words words that only depends on the key."""
+  rng = random.Random(key)
+  return f"Prompt {key}: " + " ".join(rng.choice(WORDS) for _ in range(num_words))
+
+def make_requests(num_requests, num_keys, zipf_s=1.0, prompt_words=(16, 2048), seed=0):
+  """
+  Returns the prompts of a workload. Key popularity follows a Zipf distribution, and
+  the prompt size of each key is drawn log-uniformly from the prompt_words range,
+  so that most prompts are short and a few are long.
+
+  Returns:
+    list: The prompt of each request, in order.
+  """
+  rng = random.Random(seed)
+  min_words, max_words = prompt_words
+  # Keys are shuffled so that prompt sizes do not correlate with popularity.
+  keys = list(range(num_keys))
+  rng.shuffle(keys)
+  prompts = [make_prompt(key, int(round(min_words * (max_words / min_words) ** rng.random())))
+             for key in keys]
+  sampler = ZipfSampler(num_keys, zipf_s, seed)
+  return [prompts[sampler.sample()] for _ in range(num_requests)]
@@ -0,0 +1,64 @@
+"""Benchmark comparing miss latency with direct writes and with a write-behind queue on a backend with slow writes"""
+from ..llm_cache import LLMCache
+from ..write_behind import WriteBehindQueue
+import argparse
+import logging
+import statistics
+import threading
+import time
+
+class SlowWriteCache(LLMCache):
+  """In-memory cache whose writes take a fixed time per round trip."""
+  def __init__(self, write_ms, **kwargs):
+    super().__init__(**kwargs)
+    self.write_ms = write_ms
+    self.entries = {}
+    self.round_trips = 0
+    self.lock = threading.Lock()
+
+  def get_from_cache(self, key):
+    return self.entries.get(key, "")
+
+  def add_to_cache(self, key, value):
+    return self.add_many_to_cache({key: value})
+
+  def add_many_to_cache(self, items):
+    time.sleep(self.write_ms / 1000)
+    with self.lock:
+      self.entries.update(items)
+      self.round_trips += 1
+    return True
+
+def main():
+  parser = argparse.ArgumentParser(description="Compare miss latency with and without write-behind.")
+  parser.add_argument("--calls", type=int, default=200, help="Number of misses.")
+  parser.add_argument("--function-ms", type=float, default=5.0,
+                      help="Latency of the cached function in milliseconds.")
+  parser.add_argument("--write-ms", type=float, default=20.0,
+                      help="Latency of a backend write in milliseconds.")
+  args = parser.parse_args()
+  logging.getLogger().setLevel(logging.WARNING)
+
+  def call_llm(prompt):
+    time.sleep(args.function_ms / 1000)
+    return f"Completion of {prompt}"
+
+  print(f"{'mode':<14}{'p50 ms':>10}{'p99 ms':>10}{'flush ms':>10}{'round trips':>13}")
+  for mode in ["direct", "write-behind"]:
+    write_behind = WriteBehindQueue() if mode == "write-behind" else False
+    cache = SlowWriteCache(args.write_ms, write_behind=write_behind)
+    latencies = []
+    for i in range(args.calls):
+      start_time = time.perf_counter()
+      cache.call(call_llm, prompt=f"Prompt number {i}")
+      latencies.append((time.perf_counter() - start_time) * 1000)
+    start_time = time.perf_counter()
+    if cache.write_behind is not None:
+      cache.write_behind.close()
+    flush_ms = (time.perf_counter() - start_time) * 1000
+    latencies.sort()
+    print(f"{mode:<14}{statistics.median(latencies):>10.2f}"
+          f"{latencies[int(len(latencies) * 0.99) - 1]:>10.2f}{flush_ms:>10.1f}{cache.round_trips:>13}")
+
+if __name__ == "__main__":
+  main()
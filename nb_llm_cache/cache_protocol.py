@@ -0,0 +1,160 @@
+"""
+This module implements the binary protocol spoken between the cache server and
+RemoteCache clients.
+
+Every request and response is a frame made of a 9-byte header, holding the opcode or
+status, the request ID and the payload length, followed by the payload. Responses
+carry the ID of their request, so a client can send several requests on a connection
+before reading the responses, which the server may send in any order.
+
+Payloads are sequences of fields: unsigned 32-bit integers, 64-bit floats, strings
+prefixed with their length, and values prefixed with a type tag and their length.
+"""
+from typing import List, Optional, Tuple, Union
+import socket
+import struct
+
+# Opcodes of the requests.
+PING = 0
+GET = 1
+SET = 2
+DELETE = 3
+SCAN = 4
+STATS = 5
+
+# Statuses of the responses.
+OK = 0
+ERROR = 1
+
+# Type tags of the values.
+_MISSING = 0
+_TEXT = 1
+_BYTES = 2
+
+HEADER = struct.Struct(">BII")
+_U32 = struct.Struct(">I")
+_F64 = struct.Struct(">d")
+_VALUE_HEADER = struct.Struct(">BI")
+
+
+def parse_address(address: str) -> Tuple[int, Union[str, tuple]]:
+  """
+  Parses a server address: "unix:PATH" for a Unix socket, or "HOST:PORT" (optionally
+  prefixed with "tcp:") for TCP.
+
+  Returns:
+    int: The socket family.
+    Union[str, tuple]: The socket address.
+
+  Raises:
+    ValueError: If the address is invalid.
+  """
+  if address.startswith("unix:"):
+    return socket.AF_UNIX, address[len("unix:"):]
+  if address.startswith("tcp:"):
+    address = address[len("tcp:"):]
+  host, _, port = address.rpartition(":")
+  if not host or not port.isdigit():
+    raise ValueError(f"Invalid cache server address: {address}.")
+  return socket.AF_INET, (host.strip("[]"), int(port))
+
+
+class Writer:
+  """
+  Builds a payload.
+  """
+  def __init__(self):
+    self.parts = []
+
+  def u32(self, number: int) -> "Writer":
+    self.parts.append(_U32.pack(number))
+    return self
+
+  def f64(self, number: float) -> "Writer":
+    self.parts.append(_F64.pack(number))
+    return self
+
+  def string(self, text: str) -> "Writer":
+    data = text.encode("utf-8")
+    self.parts.append(_U32.pack(len(data)))
+    self.parts.append(data)
+    return self
+
+  def strings(self, texts: List[str]) -> "Writer":
+    self.u32(len(texts))
+    for text in texts:
+      self.string(text)
+    return self
+
+  def value(self, value: Optional[Union[str, bytes]]) -> "Writer":
+    """
+    Adds a text or bytes value. None and empty strings are sent as missing values.
+    """
+    if isinstance(value, bytes):
+      self.parts.append(_VALUE_HEADER.pack(_BYTES, len(value)))
+      self.parts.append(value)
+    elif value:
+      data = value.encode("utf-8")
+      self.parts.append(_VALUE_HEADER.pack(_TEXT, len(data)))
+      self.parts.append(data)
+    else:
+      self.parts.append(_VALUE_HEADER.pack(_MISSING, 0))
+    return self
+
+  def values(self, values: List[Optional[Union[str, bytes]]]) -> "Writer":
+    self.u32(len(values))
+    for value in values:
+      self.value(value)
+    return self
+
+  def frame(self, code: int, request_id: int) -> bytes:
+    """
+    Returns the frame holding the payload.
+    """
+    payload = b"".join(self.parts)
+    return HEADER.pack(code, request_id, len(payload)) + payload
+
+
+class Reader:
+  """
+  Reads the fields of a payload in order.
+  """
+  def __init__(self, payload: bytes):
+    self.payload = memoryview(payload)
+    self.offset = 0
+
+  def u32(self) -> int:
+    number = _U32.unpack_from(self.payload, self.offset)[0]
+    self.offset += _U32.size
+    return number
+
+  def f64(self) -> float:
+    number = _F64.unpack_from(self.payload, self.offset)[0]
+    self.offset += _F64.size
+    return number
+
+  def _bytes(self, length: int) -> bytes:
+    data = self.payload[self.offset:self.offset + length].tobytes()
+    self.offset += length
+    return data
+
+  def string(self) -> str:
+    return self._bytes(self.u32()).decode("utf-8")
+
+  def strings(self) -> List[str]:
+    return [self.string() for _ in range(self.u32())]
+
+  def value(self, missing=""):
+    """
+    Reads a value, returning missing for missing values.
+    """
+    tag, length = _VALUE_HEADER.unpack_from(self.payload, self.offset)
+    self.offset += _VALUE_HEADER.size
+    if tag == _BYTES:
+      return self._bytes(length)
+    if tag == _TEXT:
+      return self._bytes(length).decode("utf-8")
+    return missing
+
+  def values(self) -> list:
+    return [self.value() for _ in range(self.u32())]
@@ -0,0 +1,335 @@
+"""
+This module implements the CacheServer class, a daemon sharing one warm in-memory
+cache between the processes of a host through a Unix socket or TCP.
+"""
+from .cache_protocol import (DELETE, ERROR, GET, HEADER, OK, PING, SCAN, SET, STATS,
+                             Reader, Writer, parse_address)
+from .db_integrations.memory_cache import MemoryCache
+from .llm_cache import LLMCache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Union
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import socket
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class CacheServer:
+  """
+  Serves the get, add, delete and scan operations of a cache to RemoteCache clients.
+
+  Entries are held in a bounded in-memory tier in front of an optional backend. Reads
+  answered by the memory tier are served on the event loop without a thread switch.
+  Misses and writes are sent to the backend on a thread pool. Writes go through to
+  the backend before they are acknowledged.
+
+  Requests on a connection are processed concurrently, so that a client pipelining
+  reads is not held up by a slow backend read. Writes and deletes are applied to the
+  memory tier on the event loop, in the order of the requests, before they are sent
+  to the backend: a read pipelined after a write sees the written value, and a read
+  pipelined after a delete misses even while the backend delete is in progress.
+
+  Example:
+    CacheServer(FirestoreCache(collection_name, firestore_service_account_file),
+                max_bytes=1024 ** 3).serve_forever("unix:/tmp/nb_llm_cache.sock")
+  """
+  def __init__(self, backend: LLMCache = None,
+               max_entries: int = None,
+               max_bytes: int = 256 * 1024 * 1024,
+               ttl: float = None,
+               workers: int = 16):
+    """
+    Args:
+      backend (LLMCache, optional): The backend behind the memory tier. Without a
+        backend, entries only live in memory.
+      max_entries (int, optional): Maximum number of entries of the memory tier.
+      max_bytes (int, optional): Maximum total size of the memory tier in bytes.
+      ttl (float, optional): Time-to-live in seconds of the entries of the memory tier.
+      workers (int, optional): Number of threads running backend operations.
+    """
+    self.backend = backend
+    self.memory = MemoryCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+    self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="CacheServer")
+    self._server = None
+    self._connections = 0
+    self._requests = 0
+    self._backend_reads = 0
+    self._backend_hits = 0
+    self._errors = 0
+    self._deleting: Dict[str, int] = {}
+    self._deleting_lock = threading.Lock()
+
+  async def start(self, address: str):
+    """
+    Starts listening on an address, "unix:PATH" or "HOST:PORT".
+    """
+    family, socket_address = parse_address(address)
+    if family == socket.AF_UNIX:
+      if os.path.exists(socket_address):
+        os.remove(socket_address)
+      self._server = await asyncio.start_unix_server(self._serve_connection, path=socket_address)
+    else:
+      host, port = socket_address
+      self._server = await asyncio.start_server(self._serve_connection, host, port)
+    logger.info(f"Cache server listening on {address}.")
+
+  def serve_forever(self, address: str):
+    """
+    Serves clients on an address until interrupted.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+      loop.run_until_complete(self.start(address))
+      loop.run_forever()
+    except KeyboardInterrupt:
+      pass
+    finally:
+      self.close()
+      if self._server is not None:
+        loop.run_until_complete(self._server.wait_closed())
+      loop.close()
+
+  def close(self):
+    """
+    Stops accepting connections and the backend threads.
+    """
+    if self._server is not None:
+      self._server.close()
+    self._executor.shutdown(wait=False)
+
+  async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """
+    Reads the request frames of a connection and answers them.
+    """
+    sock = writer.get_extra_info("socket")
+    if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+      sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    self._connections += 1
+    loop = asyncio.get_event_loop()
+    try:
+      while True:
+        opcode, request_id, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+        payload = await reader.readexactly(length) if length else b""
+        self._requests += 1
+        try:
+          response = self._execute_in_memory(opcode, payload)
+        except Exception as e:
+          response = self._error(e)
+        if isinstance(response, Writer):
+          writer.write(self._frame(response, request_id))
+          await writer.drain()
+        else:
+          asyncio.ensure_future(self._respond_from_backend(loop, writer, request_id, response))
+    except (asyncio.IncompleteReadError, ConnectionError):
+      pass
+    finally:
+      self._connections -= 1
+      writer.close()
+
+  async def _respond_from_backend(self, loop, writer: asyncio.StreamWriter, request_id: int,
+                                  operation: Callable[[], Writer]):
+    try:
+      response = await loop.run_in_executor(self._executor, operation)
+    except Exception as e:
+      response = self._error(e)
+    if not writer.transport.is_closing():
+      writer.write(self._frame(response, request_id))
+
+  def _execute_in_memory(self, opcode: int, payload: bytes) -> Union[Writer, Callable[[], Writer]]:
+    """
+    Answers a request on the event loop if it needs no backend operation. Otherwise
+    applies its effect on the memory tier, and returns the operation completing it on
+    the backend.
+
+    Returns:
+      The response, or the operation to run on a backend thread.
+    """
+    if opcode in (PING, STATS) or self.backend is None:
+      return self._execute(opcode, payload)
+    if opcode == GET:
+      keys = Reader(payload).strings()
+      values = self.memory.get_many_from_cache(keys)
+      missing = [key for key, value in zip(keys, values)
+                 if not value and key not in self._deleting]
+      if not missing:
+        return Writer().values(values)
+      return lambda: Writer().values(self._get(keys, values, missing))
+    if opcode == SET:
+      items, ttl, func_name = self._read_set(Reader(payload))
+      self.memory.add_many_to_cache(items, ttl=ttl)
+      return lambda: Writer().u32(int(self._set_backend(items, ttl, func_name)))
+    if opcode == DELETE:
+      keys = Reader(payload).strings()
+      self.memory.delete_many_from_cache(keys)
+      with self._deleting_lock:
+        for key in keys:
+          self._deleting[key] = self._deleting.get(key, 0) + 1
+      return functools.partial(self._delete_backend, keys)
+    return functools.partial(self._execute, opcode, payload)
+
+  @staticmethod
+  def _read_set(reader: Reader) -> tuple:
+    """
+    Reads the items, time-to-live and function name of a SET request.
+    """
+    ttl = reader.f64()
+    func_name = reader.string()
+    items = {}
+    for _ in range(reader.u32()):
+      key = reader.string()
+      items[key] = reader.value()
+    return items, ttl if ttl >= 0 else None, func_name or None
+
+  def _execute(self, opcode: int, payload: bytes) -> Writer:
+    """
+    Answers a request.
+
+    Raises:
+      ValueError: If the opcode is unknown.
+    """
+    reader = Reader(payload)
+    if opcode == GET:
+      return Writer().values(self._get(reader.strings()))
+    if opcode == SET:
+      return Writer().u32(int(self._set(*self._read_set(reader))))
+    if opcode == DELETE:
+      return Writer().u32(self._delete(reader.strings()))
+    if opcode == SCAN:
+      cursor = reader.value(missing=None)
+      prefix = reader.string()
+      limit = reader.u32()
+      cache = self.backend if self.backend is not None and self.backend.supports_scan else self.memory
+      entries, cursor = cache.scan_cache(cursor, prefix, limit)
+      response = Writer().u32(len(entries))
+      for key, value, metadata in entries:
+        response.string(key).value(value).string(json.dumps(metadata))
+      return response.value(cursor)
+    if opcode == STATS:
+      return Writer().string(json.dumps(self.stats()))
+    if opcode == PING:
+      return Writer()
+    raise ValueError(f"Unknown opcode: {opcode}.")
+
+  def _get(self, keys: List[str], values: list = None, missing: List[str] = None) -> list:
+    """
+    Reads keys from the memory tier, unless their values are given, and the missing
+    ones from the backend.
+    """
+    if values is None:
+      values = self.memory.get_many_from_cache(keys)
+    if self.backend is None:
+      return values
+    if missing is None:
+      missing = [key for key, value in zip(keys, values) if not value]
+    if missing:
+      self._backend_reads += len(missing)
+      found = {key: value for key, value in zip(missing, self.backend.get_many_from_cache(missing))
+               if value}
+      if found:
+        self._backend_hits += len(found)
+        self.memory.add_many_to_cache(found)
+        values = [value or found.get(key, "") for key, value in zip(keys, values)]
+    return values
+
+  def _set(self, items: dict, ttl: float, func_name: str) -> bool:
+    """
+    Writes items to the memory tier and through to the backend.
+    """
+    self.memory.add_many_to_cache(items, ttl=ttl)
+    if self.backend is None:
+      return True
+    return self._set_backend(items, ttl, func_name)
+
+  def _set_backend(self, items: dict, ttl: float, func_name: str) -> bool:
+    """
+    Writes items through to the backend.
+    """
+    options = {}
+    if self.backend.supports_metadata and func_name is not None:
+      options["func_name"] = func_name
+    if self.backend.supports_ttl and ttl is not None:
+      options["ttl"] = ttl
+    return self.backend.add_many_to_cache(items, **options)
+
+  def _delete(self, keys: List[str]) -> int:
+    deleted = self.memory.delete_many_from_cache(keys)
+    if self.backend is None:
+      return deleted
+    return self.backend.delete_many_from_cache(keys)
+
+  def _delete_backend(self, keys: List[str]) -> Writer:
+    """
+    Deletes keys from the backend, then lets reads of the keys go to the backend again.
+    """
+    try:
+      return Writer().u32(self.backend.delete_many_from_cache(keys))
+    finally:
+      with self._deleting_lock:
+        for key in keys:
+          count = self._deleting.pop(key) - 1
+          if count:
+            self._deleting[key] = count
+
+  def _error(self, error: Exception) -> Writer:
+    self._errors += 1
+    logger.error(f"Error serving cache request: {error}")
+    return _ErrorResponse(f"{type(error).__name__}: {error}")
+
+  @staticmethod
+  def _frame(response: Writer, request_id: int) -> bytes:
+    return response.frame(ERROR if isinstance(response, _ErrorResponse) else OK, request_id)
+
+  def stats(self) -> dict:
+    """
+    Returns the server counters and the statistics of the memory tier.
+    """
+    return {"connections": self._connections,
+            "requests": self._requests,
+            "errors": self._errors,
+            "backend_reads": self._backend_reads,
+            "backend_hits": self._backend_hits,
+            "memory": self.memory.stats()}
+
+
+class _ErrorResponse(Writer):
+  """
+  Response holding an error message.
+  """
+  def __init__(self, message: str):
+    super().__init__()
+    self.string(message)
+
+
+def main(argv: List[str] = None):
+  """
+  Runs a cache server, optionally in front of a backend given as a cache specification
+  (see `migration.open_cache`).
+  """
+  from .migration import open_cache
+  parser = argparse.ArgumentParser(prog="nb-llm-cache-server",
+                                   description="Share a warm LLM cache between processes.")
+  parser.add_argument("--listen", default="unix:/tmp/nb_llm_cache.sock",
+                      help="unix:PATH or HOST:PORT to listen on.")
+  parser.add_argument("--backend", help="Specification of the backend behind the memory tier, "
+                                        "such as sqlite:cache.db or redis://localhost:6379/0.")
+  parser.add_argument("--max-entries", type=int, help="Maximum number of entries held in memory.")
+  parser.add_argument("--max-bytes", type=int, default=256 * 1024 * 1024,
+                      help="Maximum size of the entries held in memory.")
+  parser.add_argument("--ttl", type=float, help="Time-to-live in seconds of the entries held in memory.")
+  parser.add_argument("--workers", type=int, default=16, help="Number of backend threads.")
+  args = parser.parse_args(argv)
+  logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+  backend = open_cache(args.backend) if args.backend else None
+  CacheServer(backend, max_entries=args.max_entries, max_bytes=args.max_bytes, ttl=args.ttl,
+              workers=args.workers).serve_forever(args.listen)
+
+
+if __name__ == "__main__":
+  main()
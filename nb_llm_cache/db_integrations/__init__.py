@@ -0,0 +1,94 @@
+"""
+Registry of the cache backends.
+
+Backends are registered by name as "module:Class" strings and imported on first use,
+so importing this package does not import the client libraries of every database.
+
+Example:
+  cache = create_backend("sqlite", "cache.db")
+"""
+from typing import Dict, List, Type, Union
+import importlib
+
+_BACKENDS: Dict[str, Union[str, type]] = {
+  "memory": "nb_llm_cache.db_integrations.memory_cache:MemoryCache",
+  "local": "nb_llm_cache.db_integrations.local_cache:LocalCache",
+  "log": "nb_llm_cache.db_integrations.log_cache:LogCache",
+  "sqlite": "nb_llm_cache.db_integrations.sqlite_cache:SQLiteCache",
+  "mmap": "nb_llm_cache.db_integrations.mmap_cache:MmapCache",
+  "redis": "nb_llm_cache.db_integrations.redis_cache:RedisCache",
+  "mongo": "nb_llm_cache.db_integrations.mongo_cache:MongoCache",
+  "firestore": "nb_llm_cache.db_integrations.firestore_cache:FirestoreCache",
+  "remote": "nb_llm_cache.db_integrations.remote_cache:RemoteCache",
+}
+
+
+def register_backend(name: str, backend: Union[str, type]):
+  """
+  Registers a backend under a name, replacing any backend of the same name.
+
+  Args:
+    name (str): The name of the backend.
+    backend (Union[str, type]): The backend class, or a "module:Class" string naming it
+      so that its module is only imported when the backend is used.
+  """
+  _BACKENDS[name] = backend
+
+
+def available_backends() -> List[str]:
+  """
+  Returns the names of the registered backends, without importing them.
+  """
+  return sorted(_BACKENDS)
+
+
+def get_backend(name: str) -> Type:
+  """
+  Returns the class of a registered backend, importing its module on first use.
+
+  Args:
+    name (str): The name of the backend.
+
+  Returns:
+    type: The backend class.
+
+  Raises:
+    ValueError: If no backend is registered under the name.
+  """
+  try:
+    backend = _BACKENDS[name]
+  except KeyError:
+    raise ValueError(f"Unknown cache backend: {name}. "
+                     f"Available backends: {', '.join(available_backends())}.") from None
+  if isinstance(backend, str):
+    module_name, _, class_name = backend.partition(":")
+    backend = getattr(importlib.import_module(module_name), class_name)
+    _BACKENDS[name] = backend
+  return backend
+
+
+def create_backend(name: str, *args, **kwargs):
+  """
+  Creates an instance of a registered backend.
+
+  Args:
+    name (str): The name of the backend.
+    *args: Arguments passed to the backend class.
+    **kwargs: Keyword arguments passed to the backend class.
+
+  Raises:
+    ValueError: If no backend is registered under the name.
+  """
+  return get_backend(name)(*args, **kwargs)
+
+
+def __getattr__(name: str):
+  """
+  Resolves the registered backend classes as attributes of this package on Python 3.7+,
+  such as `db_integrations.SQLiteCache`, importing their module on first access.
+  """
+  for backend_name, backend in list(_BACKENDS.items()):
+    class_name = backend.rpartition(":")[2] if isinstance(backend, str) else backend.__name__
+    if class_name == name:
+      return get_backend(backend_name)
+  raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
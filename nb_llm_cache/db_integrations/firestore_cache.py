@@ -2,28 +2,233 @@
 This module implements the FirestoreCache class,
 which is a subclass of the DBIntegrationInterface class.
 """
-from google.cloud import firestore
-from google.oauth2 import service_account
-from ..llm_cache import LLMCache
+from ..llm_cache import LLMCache, prefix_end
+from typing import Dict, List, Optional, Tuple
+import datetime
 import logging
 import json
+import threading
+import time
+import weakref
+
+# The Firestore client libraries take hundreds of milliseconds to import, so they are
+# imported when the first client is created rather than with this module.
+firestore = None
+service_account = None
+
+# Maximum number of writes in a single Firestore batch.
+_MAX_BATCH_SIZE = 500
+
+# Field holding binary encoded entries.
+_VALUE_FIELD = "value"
+
+# Timestamp field holding the expiry time of entries with a time-to-live, for a
+# Firestore TTL policy. JSON entries keep their expiry time in the same field.
+_EXPIRES_FIELD = "expires_at"
 
-logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 
+
+def _import_firestore():
+  """
+  Imports the Firestore client libraries on first use.
+
+  Raises:
+    ValueError: If google-cloud-firestore is not installed.
+  """
+  global firestore, service_account
+  if firestore is None:
+    try:
+      from google.cloud import firestore as firestore_module
+      from google.oauth2 import service_account as service_account_module
+    except ImportError as e:
+      raise ValueError("FirestoreCache requires the google-cloud-firestore package: "
+                       "pip install google-cloud-firestore") from e
+    service_account = service_account_module
+    firestore = firestore_module
+  return firestore
+
+
+def _to_document(value, expires_at: Optional[datetime.datetime] = None):
+  """
+  Converts a value into Firestore document data. JSON entries are stored as document
+  fields, binary encoded entries as a single bytes field. The expiry time is stored
+  as a timestamp, which defaults to the expiry time of JSON entries.
+  """
+  if isinstance(value, bytes):
+    data = {_VALUE_FIELD: value}
+  else:
+    data = json.loads(value)
+    if expires_at is None and isinstance(data.get(_EXPIRES_FIELD), (int, float)):
+      expires_at = datetime.datetime.fromtimestamp(data[_EXPIRES_FIELD], datetime.timezone.utc)
+  if expires_at is not None:
+    data[_EXPIRES_FIELD] = expires_at
+  return data
+
+
+def _from_document(data: dict, now: float = None):
+  """
+  Converts Firestore document data back into the stored value. If now is given,
+  entries that expired but were not deleted by the TTL policy yet map to an empty
+  string.
+  """
+  expires_at = data.get(_EXPIRES_FIELD)
+  if isinstance(expires_at, datetime.datetime):
+    if now is not None and expires_at.timestamp() <= now:
+      return ""
+    data[_EXPIRES_FIELD] = expires_at.timestamp()
+  if isinstance(data.get(_VALUE_FIELD), bytes):
+    return data[_VALUE_FIELD]
+  return json.dumps(data)
+
+
 class FirestoreCache(LLMCache):
   """
   This class implements the DBIntegrationInterface class for Firestore.
+
+  Entries with a time-to-live carry an `expires_at` timestamp field. A Firestore TTL
+  policy on that field deletes them once they expire:
+
+    gcloud firestore fields ttls update expires_at --collection-group=COLLECTION --enable-ttl
   """
-  def __init__(self, collection_name, firestore_service_account_file):
-    try:
-      credentials = service_account.Credentials.from_service_account_file(firestore_service_account_file)
-      self._db = firestore.Client(credentials=credentials)
-      self._cache: firestore.CollectionReference = self._db.collection(collection_name)
-    except Exception as e:
-      logger.error(f"Error initializing Firestore cache: {e}.")
-      raise FirestoreCacheException(f"Firestore initialization failed: {e}") from e
+  supports_binary_values = True
+  supports_delete = True
+  supports_scan = True
+  supports_ttl = True
+  _clients = {}
+  _credentials = {}
+  # Asynchronous clients are bound to the event loop they are used on, so they are
+  # shared per event loop, then per service account file or injected client, as
+  # (injected client, asynchronous client) pairs.
+  _async_clients = weakref.WeakKeyDictionary()
+  _clients_lock = threading.Lock()
+
+  def __init__(self, collection_name, firestore_service_account_file=None, client=None,
+               async_client=None, **kwargs):
+    """
+    Creating a cache is cheap: the Firestore client libraries are imported and the
+    client is created on the first request. Caches using the same service account file
+    share one client, and one asynchronous client per event loop.
+
+    Args:
+      collection_name (str): The collection holding the cache documents.
+      firestore_service_account_file (str, optional): The service account key file.
+        Defaults to the application default credentials.
+      client (firestore.Client, optional): A client to use instead of the shared one.
+      async_client (firestore.AsyncClient, optional): An asynchronous client to use
+        instead of the shared one. Defaults to a client with the project and
+        credentials of client when client is given.
+      **kwargs: Options passed to LLMCache.
+    """
+    super().__init__(**kwargs)
+    if self.eviction is not None and self.eviction.max_entries is None \
+        and self.eviction.max_bytes is None:
+      logger.warning("EvictionPolicy sweeps read every document of the Firestore collection. "
+                     "Use a Firestore TTL policy on the expires_at field to delete expired "
+                     "entries, and an EvictionPolicy only for max_entries or max_bytes.")
+    self._collection_name = collection_name
+    self._service_account_file = firestore_service_account_file
+    self._client = client
+    self._injected_client = client
+    self._async_client = async_client
+    self._collection = None
+    self._async_cache = None
+    self._async_cache_loop = None
+
+  @classmethod
+  def _shared_credentials(cls, service_account_file: Optional[str]):
+    """
+    Returns the credentials loaded from a service account file, loading them once per
+    file. Must be called with the clients lock held.
+    """
+    if service_account_file is None:
+      return None
+    if service_account_file not in cls._credentials:
+      _import_firestore()
+      cls._credentials[service_account_file] = \
+        service_account.Credentials.from_service_account_file(service_account_file)
+    return cls._credentials[service_account_file]
+
+  @classmethod
+  def _shared_client(cls, service_account_file: Optional[str]):
+    """
+    Returns the client shared by the caches using the same service account file.
+    """
+    with cls._clients_lock:
+      client = cls._clients.get(service_account_file)
+      if client is None:
+        client = _import_firestore().Client(
+          credentials=cls._shared_credentials(service_account_file))
+        cls._clients[service_account_file] = client
+      return client
+
+  @classmethod
+  def _shared_async_client(cls, service_account_file: Optional[str], client=None):
+    """
+    Returns the asynchronous client shared on the current event loop by the caches
+    using the same service account file, or the same injected client.
+
+    Args:
+      service_account_file (str, optional): The service account key file.
+      client (firestore.Client, optional): The injected client, whose project and
+        credentials the asynchronous client uses.
+    """
+    import asyncio
+    loop = asyncio.get_event_loop()
+    # Injected clients are keyed by identity, and kept with their asynchronous client so
+    # that their identity is not reused.
+    source = service_account_file if client is None else id(client)
+    with cls._clients_lock:
+      loop_clients = cls._async_clients.setdefault(loop, {})
+      async_client = loop_clients.get(source, (None, None))[1]
+      if async_client is None:
+        if client is None:
+          async_client = _import_firestore().AsyncClient(
+            credentials=cls._shared_credentials(service_account_file))
+        else:
+          # Clients of named databases, supported by google-cloud-firestore 2.12+,
+          # carry their database name.
+          database = getattr(client, "_database", None)
+          async_client = _import_firestore().AsyncClient(
+            project=client.project, credentials=client._credentials,
+            **({"database": database} if database else {}))
+        loop_clients[source] = (client, async_client)
+      return async_client
+
+  @property
+  def _db(self):
+    """
+    The Firestore client, created on first use.
+
+    Raises:
+      FirestoreCacheException: If the client cannot be created.
+    """
+    if self._client is None:
+      try:
+        self._client = self._shared_client(self._service_account_file)
+      except Exception as e:
+        logger.error(f"Error initializing Firestore cache: {e}.")
+        raise FirestoreCacheException(f"Firestore initialization failed: {e}") from e
+    return self._client
 
+  def _expires_at(self, ttl: float = None) -> Optional[datetime.datetime]:
+    """
+    Returns the expiry time of an entry written now with a time-to-live, defaulting
+    to the time-to-live of the cache.
+    """
+    ttl = self.ttl if ttl is None else ttl
+    if ttl is None:
+      return None
+    return datetime.datetime.fromtimestamp(time.time() + ttl, datetime.timezone.utc)
+
+  @property
+  def _cache(self):
+    """
+    The reference of the cache collection.
+    """
+    if self._collection is None:
+      self._collection = self._db.collection(self._collection_name)
+    return self._collection
 
   def get_from_cache(self, key: str)->str:
     """
@@ -39,7 +244,7 @@ class FirestoreCache(LLMCache):
 
     Returns:
       str: A string containing the 'response' and 'cache_params' from the Firestore document.
-      If the document does not exist, returns an empty string.
+      If the document does not exist or has expired, returns an empty string.
 
     Raises:
       FirestoreCacheException: If there is an error retrieving the data from the Firestore database.
@@ -47,14 +252,13 @@ class FirestoreCache(LLMCache):
     try:
       doc: firestore.DocumentSnapshot = self._cache.document(key).get()
       if doc.exists:
-        result = doc.to_dict()
-        return json.dumps(result)
+        return _from_document(doc.to_dict(), time.time())
       return ""
     except Exception as e:
       logger.error(f"Error getting from cache: {e}.")
       raise FirestoreCacheException(f"Firestore get cache failed: {e}") from e
 
-  def add_to_cache(self, key: str, value: str)->bool:
+  def add_to_cache(self, key: str, value: str, ttl: float = None)->bool:
     """
     Sets the data associated with the key in a Firestore database.
 
@@ -67,6 +271,7 @@ class FirestoreCache(LLMCache):
     Args:
       key (str): The key identifying the document to set the data for.
       value (str): The data to set in the document.
+      ttl (float, optional): Time-to-live in seconds, overriding the default.
     Returns:
       bool: True if the data was successfully set.
 
@@ -79,8 +284,212 @@ class FirestoreCache(LLMCache):
       the collection is correctly specified in the implementation.
     """
     try:
-      value_dict = json.loads(value)
-      self._cache.document(key).set(value_dict)
+      self._cache.document(key).set(_to_document(value, self._expires_at(ttl)))
+      return True
+    except Exception as e:
+      logger.error(f"Error adding to cache: {e}.")
+      raise FirestoreCacheException(f"Firestore add cache failed: {e}") from e
+
+  def get_many_from_cache(self, keys: List[str]) -> List[str]:
+    """
+    Retrieves the documents of several keys with a single `get_all` request.
+
+    Args:
+      keys (List[str]): The keys identifying the documents to retrieve.
+
+    Returns:
+      List[str]: The data of each document in JSON format, in the order of keys.
+      Missing and expired documents map to an empty string.
+
+    Raises:
+      FirestoreCacheException: If there is an error retrieving the data from the Firestore database.
+    """
+    try:
+      now = time.time()
+      found = {}
+      for doc in self._db.get_all([self._cache.document(key) for key in keys]):
+        if doc.exists:
+          found[doc.id] = _from_document(doc.to_dict(), now)
+      return [found.get(key, "") for key in keys]
+    except Exception as e:
+      logger.error(f"Error getting from cache: {e}.")
+      raise FirestoreCacheException(f"Firestore get cache failed: {e}") from e
+
+  def add_many_to_cache(self, items: Dict[str, str], ttl: float = None) -> bool:
+    """
+    Sets the documents of several keys using batched writes of up to 500 documents.
+
+    Args:
+      items (Dict[str, str]): The data to set in JSON format, keyed by document key.
+      ttl (float, optional): Time-to-live in seconds, overriding the default.
+
+    Returns:
+      bool: True if the data was successfully set.
+
+    Raises:
+      FirestoreCacheException: If there is an error setting the data in the Firestore database.
+    """
+    try:
+      expires_at = self._expires_at(ttl)
+      keys = list(items)
+      for start in range(0, len(keys), _MAX_BATCH_SIZE):
+        batch = self._db.batch()
+        for key in keys[start:start + _MAX_BATCH_SIZE]:
+          batch.set(self._cache.document(key), _to_document(items[key], expires_at))
+        batch.commit()
+      return True
+    except Exception as e:
+      logger.error(f"Error adding to cache: {e}.")
+      raise FirestoreCacheException(f"Firestore add cache failed: {e}") from e
+
+  def delete_from_cache(self, key: str) -> bool:
+    """
+    Deletes the document of a key.
+
+    Args:
+      key (str): The key to remove.
+
+    Returns:
+      bool: Always True, since Firestore does not report whether the document existed.
+
+    Raises:
+      FirestoreCacheException: If there is an error deleting the document.
+    """
+    try:
+      self._cache.document(key).delete()
+      return True
+    except Exception as e:
+      logger.error(f"Error deleting from cache: {e}.")
+      raise FirestoreCacheException(f"Firestore delete cache failed: {e}") from e
+
+  def delete_many_from_cache(self, keys: List[str]) -> int:
+    """
+    Deletes the documents of several keys using batched writes of up to 500 documents.
+
+    Args:
+      keys (List[str]): The keys to remove.
+
+    Returns:
+      int: The number of removed keys.
+
+    Raises:
+      FirestoreCacheException: If there is an error during the delete.
+    """
+    try:
+      for start in range(0, len(keys), _MAX_BATCH_SIZE):
+        batch = self._db.batch()
+        for key in keys[start:start + _MAX_BATCH_SIZE]:
+          batch.delete(self._cache.document(key))
+        batch.commit()
+      return len(keys)
+    except Exception as e:
+      logger.error(f"Error deleting from cache: {e}.")
+      raise FirestoreCacheException(f"Firestore delete cache failed: {e}") from e
+
+  def scan_cache(self, cursor: str = None, prefix: str = "",
+                 limit: int = 1000) -> Tuple[List[tuple], Optional[str]]:
+    """
+    Returns a page of the documents whose key starts with prefix, in key order, with
+    one query ordered by document ID. The metadata holds the creation time of the
+    documents.
+
+    Args:
+      cursor (str, optional): The cursor returned with the previous page, or None for
+        the first page.
+      prefix (str, optional): The prefix of the listed keys.
+      limit (int, optional): Maximum number of entries of the page.
+
+    Returns:
+      List[tuple]: The (key, value, metadata) entries of the page.
+      Optional[str]: The cursor of the next page, or None if this is the last page.
+
+    Raises:
+      FirestoreCacheException: If there is an error during the scan.
+    """
+    try:
+      document_id = _import_firestore().FieldPath.document_id()
+      query = self._cache.order_by(document_id)
+      if cursor is not None and cursor >= prefix:
+        query = query.where(document_id, ">", self._cache.document(cursor))
+      elif prefix:
+        query = query.where(document_id, ">=", self._cache.document(prefix))
+      end = prefix_end(prefix)
+      if end is not None:
+        query = query.where(document_id, "<", self._cache.document(end))
+      docs = list(query.limit(limit + 1).stream())
+      entries = [(doc.id, _from_document(doc.to_dict()),
+                  {"created_at": doc.create_time.timestamp() if doc.create_time else None})
+                 for doc in docs[:limit]]
+      return entries, entries[-1][0] if len(docs) > limit else None
+    except Exception as e:
+      logger.error(f"Error scanning cache: {e}.")
+      raise FirestoreCacheException(f"Firestore scan cache failed: {e}") from e
+
+  def _get_async_cache(self) -> "firestore.AsyncCollectionReference":
+    """
+    Returns the collection reference of the asynchronous client on the current event
+    loop, creating the client on first use.
+
+    Raises:
+      FirestoreCacheException: If the client cannot be created.
+    """
+    if self._async_client is not None:
+      if self._async_cache is None:
+        self._async_cache = self._async_client.collection(self._collection_name)
+      return self._async_cache
+    import asyncio
+    loop = asyncio.get_event_loop()
+    if self._async_cache is None or self._async_cache_loop() is not loop:
+      try:
+        async_db = self._shared_async_client(self._service_account_file, self._injected_client)
+      except Exception as e:
+        logger.error(f"Error initializing Firestore cache: {e}.")
+        raise FirestoreCacheException(f"Firestore initialization failed: {e}") from e
+      self._async_cache = async_db.collection(self._collection_name)
+      self._async_cache_loop = weakref.ref(loop)
+    return self._async_cache
+
+  async def aget_from_cache(self, key: str) -> str:
+    """
+    Retrieves the data associated with the specified key using the asynchronous
+    Firestore client.
+
+    Args:
+      key (str): The key identifying the document to retrieve the data from.
+
+    Returns:
+      str: A string containing the 'response' and 'cache_params' from the Firestore document.
+      If the document does not exist or has expired, returns an empty string.
+
+    Raises:
+      FirestoreCacheException: If there is an error retrieving the data from the Firestore database.
+    """
+    try:
+      doc = await self._get_async_cache().document(key).get()
+      if doc.exists:
+        return _from_document(doc.to_dict(), time.time())
+      return ""
+    except Exception as e:
+      logger.error(f"Error getting from cache: {e}.")
+      raise FirestoreCacheException(f"Firestore get cache failed: {e}") from e
+
+  async def aadd_to_cache(self, key: str, value: str, ttl: float = None) -> bool:
+    """
+    Sets the data associated with the key using the asynchronous Firestore client.
+
+    Args:
+      key (str): The key identifying the document to set the data for.
+      value (str): The data to set in the document.
+      ttl (float, optional): Time-to-live in seconds, overriding the default.
+
+    Returns:
+      bool: True if the data was successfully set.
+
+    Raises:
+      FirestoreCacheException: If there is an error setting the data in the Firestore database.
+    """
+    try:
+      await self._get_async_cache().document(key).set(_to_document(value, self._expires_at(ttl)))
       return True
     except Exception as e:
       logger.error(f"Error adding to cache: {e}.")
@@ -1,10 +1,24 @@
 """This module implements a local cache using a JSON file."""
-from ..llm_cache import LLMCache
+from ..llm_cache import LLMCache, page_sorted_keys
+from ..value_codecs import to_text
+from typing import Dict, List, Optional, Tuple
 import json
 import logging
 import os
+import tempfile
+import threading
+import time
+
+try:
+  import fcntl
+except ImportError:
+  fcntl = None
+
+try:
+  import msvcrt
+except ImportError:
+  msvcrt = None
 
-logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 
 class LocalCache(LLMCache):
@@ -13,9 +27,31 @@ class LocalCache(LLMCache):
 
   This class allows storing and retrieving key-value pairs in a local JSON file.
   It is useful for scenarios where a lightweight, file-based cache is required.
+
+  The file can be shared by several processes on one host. Writers serialize their
+  read-modify-write cycles with an exclusive lock on a sidecar lock file, and replace
+  the JSON file atomically, so readers never see a partially written file and never
+  wait for writers.
   """
-  def __init__(self, file_path: str):
+  supports_delete = True
+  supports_scan = True
+
+  def __init__(self, file_path: str, lock_path: str = None, fsync: bool = False, **kwargs):
+    """
+    Args:
+      file_path (str): Path of the JSON file.
+      lock_path (str, optional): Path of the lock file. Defaults to file_path + ".lock".
+      fsync (bool, optional): Whether to fsync the file before it replaces the previous version.
+      **kwargs: Options passed to LLMCache.
+    """
+    super().__init__(**kwargs)
     self.file_path = file_path
+    self.lock_path = lock_path or file_path + ".lock"
+    self.fsync = fsync
+    self._thread_lock = threading.Lock()
+    self._snapshot = None
+    self._snapshot_stat = None
+    self._sorted_keys = None
     self._ensure_file_exists()
 
   def _ensure_file_exists(self):
@@ -24,27 +60,79 @@ class LocalCache(LLMCache):
     If the file does not exist, creates a new file with an empty JSON object.
     """
     if not os.path.exists(self.file_path):
-      with open(self.file_path, "w", encoding="utf=8") as file:
-        json.dump({}, file)
+      with self._write_lock():
+        if not os.path.exists(self.file_path):
+          self._write_cache({})
+
+  def _write_lock(self) -> "_FileLock":
+    """
+    Returns the lock serializing writers across threads and processes.
+    """
+    return _FileLock(self.lock_path, self._thread_lock)
+
+  def _write_cache(self, cache: dict):
+    """
+    Writes the cache to a temporary file next to the JSON file and renames it over
+    the JSON file. Must be called with the write lock held.
+    """
+    directory, name = os.path.split(os.path.abspath(self.file_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+    try:
+      with os.fdopen(fd, "w", encoding="utf-8") as file:
+        json.dump(cache, file, indent=2)
+        if self.fsync:
+          file.flush()
+          os.fsync(file.fileno())
+      os.replace(tmp_path, self.file_path)
+      stat = os.stat(self.file_path)
+      self._snapshot, self._snapshot_stat = cache, (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    except BaseException:
+      if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+      raise
 
   def _read_cache(self)->dict:
     """
-    Reads and returns the content of the cache from the JSON file.
+    Reads and returns the content of the cache from the JSON file. The parsed content
+    is reused as long as the file has not been replaced since it was read.
 
     Returns:
-      dict: The content of the cache as a dictionary.
+      dict: The content of the cache as a dictionary. It must not be modified.
 
     Raises:
       LocalCacheException: If there is an error reading the file.
     """
     try:
       with open(self.file_path, "r", encoding="utf-8") as file:
-        return json.load(file)
+        stat = os.fstat(file.fileno())
+        file_stat = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        snapshot = self._snapshot
+        if snapshot is not None and self._snapshot_stat == file_stat:
+          return snapshot
+        cache = json.load(file)
+      self._snapshot, self._snapshot_stat = cache, file_stat
+      return cache
     except json.JSONDecodeError:
       logger.error("Error reading from cache: JSON file is empty or malformed." \
                    " Returning empty cache.")
       return {}
 
+  @staticmethod
+  def _from_value(value: str):
+    """
+    Converts a value into its representation in the JSON file. JSON values are
+    stored as objects so the file stays readable, other values as strings.
+    """
+    value = to_text(value)
+    return json.loads(value) if value.startswith("{") else value
+
+  @staticmethod
+  def _to_value(stored) -> str:
+    """
+    Converts an entry of the JSON file back into the stored value.
+    """
+    return stored if isinstance(stored, str) else json.dumps(stored)
+
   def get_from_cache(self, key: str)->str:
     """
     Retrieves the value associated with a given key from the cache.
@@ -63,8 +151,7 @@ class LocalCache(LLMCache):
       cache = self._read_cache()
       if key not in cache:
         return ""
-      res = cache.get(key)
-      return json.dumps(res)
+      return self._to_value(cache.get(key))
     except Exception as e:
       logger.error(f"Error reading from cache: {e}")
       raise LocalCacheException(f"Error reading from cache: {e}") from e
@@ -83,17 +170,176 @@ class LocalCache(LLMCache):
     Raises:
       LocalCacheException: If there is an error during the update process.
     """
+    try:
+      stored = self._from_value(value)
+      with self._write_lock():
+        cache = dict(self._read_cache())
+        cache[key] = stored
+        self._write_cache(cache)
+      return True
+    except Exception as e:
+      logger.error(f"Error writing to cache: {e}")
+      raise LocalCacheException(f"Error writing to cache: {e}") from e
+
+  def get_many_from_cache(self, keys: List[str]) -> List[str]:
+    """
+    Retrieves the values associated with several keys with a single read of the file.
+
+    Args:
+      keys (List[str]): The keys for which the values need to be retrieved.
+
+    Returns:
+      List[str]: The value of each key in JSON format, in the order of keys.
+      Missing keys map to an empty string.
+
+    Raises:
+      LocalCacheException: If there is an error during the retrieval process.
+    """
     try:
       cache = self._read_cache()
-      value_dict = json.loads(value)
-      cache[key] = value_dict
-      with open(self.file_path, "w", encoding="utf=8") as file:
-        json.dump(cache, file, indent=2)
+      return [self._to_value(cache[key]) if key in cache else "" for key in keys]
+    except Exception as e:
+      logger.error(f"Error reading from cache: {e}")
+      raise LocalCacheException(f"Error reading from cache: {e}") from e
+
+  def add_many_to_cache(self, items: Dict[str, str]) -> bool:
+    """
+    Adds or updates several key-value pairs with a single read and write of the file.
+
+    Args:
+      items (Dict[str, str]): The values to store in JSON format, keyed by cache key.
+
+    Returns:
+      bool: True if the operation was successful.
+
+    Raises:
+      LocalCacheException: If there is an error during the update process.
+    """
+    try:
+      stored = {key: self._from_value(value) for key, value in items.items()}
+      with self._write_lock():
+        cache = dict(self._read_cache())
+        cache.update(stored)
+        self._write_cache(cache)
       return True
     except Exception as e:
       logger.error(f"Error writing to cache: {e}")
       raise LocalCacheException(f"Error writing to cache: {e}") from e
 
+  def delete_from_cache(self, key: str) -> bool:
+    """
+    Removes a key from the cache.
+
+    Args:
+      key (str): The key to remove.
+
+    Returns:
+      bool: True if the key was present.
+
+    Raises:
+      LocalCacheException: If there is an error during the update process.
+    """
+    return self.delete_many_from_cache([key]) > 0
+
+  def delete_many_from_cache(self, keys: List[str]) -> int:
+    """
+    Removes several keys from the cache in a single rewrite of the JSON file.
+
+    Args:
+      keys (List[str]): The keys to remove.
+
+    Returns:
+      int: The number of removed keys.
+
+    Raises:
+      LocalCacheException: If there is an error during the delete.
+    """
+    try:
+      with self._write_lock():
+        cache = self._read_cache()
+        present = [key for key in keys if key in cache]
+        if present:
+          cache = dict(cache)
+          for key in present:
+            cache.pop(key, None)
+          self._write_cache(cache)
+      return len(present)
+    except Exception as e:
+      logger.error(f"Error deleting from cache: {e}")
+      raise LocalCacheException(f"Error deleting from cache: {e}") from e
+
+  def scan_cache(self, cursor: str = None, prefix: str = "",
+                 limit: int = 1000) -> Tuple[List[tuple], Optional[str]]:
+    """
+    Returns a page of the entries whose key starts with prefix, in key order. The sorted
+    keys are reused as long as the JSON file has not been replaced.
+
+    Args:
+      cursor (str, optional): The cursor returned with the previous page, or None for
+        the first page.
+      prefix (str, optional): The prefix of the listed keys.
+      limit (int, optional): Maximum number of entries of the page.
+
+    Returns:
+      List[tuple]: The (key, value, metadata) entries of the page.
+      Optional[str]: The cursor of the next page, or None if this is the last page.
+
+    Raises:
+      LocalCacheException: If there is an error during the scan.
+    """
+    try:
+      cache = self._read_cache()
+      if self._sorted_keys is None or self._sorted_keys[0] is not cache:
+        self._sorted_keys = (cache, sorted(cache))
+      keys, next_cursor = page_sorted_keys(self._sorted_keys[1], cursor, prefix, limit)
+      return [(key, self._to_value(cache[key]), {}) for key in keys], next_cursor
+    except Exception as e:
+      logger.error(f"Error scanning cache: {e}")
+      raise LocalCacheException(f"Error scanning cache: {e}") from e
+
+class _FileLock:
+  """
+  An exclusive lock held on a lock file, shared by the threads of a process through
+  thread_lock and by processes through flock on POSIX or msvcrt.locking on Windows.
+  """
+  def __init__(self, path: str, thread_lock: threading.Lock):
+    self.path = path
+    self.thread_lock = thread_lock
+    self._file = None
+
+  def __enter__(self):
+    self.thread_lock.acquire()
+    try:
+      self._file = open(self.path, "a+b")
+      if fcntl is not None:
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+      elif msvcrt is not None:
+        self._file.seek(0)
+        while True:
+          try:
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+            break
+          except OSError:
+            time.sleep(0.01)
+    except BaseException:
+      if self._file is not None:
+        self._file.close()
+      self.thread_lock.release()
+      raise
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    try:
+      if fcntl is not None:
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+      elif msvcrt is not None:
+        self._file.seek(0)
+        msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+      self._file.close()
+      self.thread_lock.release()
+
+
 class LocalCacheException(Exception):
   """
   This class defines an exception for LocalCache.
@@ -0,0 +1,631 @@
+"""
+This module implements the LogCache class, a local cache backed by an append-only
+record log and an in-memory key to offset index.
+"""
+from ..llm_cache import LLMCache, page_sorted_keys
+from ..value_codecs import bytes_to_value, value_to_bytes
+from typing import Dict, List, Optional, Tuple
+import json
+import logging
+import os
+import struct
+import threading
+import zlib
+
+logger = logging.getLogger(__name__)
+
+_LOG_MAGIC = b"NBLC"
+_INDEX_MAGIC = b"NBLI"
+_FORMAT_VERSION = 1
+# magic, format version, generation
+_LOG_HEADER = struct.Struct("<4sBQ")
+# crc32, flags, key length, value length
+_RECORD_HEADER = struct.Struct("<IBHI")
+# magic, format version, generation, covered log size, entry count, dead bytes
+_INDEX_HEADER = struct.Struct("<4sBQQQQ")
+# key length, value offset, value length
+_INDEX_ENTRY = struct.Struct("<HQI")
+
+_FLAG_PUT = 0
+_FLAG_DELETE = 1
+_FLAG_APPEND = 2
+
+
+class LogCache(LLMCache):
+  """
+  Implements a local cache that appends every write to a record log.
+
+  Each `add_to_cache` appends a single record to the end of the log file and
+  updates an in-memory index mapping keys to value offsets, so inserts and lookups
+  cost O(1) regardless of the number of cached entries. The index is rebuilt by
+  scanning the log at open time, or loaded from a snapshot file written on `close`
+  and after compaction. Superseded records are reclaimed by a background compaction
+  that rewrites the live records into a fresh log.
+
+  Appends to a key are stored as records of their own and concatenated on read,
+  which lets long streams be persisted while they run.
+
+  The log is owned by a single process; concurrent access from several threads of
+  that process is safe.
+  """
+  supports_binary_values = True
+  supports_append = True
+  supports_delete = True
+  supports_scan = True
+
+  def __init__(self, file_path: str,
+               index_path: str = None,
+               fsync: bool = False,
+               compaction_min_bytes: int = 64 * 1024 * 1024,
+               compaction_ratio: float = 0.5,
+               background_compaction: bool = True,
+               **kwargs):
+    """
+    Opens the log at file_path, creating it if it does not exist.
+
+    Args:
+      file_path (str): Path of the record log.
+      index_path (str, optional): Path of the index snapshot. Defaults to file_path + ".idx".
+      fsync (bool, optional): Whether to fsync the log after every write.
+      compaction_min_bytes (int, optional): Minimum number of superseded bytes before
+        a compaction is considered.
+      compaction_ratio (float, optional): Fraction of superseded bytes in the log
+        above which a compaction is triggered.
+      background_compaction (bool, optional): Whether compactions are started automatically
+        in a background thread.
+      **kwargs: Options passed to LLMCache.
+
+    Raises:
+      LogCacheException: If the log cannot be opened.
+    """
+    super().__init__(**kwargs)
+    self.file_path = file_path
+    self.index_path = index_path or file_path + ".idx"
+    self.fsync = fsync
+    self.compaction_min_bytes = compaction_min_bytes
+    self.compaction_ratio = compaction_ratio
+    self.background_compaction = background_compaction
+    self._lock = threading.RLock()
+    self._compaction_lock = threading.Lock()
+    self._compaction_thread = None
+    self._index = {}
+    self._sorted_keys = None
+    self._dead_bytes = 0
+    try:
+      self._open()
+    except Exception as e:
+      logger.error(f"Error opening log cache: {e}")
+      raise LogCacheException(f"Error opening log cache: {e}") from e
+
+  def _open(self):
+    """
+    Opens the log file handles and builds the in-memory index.
+    """
+    if not os.path.exists(self.file_path) or os.path.getsize(self.file_path) == 0:
+      with open(self.file_path, "wb") as file:
+        file.write(_LOG_HEADER.pack(_LOG_MAGIC, _FORMAT_VERSION, 0))
+    self._reader = open(self.file_path, "rb")
+    magic, version, generation = _LOG_HEADER.unpack(self._reader.read(_LOG_HEADER.size))
+    if magic != _LOG_MAGIC or version != _FORMAT_VERSION:
+      self._reader.close()
+      raise LogCacheException(f"{self.file_path} is not a log cache file.")
+    self._generation = generation
+    self._size = _LOG_HEADER.size
+    self._load_index()
+    self._writer = open(self.file_path, "ab")
+
+  def _load_index(self):
+    """
+    Loads the index snapshot if it matches the log and replays the records
+    appended after it. Falls back to a full scan of the log otherwise.
+    """
+    file_size = os.path.getsize(self.file_path)
+    if os.path.exists(self.index_path):
+      try:
+        with open(self.index_path, "rb") as file:
+          data = file.read()
+        magic, version, generation, covered, count, dead_bytes = _INDEX_HEADER.unpack_from(data)
+        if (magic == _INDEX_MAGIC and version == _FORMAT_VERSION
+            and generation == self._generation and covered <= file_size):
+          index = {}
+          pos = _INDEX_HEADER.size
+          for _ in range(count):
+            key_length, offset, length = _INDEX_ENTRY.unpack_from(data, pos)
+            pos += _INDEX_ENTRY.size
+            key = data[pos:pos + key_length].decode("utf-8")
+            # Keys with appended data have one entry per segment.
+            index[key] = self._extend_entry(index.get(key), (offset, length))
+            pos += key_length
+          self._index = index
+          self._dead_bytes = dead_bytes
+          self._size = covered
+        else:
+          logger.info("Index snapshot does not match the log. Rebuilding the index.")
+      except Exception as e:
+        logger.warning(f"Error reading index snapshot: {e}. Rebuilding the index.")
+        self._index = {}
+        self._dead_bytes = 0
+        self._size = _LOG_HEADER.size
+    self._replay(self._size, file_size)
+
+  def _replay(self, start: int, end: int):
+    """
+    Applies the records between start and end to the index. A truncated or corrupt
+    record at the tail of the log, left behind by an interrupted write, is cut off.
+
+    Args:
+      start (int): Offset of the first record to replay.
+      end (int): Offset up to which records are replayed.
+    """
+    self._reader.seek(start)
+    pos = start
+    while pos < end:
+      header = self._reader.read(_RECORD_HEADER.size)
+      if len(header) < _RECORD_HEADER.size:
+        break
+      crc, flags, key_length, value_length = _RECORD_HEADER.unpack(header)
+      body = self._reader.read(key_length + value_length)
+      if len(body) < key_length + value_length or zlib.crc32(header[4:] + body) != crc:
+        break
+      record_length = _RECORD_HEADER.size + key_length + value_length
+      self._apply(body[:key_length].decode("utf-8"), flags,
+                  pos + _RECORD_HEADER.size + key_length, value_length, record_length)
+      pos += record_length
+    if pos < end:
+      logger.warning(f"Discarding {end - pos} bytes of incomplete records at the end of the log.")
+      with open(self.file_path, "r+b") as file:
+        file.truncate(pos)
+    self._size = pos
+
+  def _apply(self, key: str, flags: int, value_offset: int, value_length: int,
+             record_length: int):
+    """
+    Updates the index and the superseded byte count for a single record.
+    """
+    self._sorted_keys = None
+    if flags == _FLAG_APPEND:
+      self._index[key] = self._extend_entry(self._index.get(key), (value_offset, value_length))
+      return
+    previous = self._index.pop(key, None)
+    if previous is not None:
+      segments = previous if isinstance(previous, list) else [previous]
+      self._dead_bytes += sum(_RECORD_HEADER.size + len(key.encode("utf-8")) + length
+                              for _, length in segments)
+    if flags == _FLAG_DELETE:
+      self._dead_bytes += record_length
+    else:
+      self._index[key] = (value_offset, value_length)
+
+  @staticmethod
+  def _extend_entry(entry, segment: tuple):
+    """
+    Adds an appended segment to an index entry, which becomes a list of segments.
+    """
+    if entry is None:
+      return segment
+    if isinstance(entry, list):
+      entry.append(segment)
+      return entry
+    return [entry, segment]
+
+  def _read_entry(self, entry) -> bytes:
+    """
+    Reads the value of an index entry, concatenating appended segments.
+    """
+    if isinstance(entry, list):
+      return b"".join(self._read_value(offset, length) for offset, length in entry)
+    return self._read_value(*entry)
+
+  def _read_value(self, offset: int, length: int) -> bytes:
+    """
+    Reads length bytes at offset from the log.
+    """
+    if hasattr(os, "pread"):
+      return os.pread(self._reader.fileno(), length, offset)
+    with self._lock:
+      self._reader.seek(offset)
+      return self._reader.read(length)
+
+  @staticmethod
+  def _encode_record(key: bytes, value: bytes, flags: int = _FLAG_PUT) -> bytes:
+    """
+    Encodes a single log record.
+    """
+    body = struct.pack("<BHI", flags, len(key), len(value)) + key + value
+    return struct.pack("<I", zlib.crc32(body)) + body
+
+  def _append(self, records: list):
+    """
+    Appends encoded records to the log and applies them to the index.
+
+    Args:
+      records (list): (key, flags, encoded key length, value length, record) tuples.
+    """
+    with self._lock:
+      pos = self._size
+      self._writer.write(b"".join(record for _, _, _, _, record in records))
+      self._writer.flush()
+      if self.fsync:
+        os.fsync(self._writer.fileno())
+      for key, flags, key_length, value_length, record in records:
+        self._apply(key, flags, pos + _RECORD_HEADER.size + key_length, value_length, len(record))
+        pos += len(record)
+      self._size = pos
+    self._maybe_compact()
+
+  def get_from_cache(self, key: str) -> str:
+    """
+    Retrieves the value associated with a given key from the log.
+
+    Args:
+      key (str): The key for which the value needs to be retrieved.
+
+    Returns:
+      str: The value associated with the key. Returns an empty string if the key is not found.
+
+    Raises:
+      LogCacheException: If there is an error during the retrieval process.
+    """
+    try:
+      with self._lock:
+        entry = self._index.get(key)
+        if entry is None:
+          return ""
+        return bytes_to_value(self._read_entry(entry))
+    except Exception as e:
+      logger.error(f"Error reading from cache: {e}")
+      raise LogCacheException(f"Error reading from cache: {e}") from e
+
+  def add_to_cache(self, key: str, value: str) -> bool:
+    """
+    Appends a key-value pair to the log, superseding any earlier value of the key.
+
+    Args:
+      key (str): The key under which the value should be stored.
+      value (str): The value to store in the cache.
+
+    Returns:
+      bool: True if the operation was successful.
+
+    Raises:
+      LogCacheException: If there is an error during the write.
+    """
+    try:
+      encoded_key = key.encode("utf-8")
+      encoded_value = value_to_bytes(value)
+      record = self._encode_record(encoded_key, encoded_value)
+      self._append([(key, _FLAG_PUT, len(encoded_key), len(encoded_value), record)])
+      return True
+    except Exception as e:
+      logger.error(f"Error writing to cache: {e}")
+      raise LogCacheException(f"Error writing to cache: {e}") from e
+
+  def get_many_from_cache(self, keys: List[str]) -> List[str]:
+    """
+    Retrieves the values associated with several keys.
+
+    Args:
+      keys (List[str]): The keys for which the values need to be retrieved.
+
+    Returns:
+      List[str]: The value of each key, in the order of keys. Missing keys map to an empty string.
+
+    Raises:
+      LogCacheException: If there is an error during the retrieval process.
+    """
+    try:
+      with self._lock:
+        entries = [self._index.get(key) for key in keys]
+        return ["" if entry is None else bytes_to_value(self._read_entry(entry))
+                for entry in entries]
+    except Exception as e:
+      logger.error(f"Error reading from cache: {e}")
+      raise LogCacheException(f"Error reading from cache: {e}") from e
+
+  def add_many_to_cache(self, items: Dict[str, str]) -> bool:
+    """
+    Appends several key-value pairs to the log with a single write.
+
+    Args:
+      items (Dict[str, str]): The values to store, keyed by cache key.
+
+    Returns:
+      bool: True if the operation was successful.
+
+    Raises:
+      LogCacheException: If there is an error during the write.
+    """
+    try:
+      records = []
+      for key, value in items.items():
+        encoded_key = key.encode("utf-8")
+        encoded_value = value_to_bytes(value)
+        records.append((key, _FLAG_PUT, len(encoded_key), len(encoded_value),
+                        self._encode_record(encoded_key, encoded_value)))
+      if records:
+        self._append(records)
+      return True
+    except Exception as e:
+      logger.error(f"Error writing to cache: {e}")
+      raise LogCacheException(f"Error writing to cache: {e}") from e
+
+  def append_to_cache(self, key: str, data: bytes) -> bool:
+    """
+    Appends data to the value of a key with a single record, creating the key if needed.
+
+    Args:
+      key (str): The key to append the data to.
+      data (bytes): The data to append.
+
+    Returns:
+      bool: True if the operation was successful.
+
+    Raises:
+      LogCacheException: If there is an error during the write.
+    """
+    try:
+      encoded_key = key.encode("utf-8")
+      record = self._encode_record(encoded_key, data, _FLAG_APPEND)
+      self._append([(key, _FLAG_APPEND, len(encoded_key), len(data), record)])
+      return True
+    except Exception as e:
+      logger.error(f"Error appending to cache: {e}")
+      raise LogCacheException(f"Error appending to cache: {e}") from e
+
+  def get_appended_from_cache(self, key: str) -> bytes:
+    """
+    Retrieves the bytes appended to a key.
+
+    Args:
+      key (str): The key for which the data needs to be retrieved.
+
+    Returns:
+      bytes: The data associated with the key. Returns empty bytes if the key is not found.
+
+    Raises:
+      LogCacheException: If there is an error during the retrieval process.
+    """
+    try:
+      with self._lock:
+        entry = self._index.get(key)
+        return b"" if entry is None else self._read_entry(entry)
+    except Exception as e:
+      logger.error(f"Error reading from cache: {e}")
+      raise LogCacheException(f"Error reading from cache: {e}") from e
+
+  def delete_from_cache(self, key: str) -> bool:
+    """
+    Removes a key from the cache by appending a tombstone record.
+
+    Args:
+      key (str): The key to remove.
+
+    Returns:
+      bool: True if the key was present.
+
+    Raises:
+      LogCacheException: If there is an error during the write.
+    """
+    if key not in self._index:
+      return False
+    try:
+      encoded_key = key.encode("utf-8")
+      record = self._encode_record(encoded_key, b"", _FLAG_DELETE)
+      self._append([(key, _FLAG_DELETE, len(encoded_key), 0, record)])
+      return True
+    except Exception as e:
+      logger.error(f"Error deleting from cache: {e}")
+      raise LogCacheException(f"Error deleting from cache: {e}") from e
+
+  def delete_many_from_cache(self, keys: List[str]) -> int:
+    """
+    Removes several keys from the cache by appending their tombstone records in
+    one write.
+
+    Args:
+      keys (List[str]): The keys to remove.
+
+    Returns:
+      int: The number of removed keys.
+
+    Raises:
+      LogCacheException: If there is an error during the delete.
+    """
+    try:
+      with self._lock:
+        records = []
+        for key in dict.fromkeys(keys):
+          if key in self._index:
+            encoded_key = key.encode("utf-8")
+            records.append((key, _FLAG_DELETE, len(encoded_key), 0,
+                            self._encode_record(encoded_key, b"", _FLAG_DELETE)))
+        if records:
+          self._append(records)
+      return len(records)
+    except Exception as e:
+      logger.error(f"Error deleting from cache: {e}")
+      raise LogCacheException(f"Error deleting from cache: {e}") from e
+
+  def scan_cache(self, cursor: str = None, prefix: str = "",
+                 limit: int = 1000) -> Tuple[List[tuple], Optional[str]]:
+    """
+    Returns a page of the entries whose key starts with prefix, in key order. The sorted
+    keys are kept until the next write.
+
+    Args:
+      cursor (str, optional): The cursor returned with the previous page, or None for
+        the first page.
+      prefix (str, optional): The prefix of the listed keys.
+      limit (int, optional): Maximum number of entries of the page.
+
+    Returns:
+      List[tuple]: The (key, value, metadata) entries of the page.
+      Optional[str]: The cursor of the next page, or None if this is the last page.
+
+    Raises:
+      LogCacheException: If there is an error during the scan.
+    """
+    try:
+      with self._lock:
+        if self._sorted_keys is None:
+          self._sorted_keys = sorted(self._index)
+        keys, next_cursor = page_sorted_keys(self._sorted_keys, cursor, prefix, limit)
+        entries = [(key, self._read_entry(self._index[key])) for key in keys]
+      return [(key, bytes_to_value(data), {}) for key, data in entries], next_cursor
+    except Exception as e:
+      logger.error(f"Error scanning cache: {e}")
+      raise LogCacheException(f"Error scanning cache: {e}") from e
+
+  def import_local_cache(self, json_path: str) -> int:
+    """
+    Imports every entry of a LocalCache JSON file into the log in a single write pass.
+
+    Args:
+      json_path (str): Path of the LocalCache JSON file.
+
+    Returns:
+      int: The number of imported entries.
+
+    Raises:
+      LogCacheException: If the file cannot be read or written.
+    """
+    try:
+      with open(json_path, "r", encoding="utf-8") as file:
+        entries = json.load(file)
+      records = []
+      for key, value in entries.items():
+        encoded_key = key.encode("utf-8")
+        encoded_value = value_to_bytes(value if isinstance(value, str) else json.dumps(value))
+        records.append((key, _FLAG_PUT, len(encoded_key), len(encoded_value),
+                        self._encode_record(encoded_key, encoded_value)))
+      if records:
+        self._append(records)
+      logger.info(f"Imported {len(records)} entries from {json_path}.")
+      return len(records)
+    except Exception as e:
+      logger.error(f"Error importing local cache: {e}")
+      raise LogCacheException(f"Error importing local cache: {e}") from e
+
+  def _maybe_compact(self):
+    """
+    Starts a background compaction when enough of the log has been superseded.
+    """
+    if not self.background_compaction or self._dead_bytes < self.compaction_min_bytes:
+      return
+    if self._dead_bytes < self._size * self.compaction_ratio:
+      return
+    with self._lock:
+      if self._compaction_thread is not None and self._compaction_thread.is_alive():
+        return
+      self._compaction_thread = threading.Thread(target=self._compact_in_background,
+                                                 name="LogCacheCompaction", daemon=True)
+      self._compaction_thread.start()
+
+  def _compact_in_background(self):
+    try:
+      self.compact()
+    except Exception as e:
+      logger.error(f"Error compacting log cache: {e}")
+
+  def compact(self):
+    """
+    Rewrites the live records into a new log and atomically replaces the old one.
+
+    Live records are copied without holding the cache lock, so reads and writes
+    proceed during the copy. Records appended meanwhile are carried over under
+    the lock right before the swap.
+
+    Raises:
+      LogCacheException: If the compaction fails.
+    """
+    with self._compaction_lock:
+      tmp_path = self.file_path + ".compact"
+      try:
+        with self._lock:
+          # Entries of appended values are lists extended in place by later appends,
+          # which the tail below carries over, so they are copied.
+          snapshot = [(key, list(entry) if isinstance(entry, list) else entry)
+                      for key, entry in self._index.items()]
+          copied_up_to = self._size
+          generation = self._generation + 1
+        new_index = {}
+        with open(tmp_path, "wb") as out:
+          pos = out.write(_LOG_HEADER.pack(_LOG_MAGIC, _FORMAT_VERSION, generation))
+          for key, entry in snapshot:
+            encoded_key = key.encode("utf-8")
+            value = self._read_entry(entry)
+            record = self._encode_record(encoded_key, value)
+            out.write(record)
+            new_index[key] = (pos + _RECORD_HEADER.size + len(encoded_key), len(value))
+            pos += len(record)
+          with self._lock:
+            self._writer.flush()
+            tail = self._read_value(copied_up_to, self._size - copied_up_to)
+            out.write(tail)
+            tail_start = pos
+            pos += len(tail)
+            out.flush()
+            os.fsync(out.fileno())
+            self._writer.close()
+            self._reader.close()
+            os.replace(tmp_path, self.file_path)
+            self._reader = open(self.file_path, "rb")
+            self._writer = open(self.file_path, "ab")
+            self._generation = generation
+            self._index = new_index
+            self._sorted_keys = None
+            self._dead_bytes = 0
+            self._replay(tail_start, pos)
+            self._write_index()
+        logger.info(f"Compacted log cache to {pos} bytes.")
+      except Exception as e:
+        if os.path.exists(tmp_path):
+          os.remove(tmp_path)
+        raise LogCacheException(f"Error compacting log cache: {e}") from e
+
+  def _write_index(self):
+    """
+    Writes a snapshot of the in-memory index next to the log.
+    """
+    with self._lock:
+      parts = []
+      for key, entry in self._index.items():
+        encoded_key = key.encode("utf-8")
+        for offset, length in (entry if isinstance(entry, list) else [entry]):
+          parts.append(_INDEX_ENTRY.pack(len(encoded_key), offset, length))
+          parts.append(encoded_key)
+      parts.insert(0, _INDEX_HEADER.pack(_INDEX_MAGIC, _FORMAT_VERSION, self._generation,
+                                         self._size, len(parts) // 2, self._dead_bytes))
+    tmp_path = self.index_path + ".tmp"
+    with open(tmp_path, "wb") as file:
+      file.write(b"".join(parts))
+    os.replace(tmp_path, self.index_path)
+
+  def close(self):
+    """
+    Flushes the log, writes an index snapshot and closes the file handles.
+    """
+    if self._compaction_thread is not None:
+      self._compaction_thread.join()
+    with self._lock:
+      if self._writer.closed:
+        return
+      self._writer.flush()
+      self._write_index()
+      self._writer.close()
+      self._reader.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def __len__(self):
+    return len(self._index)
+
+
+class LogCacheException(Exception):
+  """
+  This class defines an exception for LogCache.
+  """
@@ -0,0 +1,182 @@
+"""This module implements a bounded in-process cache with LRU eviction and TTL."""
+from ..llm_cache import LLMCache, page_sorted_keys
+from ..value_codecs import entry_size
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class MemoryCache(LLMCache):
+  """
+  Implements an in-process cache bounded by entry count and total size.
+
+  Entries are evicted in least-recently-used order once either bound is exceeded,
+  and expire after their time-to-live. The cache is not persisted and is meant to be
+  used as the front tier of a `TieredCache` or for tests.
+  """
+  supports_binary_values = True
+  supports_delete = True
+  supports_scan = True
+  supports_ttl = True
+
+  def __init__(self, max_entries: int = None, max_bytes: int = None, ttl: float = None,
+               **kwargs):
+    """
+    Args:
+      max_entries (int, optional): Maximum number of entries held.
+      max_bytes (int, optional): Maximum total size of keys and values in bytes.
+      ttl (float, optional): Default time-to-live of entries in seconds.
+      **kwargs: Options passed to LLMCache.
+    """
+    super().__init__(**kwargs)
+    self.max_entries = max_entries
+    self.max_bytes = max_bytes
+    self.ttl = ttl
+    self._entries = OrderedDict()
+    self._sorted_keys = None
+    self._size = 0
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.expirations = 0
+
+  def get_from_cache(self, key: str) -> str:
+    """
+    Returns the value associated with the key and marks it as recently used.
+
+    Args:
+      key (str): The key for which the value needs to be retrieved.
+
+    Returns:
+      str: The value, or an empty string if the key is missing or expired.
+    """
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        self.misses += 1
+        return ""
+      value, expires_at = entry
+      if expires_at is not None and expires_at <= time.monotonic():
+        self._remove(key)
+        self.expirations += 1
+        self.misses += 1
+        return ""
+      self._entries.move_to_end(key)
+      self.hits += 1
+      return value
+
+  def add_to_cache(self, key: str, value: str, ttl: float = None) -> bool:
+    """
+    Stores a key-value pair, evicting least recently used entries if needed.
+
+    Args:
+      key (str): The key under which the value should be stored.
+      value (str): The value to store.
+      ttl (float, optional): Time-to-live in seconds, overriding the default.
+
+    Returns:
+      bool: True if the value was stored, False if it is larger than max_bytes.
+    """
+    size = entry_size(key, value)
+    if self.max_bytes is not None and size > self.max_bytes:
+      return False
+    ttl = self.ttl if ttl is None else ttl
+    expires_at = time.monotonic() + ttl if ttl is not None else None
+    with self._lock:
+      if key in self._entries:
+        self._remove(key)
+      self._entries[key] = (value, expires_at)
+      self._sorted_keys = None
+      self._size += size
+      while ((self.max_entries is not None and len(self._entries) > self.max_entries)
+             or (self.max_bytes is not None and self._size > self.max_bytes)):
+        self._remove(next(iter(self._entries)))
+        self.evictions += 1
+    return True
+
+  def add_many_to_cache(self, items: Dict[str, str], ttl: float = None) -> bool:
+    """
+    Stores several key-value pairs, evicting least recently used entries if needed.
+
+    Args:
+      items (Dict[str, str]): The values to store, keyed by cache key.
+      ttl (float, optional): Time-to-live in seconds, overriding the default.
+
+    Returns:
+      bool: True if every value was stored.
+    """
+    result = True
+    for key, value in items.items():
+      result = self.add_to_cache(key, value, ttl=ttl) and result
+    return result
+
+  def delete_from_cache(self, key: str) -> bool:
+    """
+    Removes a key from the cache.
+
+    Args:
+      key (str): The key to remove.
+
+    Returns:
+      bool: True if the key was present.
+    """
+    with self._lock:
+      if key not in self._entries:
+        return False
+      self._remove(key)
+      return True
+
+  def scan_cache(self, cursor: str = None, prefix: str = "",
+                 limit: int = 1000) -> Tuple[List[tuple], Optional[str]]:
+    """
+    Returns a page of the unexpired entries whose key starts with prefix, in key order,
+    without marking them as recently used.
+
+    Args:
+      cursor (str, optional): The cursor returned with the previous page, or None for
+        the first page.
+      prefix (str, optional): The prefix of the listed keys.
+      limit (int, optional): Maximum number of entries of the page.
+
+    Returns:
+      List[tuple]: The (key, value, metadata) entries of the page.
+      Optional[str]: The cursor of the next page, or None if this is the last page.
+    """
+    now = time.monotonic()
+    with self._lock:
+      if self._sorted_keys is None:
+        self._sorted_keys = sorted(self._entries)
+      keys, next_cursor = page_sorted_keys(self._sorted_keys, cursor, prefix, limit)
+      entries = [(key, self._entries[key]) for key in keys]
+    return [(key, value, {}) for key, (value, expires_at) in entries
+            if expires_at is None or expires_at > now], next_cursor
+
+  def _remove(self, key: str):
+    self._sorted_keys = None
+    value, _ = self._entries.pop(key)
+    self._size -= entry_size(key, value)
+
+  def clear(self):
+    """
+    Removes every entry from the cache.
+    """
+    with self._lock:
+      self._entries.clear()
+      self._sorted_keys = None
+      self._size = 0
+
+  def stats(self) -> dict:
+    """
+    Returns the hit, miss and eviction counters and the current occupancy.
+    """
+    with self._lock:
+      return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+              "expirations": self.expirations, "entries": len(self._entries),
+              "bytes": self._size}
+
+  def __len__(self):
+    return len(self._entries)
@@ -0,0 +1,226 @@
+"""
+This module implements the MmapCache class, a read-only local cache that serves
+lookups from a memory-mapped file with an on-disk hash table.
+"""
+from ..llm_cache import LLMCache
+from ..value_codecs import bytes_to_value, value_to_bytes
+from typing import Iterable, List, Optional, Tuple, Union
+import hashlib
+import logging
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"NBMC"
+_FORMAT_VERSION = 1
+# magic, format version, slot count, entry count
+_HEADER = struct.Struct("<4sBQQ")
+# key digest, value offset, value length
+_SLOT = struct.Struct("<32sQI")
+_DIGEST_SIZE = 32
+_LOAD_FACTOR = 0.5
+
+
+def _key_digest(key: str) -> bytes:
+  """
+  Returns the 32-byte digest used to place a key in the hash table. Keys produced by
+  `_generate_cache_key` are already hex-encoded SHA-256 digests and are used as is.
+  """
+  if len(key) == 2 * _DIGEST_SIZE:
+    try:
+      return bytes.fromhex(key)
+    except ValueError:
+      pass
+  return hashlib.sha256(key.encode("utf-8")).digest()
+
+
+class MmapCache(LLMCache):
+  """
+  Implements a read-optimized cache on top of a sealed, memory-mapped file.
+
+  The file starts with a fixed-width open-addressing hash table of key digests
+  and value offsets followed by the values. Opening the cache only maps the file,
+  so startup time and resident memory do not depend on the size of the cache, and
+  worker processes opening the same file share its pages through the page cache.
+
+  Files are created with `MmapCache.build` and never modified afterwards; writes
+  through `add_to_cache` are ignored.
+  """
+  supports_binary_values = True
+  supports_scan = True
+
+  def __init__(self, file_path: str, **kwargs):
+    """
+    Maps the sealed cache file at file_path.
+
+    Args:
+      file_path (str): Path of a file created by `MmapCache.build`.
+      **kwargs: Options passed to LLMCache.
+
+    Raises:
+      MmapCacheException: If the file cannot be opened or is not a cache file.
+    """
+    super().__init__(**kwargs)
+    self.file_path = file_path
+    try:
+      with open(file_path, "rb") as file:
+        self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+      magic, version, self._slot_count, self._entry_count = _HEADER.unpack_from(self._mmap)
+    except Exception as e:
+      logger.error(f"Error opening mmap cache: {e}")
+      raise MmapCacheException(f"Error opening mmap cache: {e}") from e
+    if magic != _MAGIC or version != _FORMAT_VERSION:
+      self._mmap.close()
+      raise MmapCacheException(f"{file_path} is not a mmap cache file.")
+
+  @staticmethod
+  def build(file_path: str, items: Iterable[Tuple[str, Union[str, bytes]]]) -> int:
+    """
+    Writes a sealed cache file from key-value pairs.
+
+    Values are streamed to a temporary file while only the fixed-width slot
+    entries are kept in memory. The finished file atomically replaces file_path.
+
+    Args:
+      file_path (str): Path of the cache file to create.
+      items (Iterable[Tuple[str, Union[str, bytes]]]): The key-value pairs to store.
+        Later values of a repeated key replace earlier ones.
+
+    Returns:
+      int: The number of entries written.
+
+    Raises:
+      MmapCacheException: If the file cannot be written.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    try:
+      entries = {}
+      with tempfile.TemporaryFile(dir=directory) as data:
+        data_size = 0
+        for key, value in items:
+          encoded_value = value_to_bytes(value)
+          entries[_key_digest(key)] = (data_size, len(encoded_value))
+          data.write(encoded_value)
+          data_size += len(encoded_value)
+        slot_count = max(1, int(len(entries) / _LOAD_FACTOR))
+        data_start = _HEADER.size + slot_count * _SLOT.size
+        table = bytearray(slot_count * _SLOT.size)
+        for digest, (offset, length) in entries.items():
+          slot = int.from_bytes(digest[:8], "little") % slot_count
+          while table[slot * _SLOT.size + _DIGEST_SIZE:(slot + 1) * _SLOT.size] != bytes(12):
+            slot = (slot + 1) % slot_count
+          _SLOT.pack_into(table, slot * _SLOT.size, digest, data_start + offset, length)
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, "wb") as file:
+          file.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, slot_count, len(entries)))
+          file.write(table)
+          data.seek(0)
+          shutil.copyfileobj(data, file)
+        os.replace(tmp_path, file_path)
+      logger.info(f"Built mmap cache with {len(entries)} entries at {file_path}.")
+      return len(entries)
+    except Exception as e:
+      logger.error(f"Error building mmap cache: {e}")
+      raise MmapCacheException(f"Error building mmap cache: {e}") from e
+
+  def get_from_cache(self, key: str) -> str:
+    """
+    Resolves a key through the on-disk hash table and returns its value.
+
+    Args:
+      key (str): The key for which the value needs to be retrieved.
+
+    Returns:
+      str: The value associated with the key. Returns an empty string if the key is not found.
+
+    Raises:
+      MmapCacheException: If there is an error during the retrieval process.
+    """
+    try:
+      digest = _key_digest(key)
+      slot = int.from_bytes(digest[:8], "little") % self._slot_count
+      for _ in range(self._slot_count):
+        stored_digest, offset, length = _SLOT.unpack_from(self._mmap,
+                                                          _HEADER.size + slot * _SLOT.size)
+        if offset == 0:
+          return ""
+        if stored_digest == digest:
+          return bytes_to_value(self._mmap[offset:offset + length])
+        slot = (slot + 1) % self._slot_count
+      return ""
+    except Exception as e:
+      logger.error(f"Error reading from cache: {e}")
+      raise MmapCacheException(f"Error reading from cache: {e}") from e
+
+  def scan_cache(self, cursor: str = None, prefix: str = "",
+                 limit: int = 1000) -> Tuple[List[tuple], Optional[str]]:
+    """
+    Returns a page of the entries whose key starts with prefix, in hash table order.
+    The file only holds key digests, so entries are listed under their hex-encoded
+    digest, which is the original key for keys produced by `_generate_cache_key`.
+    The cursor is the index of the next slot.
+
+    Args:
+      cursor (str, optional): The cursor returned with the previous page, or None for
+        the first page.
+      prefix (str, optional): The prefix of the listed keys.
+      limit (int, optional): Maximum number of entries of the page.
+
+    Returns:
+      List[tuple]: The (key, value, metadata) entries of the page.
+      Optional[str]: The cursor of the next page, or None if this is the last page.
+
+    Raises:
+      MmapCacheException: If there is an error during the scan.
+    """
+    try:
+      slot = int(cursor) if cursor else 0
+      entries = []
+      while slot < self._slot_count and len(entries) < limit:
+        digest, offset, length = _SLOT.unpack_from(self._mmap, _HEADER.size + slot * _SLOT.size)
+        slot += 1
+        if offset != 0 and digest.hex().startswith(prefix):
+          entries.append((digest.hex(), bytes_to_value(self._mmap[offset:offset + length]), {}))
+      return entries, str(slot) if slot < self._slot_count else None
+    except Exception as e:
+      logger.error(f"Error scanning cache: {e}")
+      raise MmapCacheException(f"Error scanning cache: {e}") from e
+
+  def add_to_cache(self, key: str, value: str) -> bool:
+    """
+    Ignores the write, since the cache file is sealed.
+
+    Args:
+      key (str): The key under which the value would be stored.
+      value (str): The value that would be stored.
+
+    Returns:
+      bool: Always False.
+    """
+    logger.debug(f"Ignoring write of key {key} to the read-only mmap cache.")
+    return False
+
+  def close(self):
+    """
+    Unmaps the cache file.
+    """
+    self._mmap.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def __len__(self):
+    return self._entry_count
+
+
+class MmapCacheException(Exception):
+  """
+  This class defines an exception for MmapCache.
+  """
@@ -0,0 +1,343 @@
+"""
+This module implements the MongoCache class, a cache stored in a MongoDB collection.
+"""
+from ..llm_cache import LLMCache, prefix_end
+from typing import Dict, List, Optional, Tuple, Union
+import datetime
+import logging
+import threading
+
+try:
+  import pymongo
+except ImportError:
+  pymongo = None
+
+logger = logging.getLogger(__name__)
+
+# Number of keys per $in query or bulk write.
+_MAX_BATCH_SIZE = 1000
+
+
+class MongoCache(LLMCache):
+  """
+  Implements a cache stored in a MongoDB collection.
+
+  Each entry is a document whose `_id` is the cache key. Batch reads use a single
+  `$in` query and batch writes a single unordered `bulk_write` of upserts per batch
+  of keys. Entries with a time-to-live carry an `expires_at` date covered by a TTL
+  index, so MongoDB deletes them once they expire. Caches connecting to the same URI
+  share one `MongoClient` and therefore one connection pool.
+
+  Example:
+    llm_cache = MongoCache("mongodb://localhost:27017", "llm", "cache", ttl=7 * 24 * 3600)
+  """
+  supports_binary_values = True
+  supports_metadata = True
+  supports_delete = True
+  supports_scan = True
+  supports_ttl = True
+  _clients = {}
+  _clients_lock = threading.Lock()
+
+  def __init__(self, uri: str = "mongodb://localhost:27017",
+               database_name: str = "nb_llm_cache",
+               collection_name: str = "llm_cache",
+               client=None,
+               ttl: float = None,
+               max_pool_size: int = 100,
+               **kwargs):
+    """
+    Args:
+      uri (str, optional): The MongoDB connection URI, used unless client is given.
+      database_name (str, optional): Name of the database.
+      collection_name (str, optional): Name of the collection holding the entries.
+      client (pymongo.MongoClient, optional): A client to use instead of connecting to
+        uri, for example a `mongomock.MongoClient` in tests.
+      ttl (float, optional): Default time-to-live of entries in seconds.
+      max_pool_size (int, optional): Maximum number of connections of the shared client.
+      **kwargs: Options passed to LLMCache.
+
+    Raises:
+      ValueError: If the pymongo package is not installed and no client is given.
+      MongoCacheException: If the collection cannot be set up.
+    """
+    super().__init__(**kwargs)
+    self.ttl = ttl
+    if client is None:
+      if pymongo is None:
+        raise ValueError("MongoCache requires the pymongo package: pip install pymongo")
+      client = self._shared_client(uri, max_pool_size)
+    try:
+      self._collection = client[database_name][collection_name]
+      self._collection.create_index("expires_at", expireAfterSeconds=0)
+      self._collection.create_index("func_name")
+    except Exception as e:
+      logger.error(f"Error initializing MongoDB cache: {e}")
+      raise MongoCacheException(f"MongoDB initialization failed: {e}") from e
+
+  @classmethod
+  def _shared_client(cls, uri: str, max_pool_size: int):
+    """
+    Returns the client shared by the caches with the same connection settings.
+    """
+    client_key = (uri, max_pool_size)
+    with cls._clients_lock:
+      client = cls._clients.get(client_key)
+      if client is None:
+        client = pymongo.MongoClient(uri, maxPoolSize=max_pool_size)
+        cls._clients[client_key] = client
+      return client
+
+  def _document(self, key: str, value: Union[str, bytes], func_name: str,
+                ttl: float, now: datetime.datetime) -> dict:
+    """
+    Builds the document of an entry.
+    """
+    ttl = self.ttl if ttl is None else ttl
+    document = {"_id": key, "value": value, "func_name": func_name, "created_at": now}
+    if ttl is not None:
+      document["expires_at"] = now + datetime.timedelta(seconds=ttl)
+    return document
+
+  @staticmethod
+  def _value(document: dict, now: datetime.datetime) -> Union[str, bytes]:
+    """
+    Returns the value of a document, or an empty string if it has expired but has
+    not been deleted by the TTL monitor yet.
+    """
+    expires_at = document.get("expires_at")
+    if expires_at is not None and expires_at.replace(tzinfo=None) <= now:
+      return ""
+    value = document["value"]
+    return value if isinstance(value, str) else bytes(value)
+
+  def get_from_cache(self, key: str) -> Union[str, bytes]:
+    """
+    Retrieves the value associated with a given key from the collection.
+
+    Args:
+      key (str): The key for which the value needs to be retrieved.
+
+    Returns:
+      Union[str, bytes]: The value associated with the key. Returns an empty string if
+      the key is not found or has expired.
+
+    Raises:
+      MongoCacheException: If there is an error during the retrieval process.
+    """
+    try:
+      document = self._collection.find_one({"_id": key}, {"value": 1, "expires_at": 1})
+      return "" if document is None else self._value(document, _utcnow())
+    except Exception as e:
+      logger.error(f"Error reading from cache: {e}")
+      raise MongoCacheException(f"Error reading from cache: {e}") from e
+
+  def add_to_cache(self, key: str, value: Union[str, bytes], func_name: str = None,
+                   ttl: float = None) -> bool:
+    """
+    Stores a key-value pair, replacing any earlier value of the key.
+
+    Args:
+      key (str): The key under which the value should be stored.
+      value (Union[str, bytes]): The value to store in the cache.
+      func_name (str, optional): The name of the cached function.
+      ttl (float, optional): Time-to-live in seconds, overriding the default.
+
+    Returns:
+      bool: True if the operation was successful.
+
+    Raises:
+      MongoCacheException: If there is an error during the write.
+    """
+    try:
+      document = self._document(key, value, func_name, ttl, _utcnow())
+      self._collection.replace_one({"_id": key}, document, upsert=True)
+      return True
+    except Exception as e:
+      logger.error(f"Error writing to cache: {e}")
+      raise MongoCacheException(f"Error writing to cache: {e}") from e
+
+  def get_many_from_cache(self, keys: List[str]) -> List[Union[str, bytes]]:
+    """
+    Retrieves the values associated with several keys with one `$in` query per batch
+    of keys.
+
+    Args:
+      keys (List[str]): The keys for which the values need to be retrieved.
+
+    Returns:
+      List[Union[str, bytes]]: The value of each key, in the order of keys. Missing keys
+      map to an empty string.
+
+    Raises:
+      MongoCacheException: If there is an error during the retrieval process.
+    """
+    try:
+      now = _utcnow()
+      found = {}
+      unique_keys = list(dict.fromkeys(keys))
+      for start in range(0, len(unique_keys), _MAX_BATCH_SIZE):
+        batch = unique_keys[start:start + _MAX_BATCH_SIZE]
+        for document in self._collection.find({"_id": {"$in": batch}},
+                                              {"value": 1, "expires_at": 1}):
+          found[document["_id"]] = self._value(document, now)
+      return [found.get(key, "") for key in keys]
+    except Exception as e:
+      logger.error(f"Error reading from cache: {e}")
+      raise MongoCacheException(f"Error reading from cache: {e}") from e
+
+  def add_many_to_cache(self, items: Dict[str, Union[str, bytes]], func_name: str = None,
+                        ttl: float = None) -> bool:
+    """
+    Stores several key-value pairs with one unordered bulk write of upserts per batch
+    of keys.
+
+    Args:
+      items (Dict[str, Union[str, bytes]]): The values to store, keyed by cache key.
+      func_name (str, optional): The name of the cached function.
+      ttl (float, optional): Time-to-live in seconds, overriding the default.
+
+    Returns:
+      bool: True if the operation was successful.
+
+    Raises:
+      MongoCacheException: If there is an error during the write.
+    """
+    try:
+      now = _utcnow()
+      entries = list(items.items())
+      if pymongo is None:
+        # Injected clients without pymongo installed get one upsert per entry.
+        for key, value in entries:
+          self._collection.replace_one({"_id": key},
+                                       self._document(key, value, func_name, ttl, now),
+                                       upsert=True)
+        return True
+      for start in range(0, len(entries), _MAX_BATCH_SIZE):
+        requests = [pymongo.ReplaceOne({"_id": key},
+                                       self._document(key, value, func_name, ttl, now),
+                                       upsert=True)
+                    for key, value in entries[start:start + _MAX_BATCH_SIZE]]
+        self._collection.bulk_write(requests, ordered=False)
+      return True
+    except Exception as e:
+      logger.error(f"Error writing to cache: {e}")
+      raise MongoCacheException(f"Error writing to cache: {e}") from e
+
+  def scan_cache(self, cursor: str = None, prefix: str = "",
+                 limit: int = 1000) -> Tuple[List[tuple], Optional[str]]:
+    """
+    Returns a page of the unexpired entries whose key starts with prefix, in key order,
+    with one range query on `_id`. The metadata holds the function name and the
+    creation time of the entries.
+
+    Args:
+      cursor (str, optional): The cursor returned with the previous page, or None for
+        the first page.
+      prefix (str, optional): The prefix of the listed keys.
+      limit (int, optional): Maximum number of entries of the page.
+
+    Returns:
+      List[tuple]: The (key, value, metadata) entries of the page.
+      Optional[str]: The cursor of the next page, or None if this is the last page.
+
+    Raises:
+      MongoCacheException: If there is an error during the scan.
+    """
+    condition = {"$gte": prefix}
+    if cursor is not None:
+      condition["$gt"] = cursor
+    end = prefix_end(prefix)
+    if end is not None:
+      condition["$lt"] = end
+    try:
+      now = _utcnow()
+      documents = list(self._collection.find({"_id": condition}).sort("_id", 1).limit(limit + 1))
+    except Exception as e:
+      logger.error(f"Error scanning cache: {e}")
+      raise MongoCacheException(f"Error scanning cache: {e}") from e
+    entries = []
+    for document in documents[:limit]:
+      value = self._value(document, now)
+      if value:
+        created_at = document.get("created_at")
+        if created_at is not None:
+          created_at = created_at.replace(tzinfo=datetime.timezone.utc).timestamp()
+        entries.append((document["_id"], value,
+                        {"func_name": document.get("func_name"), "created_at": created_at}))
+    return entries, documents[limit - 1]["_id"] if len(documents) > limit else None
+
+  def delete_from_cache(self, key: str) -> bool:
+    """
+    Removes a key from the cache.
+
+    Args:
+      key (str): The key to remove.
+
+    Returns:
+      bool: True if the key was present.
+
+    Raises:
+      MongoCacheException: If there is an error during the delete.
+    """
+    try:
+      return self._collection.delete_one({"_id": key}).deleted_count > 0
+    except Exception as e:
+      logger.error(f"Error deleting from cache: {e}")
+      raise MongoCacheException(f"Error deleting from cache: {e}") from e
+
+  def delete_many_from_cache(self, keys: List[str]) -> int:
+    """
+    Removes several keys from the cache with one `$in` delete per batch of keys.
+
+    Args:
+      keys (List[str]): The keys to remove.
+
+    Returns:
+      int: The number of removed keys.
+
+    Raises:
+      MongoCacheException: If there is an error during the delete.
+    """
+    try:
+      removed = 0
+      for start in range(0, len(keys), _MAX_BATCH_SIZE):
+        batch = keys[start:start + _MAX_BATCH_SIZE]
+        removed += self._collection.delete_many({"_id": {"$in": batch}}).deleted_count
+      return removed
+    except Exception as e:
+      logger.error(f"Error deleting from cache: {e}")
+      raise MongoCacheException(f"Error deleting from cache: {e}") from e
+
+  def delete_function(self, func_name: str) -> int:
+    """
+    Removes every entry of a cached function.
+
+    Args:
+      func_name (str): The name of the function.
+
+    Returns:
+      int: The number of removed entries.
+
+    Raises:
+      MongoCacheException: If there is an error during the delete.
+    """
+    try:
+      return self._collection.delete_many({"func_name": func_name}).deleted_count
+    except Exception as e:
+      logger.error(f"Error deleting from cache: {e}")
+      raise MongoCacheException(f"Error deleting from cache: {e}") from e
+
+
+def _utcnow() -> datetime.datetime:
+  """
+  Returns the current UTC time as a naive datetime, the form in which MongoDB
+  returns dates by default.
+  """
+  return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class MongoCacheException(Exception):
+  """
+  This class defines an exception for MongoCache.
+  """
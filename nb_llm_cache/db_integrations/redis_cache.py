@@ -0,0 +1,285 @@
+"""
+This module implements the RedisCache class, a cache stored in Redis.
+"""
+from ..llm_cache import LLMCache
+from ..value_codecs import BinaryCodec, bytes_to_value, value_to_bytes
+from typing import Dict, List, Optional, Tuple, Union
+import logging
+import threading
+
+try:
+  import redis
+except ImportError:
+  redis = None
+
+logger = logging.getLogger(__name__)
+
+# Number of keys per MGET or pipeline round trip.
+_MAX_BATCH_SIZE = 500
+
+
+class RedisCache(LLMCache):
+  """
+  Implements a cache stored in Redis.
+
+  Caches connecting to the same URL share one connection pool. Bulk reads use MGET
+  and bulk writes a single pipeline per batch of keys, so a batch costs one round
+  trip. Entries can expire after a time-to-live enforced by the Redis server.
+
+  Example:
+    llm_cache = RedisCache("redis://localhost:6379/0", ttl=7 * 24 * 3600, compression="zlib")
+  """
+  supports_binary_values = True
+  supports_delete = True
+  supports_scan = True
+  supports_ttl = True
+  _pools = {}
+  _pools_lock = threading.Lock()
+
+  def __init__(self, url: str = "redis://localhost:6379/0",
+               client=None,
+               key_prefix: str = "nb_llm_cache:",
+               ttl: float = None,
+               compression: str = None,
+               max_connections: int = None,
+               socket_timeout: float = None,
+               **kwargs):
+    """
+    Args:
+      url (str, optional): The Redis URL, used unless client is given.
+      client (redis.Redis, optional): A client to use instead of connecting to url, for
+        example a `fakeredis.FakeRedis` in tests.
+      key_prefix (str, optional): Prefix of the Redis keys of the cache entries.
+      ttl (float, optional): Default time-to-live of entries in seconds.
+      compression (str, optional): "zlib" or "zstd" to store entries with a compressing
+        `BinaryCodec`. Ignored if a value_codec is given.
+      max_connections (int, optional): Maximum number of connections of the shared pool.
+      socket_timeout (float, optional): Timeout of Redis commands in seconds.
+      **kwargs: Options passed to LLMCache.
+
+    Raises:
+      ValueError: If the redis package is not installed and no client is given.
+      RedisCacheException: If the client cannot be created.
+    """
+    if compression is not None and kwargs.get("value_codec") is None:
+      kwargs["value_codec"] = BinaryCodec(compression=compression)
+    super().__init__(**kwargs)
+    self.key_prefix = key_prefix
+    self.ttl = ttl
+    if client is not None:
+      self._client = client
+      return
+    if redis is None:
+      raise ValueError("RedisCache requires the redis package: pip install redis")
+    try:
+      self._client = redis.Redis(connection_pool=self._shared_pool(url, max_connections,
+                                                                   socket_timeout))
+    except Exception as e:
+      logger.error(f"Error initializing Redis cache: {e}")
+      raise RedisCacheException(f"Redis initialization failed: {e}") from e
+
+  @classmethod
+  def _shared_pool(cls, url: str, max_connections: int, socket_timeout: float):
+    """
+    Returns the connection pool shared by the caches with the same connection settings.
+    """
+    pool_key = (url, max_connections, socket_timeout)
+    with cls._pools_lock:
+      pool = cls._pools.get(pool_key)
+      if pool is None:
+        pool = redis.ConnectionPool.from_url(url, max_connections=max_connections,
+                                             socket_timeout=socket_timeout)
+        cls._pools[pool_key] = pool
+      return pool
+
+  def _px(self, ttl: float = None):
+    """
+    Returns the time-to-live in milliseconds to pass to SET, if any.
+    """
+    ttl = self.ttl if ttl is None else ttl
+    return max(1, int(ttl * 1000)) if ttl is not None else None
+
+  def get_from_cache(self, key: str) -> Union[str, bytes]:
+    """
+    Retrieves the value associated with a given key from Redis.
+
+    Args:
+      key (str): The key for which the value needs to be retrieved.
+
+    Returns:
+      Union[str, bytes]: The value associated with the key. Returns an empty string if
+      the key is not found or has expired.
+
+    Raises:
+      RedisCacheException: If there is an error during the retrieval process.
+    """
+    try:
+      value = self._client.get(self.key_prefix + key)
+      return "" if value is None else bytes_to_value(value)
+    except Exception as e:
+      logger.error(f"Error reading from cache: {e}")
+      raise RedisCacheException(f"Error reading from cache: {e}") from e
+
+  def add_to_cache(self, key: str, value: Union[str, bytes], ttl: float = None) -> bool:
+    """
+    Stores a key-value pair, replacing any earlier value of the key.
+
+    Args:
+      key (str): The key under which the value should be stored.
+      value (Union[str, bytes]): The value to store in the cache.
+      ttl (float, optional): Time-to-live in seconds, overriding the default.
+
+    Returns:
+      bool: True if the operation was successful.
+
+    Raises:
+      RedisCacheException: If there is an error during the write.
+    """
+    try:
+      self._client.set(self.key_prefix + key, value_to_bytes(value), px=self._px(ttl))
+      return True
+    except Exception as e:
+      logger.error(f"Error writing to cache: {e}")
+      raise RedisCacheException(f"Error writing to cache: {e}") from e
+
+  def get_many_from_cache(self, keys: List[str]) -> List[Union[str, bytes]]:
+    """
+    Retrieves the values associated with several keys with one MGET per batch of keys.
+
+    Args:
+      keys (List[str]): The keys for which the values need to be retrieved.
+
+    Returns:
+      List[Union[str, bytes]]: The value of each key, in the order of keys. Missing keys
+      map to an empty string.
+
+    Raises:
+      RedisCacheException: If there is an error during the retrieval process.
+    """
+    try:
+      values = []
+      for start in range(0, len(keys), _MAX_BATCH_SIZE):
+        batch = [self.key_prefix + key for key in keys[start:start + _MAX_BATCH_SIZE]]
+        values.extend(self._client.mget(batch))
+      return ["" if value is None else bytes_to_value(value) for value in values]
+    except Exception as e:
+      logger.error(f"Error reading from cache: {e}")
+      raise RedisCacheException(f"Error reading from cache: {e}") from e
+
+  def add_many_to_cache(self, items: Dict[str, Union[str, bytes]], ttl: float = None) -> bool:
+    """
+    Stores several key-value pairs with one pipeline per batch of keys.
+
+    Args:
+      items (Dict[str, Union[str, bytes]]): The values to store, keyed by cache key.
+      ttl (float, optional): Time-to-live in seconds, overriding the default.
+
+    Returns:
+      bool: True if the operation was successful.
+
+    Raises:
+      RedisCacheException: If there is an error during the write.
+    """
+    try:
+      px = self._px(ttl)
+      entries = list(items.items())
+      for start in range(0, len(entries), _MAX_BATCH_SIZE):
+        pipeline = self._client.pipeline(transaction=False)
+        for key, value in entries[start:start + _MAX_BATCH_SIZE]:
+          pipeline.set(self.key_prefix + key, value_to_bytes(value), px=px)
+        pipeline.execute()
+      return True
+    except Exception as e:
+      logger.error(f"Error writing to cache: {e}")
+      raise RedisCacheException(f"Error writing to cache: {e}") from e
+
+  def scan_cache(self, cursor: str = None, prefix: str = "",
+                 limit: int = 1000) -> Tuple[List[tuple], Optional[str]]:
+    """
+    Returns a page of the entries whose key starts with prefix, with one SCAN and one
+    MGET. Pages are in no particular order and may be empty before the last page, and
+    an entry may be listed twice if the keyspace is rehashed during the scan.
+
+    Args:
+      cursor (str, optional): The cursor returned with the previous page, or None for
+        the first page.
+      prefix (str, optional): The prefix of the listed keys.
+      limit (int, optional): Number of keys Redis examines for the page.
+
+    Returns:
+      List[tuple]: The (key, value, metadata) entries of the page.
+      Optional[str]: The cursor of the next page, or None if this is the last page.
+
+    Raises:
+      RedisCacheException: If there is an error during the scan.
+    """
+    try:
+      pattern = _escape_pattern(self.key_prefix + prefix) + "*"
+      next_cursor, redis_keys = self._client.scan(int(cursor or 0), match=pattern, count=limit)
+      values = self._client.mget(redis_keys) if redis_keys else []
+      entries = []
+      for redis_key, value in zip(redis_keys, values):
+        if value is not None:
+          key = redis_key.decode("utf-8") if isinstance(redis_key, bytes) else redis_key
+          entries.append((key[len(self.key_prefix):], bytes_to_value(value), {}))
+      return entries, str(next_cursor) if int(next_cursor) != 0 else None
+    except Exception as e:
+      logger.error(f"Error scanning cache: {e}")
+      raise RedisCacheException(f"Error scanning cache: {e}") from e
+
+  def delete_from_cache(self, key: str) -> bool:
+    """
+    Removes a key from the cache.
+
+    Args:
+      key (str): The key to remove.
+
+    Returns:
+      bool: True if the key was present.
+
+    Raises:
+      RedisCacheException: If there is an error during the delete.
+    """
+    try:
+      return self._client.delete(self.key_prefix + key) > 0
+    except Exception as e:
+      logger.error(f"Error deleting from cache: {e}")
+      raise RedisCacheException(f"Error deleting from cache: {e}") from e
+
+  def delete_many_from_cache(self, keys: List[str]) -> int:
+    """
+    Removes several keys from the cache with one DEL per batch of keys.
+
+    Args:
+      keys (List[str]): The keys to remove.
+
+    Returns:
+      int: The number of removed keys.
+
+    Raises:
+      RedisCacheException: If there is an error during the delete.
+    """
+    try:
+      removed = 0
+      for start in range(0, len(keys), _MAX_BATCH_SIZE):
+        removed += self._client.delete(*[self.key_prefix + key
+                                         for key in keys[start:start + _MAX_BATCH_SIZE]])
+      return removed
+    except Exception as e:
+      logger.error(f"Error deleting from cache: {e}")
+      raise RedisCacheException(f"Error deleting from cache: {e}") from e
+
+
+def _escape_pattern(text: str) -> str:
+  """
+  Escapes the glob special characters of a Redis SCAN pattern.
+  """
+  for char in "\\*?[]":
+    text = text.replace(char, "\\" + char)
+  return text
+
+
+class RedisCacheException(Exception):
+  """
+  This class defines an exception for RedisCache.
+  """
@@ -0,0 +1,374 @@
+"""
+This module implements the RemoteCache class, a client of the cache server.
+"""
+from ..cache_protocol import (DELETE, ERROR, GET, HEADER, PING, SCAN, SET, STATS, Reader,
+                              Writer, parse_address)
+from ..llm_cache import LLMCache
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple, Union
+import itertools
+import json
+import logging
+import socket
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _Connection:
+  """
+  A connection to the cache server that several threads can use at the same time.
+  Requests are sent as soon as they are submitted, and a reader thread matches the
+  responses to their requests by ID, so several requests can be in flight at once.
+  """
+  def __init__(self, address: str, timeout: float):
+    family, socket_address = parse_address(address)
+    self._socket = socket.socket(family, socket.SOCK_STREAM)
+    self._socket.settimeout(timeout)
+    self._socket.connect(socket_address)
+    self._socket.settimeout(None)
+    if family == socket.AF_INET:
+      self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    self._send_lock = threading.Lock()
+    self._pending: Dict[int, Future] = {}
+    self._request_ids = itertools.count()
+    self.closed = False
+    self._reader = threading.Thread(target=self._read_responses, name="RemoteCacheReader",
+                                     daemon=True)
+    self._reader.start()
+
+  def submit(self, opcode: int, payload: Writer) -> Future:
+    """
+    Sends a request and returns the future of its response payload.
+    """
+    future = Future()
+    request_id = next(self._request_ids) & 0xFFFFFFFF
+    self._pending[request_id] = future
+    try:
+      with self._send_lock:
+        self._socket.sendall(payload.frame(opcode, request_id))
+    except OSError as e:
+      self._pending.pop(request_id, None)
+      self.close(e)
+      raise
+    return future
+
+  def _read_responses(self):
+    file = self._socket.makefile("rb")
+    try:
+      while True:
+        header = file.read(HEADER.size)
+        if len(header) < HEADER.size:
+          raise ConnectionError("The cache server closed the connection.")
+        status, request_id, length = HEADER.unpack(header)
+        payload = file.read(length) if length else b""
+        future = self._pending.pop(request_id, None)
+        if future is None:
+          continue
+        if status == ERROR:
+          future.set_exception(RemoteCacheException(Reader(payload).string()))
+        else:
+          future.set_result(payload)
+    except Exception as e:
+      self.close(e)
+    finally:
+      file.close()
+
+  def close(self, error: Exception = None):
+    """
+    Closes the connection, failing the requests still in flight.
+    """
+    self.closed = True
+    try:
+      self._socket.shutdown(socket.SHUT_RDWR)
+    except OSError:
+      pass
+    self._socket.close()
+    for request_id in list(self._pending):
+      future = self._pending.pop(request_id, None)
+      if future is not None and not future.done():
+        future.set_exception(RemoteCacheException(f"Connection to the cache server lost: {error}"))
+
+
+class RemoteCache(LLMCache):
+  """
+  Implements a cache served by a cache server (see `cache_server.CacheServer`), so
+  that the processes of a host, or of several hosts, share one warm cache.
+
+  The client keeps a pool of connections, each shared by any number of threads:
+  requests are pipelined, and responses are matched to their requests as they arrive.
+  Batch operations take a single round trip.
+
+  Example:
+    llm_cache = RemoteCache("unix:/tmp/nb_llm_cache.sock")
+  """
+  supports_binary_values = True
+  supports_metadata = True
+  supports_delete = True
+  supports_scan = True
+  supports_ttl = True
+
+  def __init__(self, address: str = "unix:/tmp/nb_llm_cache.sock",
+               pool_size: int = 4,
+               timeout: float = 10.0,
+               **kwargs):
+    """
+    Args:
+      address (str, optional): The server address, "unix:PATH" or "HOST:PORT".
+      pool_size (int, optional): Number of connections to the server.
+      timeout (float, optional): Time in seconds to wait for a connection or a response.
+      **kwargs: Options passed to LLMCache.
+
+    Raises:
+      ValueError: If the address is invalid.
+    """
+    super().__init__(**kwargs)
+    parse_address(address)
+    self.address = address
+    self.pool_size = pool_size
+    self.timeout = timeout
+    self._connections: List[Optional[_Connection]] = [None] * pool_size
+    self._next_connection = itertools.count()
+    self._pool_lock = threading.Lock()
+
+  def _connection(self) -> _Connection:
+    """
+    Returns the next connection of the pool, reconnecting it if it was closed.
+    """
+    index = next(self._next_connection) % self.pool_size
+    connection = self._connections[index]
+    if connection is None or connection.closed:
+      with self._pool_lock:
+        connection = self._connections[index]
+        if connection is None or connection.closed:
+          connection = _Connection(self.address, self.timeout)
+          self._connections[index] = connection
+    return connection
+
+  def _submit(self, opcode: int, payload: Writer) -> Future:
+    return self._connection().submit(opcode, payload)
+
+  def _request(self, opcode: int, payload: Writer) -> Reader:
+    """
+    Sends a request and waits for the response.
+
+    Raises:
+      RemoteCacheException: If the server cannot be reached or reports an error.
+    """
+    try:
+      return Reader(self._submit(opcode, payload).result(self.timeout))
+    except RemoteCacheException:
+      raise
+    except Exception as e:
+      logger.error(f"Error in request to cache server: {e}")
+      raise RemoteCacheException(f"Cache server request failed: {e!r}") from e
+
+  @staticmethod
+  def _set_payload(items: Dict[str, Union[str, bytes]], func_name: str, ttl: float) -> Writer:
+    payload = Writer().f64(ttl if ttl is not None else -1.0).string(func_name or "").u32(len(items))
+    for key, value in items.items():
+      payload.string(key).value(value)
+    return payload
+
+  def ping(self) -> bool:
+    """
+    Returns True if the server answers.
+
+    Raises:
+      RemoteCacheException: If the server cannot be reached.
+    """
+    self._request(PING, Writer())
+    return True
+
+  def get_from_cache(self, key: str) -> Union[str, bytes]:
+    """
+    Retrieves the value associated with a key from the server.
+
+    Args:
+      key (str): The key for which the value needs to be retrieved.
+
+    Returns:
+      Union[str, bytes]: The value, or an empty string if the key is not found.
+
+    Raises:
+      RemoteCacheException: If the server cannot be reached or reports an error.
+    """
+    return self.get_many_from_cache([key])[0]
+
+  def add_to_cache(self, key: str, value: Union[str, bytes], func_name: str = None,
+                   ttl: float = None) -> bool:
+    """
+    Stores a key-value pair on the server.
+
+    Args:
+      key (str): The key under which the value should be stored.
+      value (Union[str, bytes]): The value to store.
+      func_name (str, optional): The function name, stored by backends keeping metadata.
+      ttl (float, optional): Time-to-live in seconds.
+
+    Returns:
+      bool: True if the value was stored.
+
+    Raises:
+      RemoteCacheException: If the server cannot be reached or reports an error.
+    """
+    return self.add_many_to_cache({key: value}, func_name=func_name, ttl=ttl)
+
+  def get_many_from_cache(self, keys: List[str]) -> List[Union[str, bytes]]:
+    """
+    Retrieves the values of several keys in one round trip.
+
+    Args:
+      keys (List[str]): The keys for which the values need to be retrieved.
+
+    Returns:
+      List[Union[str, bytes]]: The value of each key, in the order of keys. Missing keys
+      map to an empty string.
+
+    Raises:
+      RemoteCacheException: If the server cannot be reached or reports an error.
+    """
+    return self._request(GET, Writer().strings(keys)).values()
+
+  def add_many_to_cache(self, items: Dict[str, Union[str, bytes]], func_name: str = None,
+                        ttl: float = None) -> bool:
+    """
+    Stores several key-value pairs in one round trip.
+
+    Args:
+      items (Dict[str, Union[str, bytes]]): The values to store, keyed by cache key.
+      func_name (str, optional): The function name, stored by backends keeping metadata.
+      ttl (float, optional): Time-to-live in seconds.
+
+    Returns:
+      bool: True if the values were stored.
+
+    Raises:
+      RemoteCacheException: If the server cannot be reached or reports an error.
+    """
+    return bool(self._request(SET, self._set_payload(items, func_name, ttl)).u32())
+
+  def delete_from_cache(self, key: str) -> bool:
+    """
+    Removes a key from the server.
+
+    Args:
+      key (str): The key to remove.
+
+    Returns:
+      bool: True if the key was present.
+
+    Raises:
+      RemoteCacheException: If the server cannot be reached or reports an error.
+    """
+    return self.delete_many_from_cache([key]) > 0
+
+  def delete_many_from_cache(self, keys: List[str]) -> int:
+    """
+    Removes several keys in one round trip.
+
+    Args:
+      keys (List[str]): The keys to remove.
+
+    Returns:
+      int: The number of removed keys.
+
+    Raises:
+      RemoteCacheException: If the server cannot be reached or reports an error.
+    """
+    return self._request(DELETE, Writer().strings(keys)).u32()
+
+  def scan_cache(self, cursor: str = None, prefix: str = "",
+                 limit: int = 1000) -> Tuple[List[tuple], Optional[str]]:
+    """
+    Returns a page of the entries whose key starts with prefix, from the backend of
+    the server, or from its memory tier if it has no backend.
+
+    Args:
+      cursor (str, optional): The cursor returned with the previous page, or None for
+        the first page.
+      prefix (str, optional): The prefix of the listed keys.
+      limit (int, optional): Maximum number of entries of the page.
+
+    Returns:
+      List[tuple]: The (key, value, metadata) entries of the page.
+      Optional[str]: The cursor of the next page, or None if this is the last page.
+
+    Raises:
+      RemoteCacheException: If the server cannot be reached or reports an error.
+    """
+    reader = self._request(SCAN, Writer().value(cursor).string(prefix).u32(limit))
+    entries = [(reader.string(), reader.value(), json.loads(reader.string()))
+               for _ in range(reader.u32())]
+    return entries, reader.value(missing=None)
+
+  async def aget_from_cache(self, key: str) -> Union[str, bytes]:
+    """
+    Retrieves the value associated with a key without blocking the event loop or
+    taking an executor thread.
+
+    Raises:
+      RemoteCacheException: If the server cannot be reached or reports an error.
+    """
+    import asyncio
+    try:
+      payload = await asyncio.wrap_future(self._submit(GET, Writer().strings([key])))
+    except RemoteCacheException:
+      raise
+    except Exception as e:
+      logger.error(f"Error in request to cache server: {e}")
+      raise RemoteCacheException(f"Cache server request failed: {e!r}") from e
+    return Reader(payload).values()[0]
+
+  async def aadd_to_cache(self, key: str, value: Union[str, bytes], func_name: str = None,
+                          ttl: float = None) -> bool:
+    """
+    Stores a key-value pair without blocking the event loop or taking an executor thread.
+
+    Args:
+      key (str): The key under which the value should be stored.
+      value (Union[str, bytes]): The value to store.
+      func_name (str, optional): The function name, stored by backends keeping metadata.
+      ttl (float, optional): Time-to-live in seconds.
+
+    Returns:
+      bool: True if the value was stored.
+
+    Raises:
+      RemoteCacheException: If the server cannot be reached or reports an error.
+    """
+    import asyncio
+    try:
+      payload = await asyncio.wrap_future(self._submit(SET, self._set_payload({key: value}, func_name,
+                                                                              ttl)))
+    except RemoteCacheException:
+      raise
+    except Exception as e:
+      logger.error(f"Error in request to cache server: {e}")
+      raise RemoteCacheException(f"Cache server request failed: {e!r}") from e
+    return bool(Reader(payload).u32())
+
+  def stats(self) -> dict:
+    """
+    Returns the counters of the server and of its memory tier.
+
+    Raises:
+      RemoteCacheException: If the server cannot be reached or reports an error.
+    """
+    return json.loads(self._request(STATS, Writer()).string())
+
+  def close(self):
+    """
+    Closes the connections to the server.
+    """
+    with self._pool_lock:
+      for connection in self._connections:
+        if connection is not None:
+          connection.close()
+      self._connections = [None] * self.pool_size
+
+
+class RemoteCacheException(Exception):
+  """
+  This class defines an exception for RemoteCache.
+  """
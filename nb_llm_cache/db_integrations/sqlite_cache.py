@@ -0,0 +1,369 @@
+"""
+This module implements the SQLiteCache class, a local cache stored in a SQLite
+database with indexed metadata.
+"""
+from ..llm_cache import LLMCache, prefix_end
+from typing import Dict, List, Optional, Tuple, Union
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of parameters of a statement to 999 in older versions.
+_MAX_VARIABLES = 900
+
+
+class SQLiteCache(LLMCache):
+  """
+  Implements a local cache in a single SQLite database file.
+
+  The database runs in WAL mode, so any number of readers proceed concurrently with
+  a writer, and every thread uses its own connection. Next to each value the cache
+  stores the name of the cached function and the creation and last access times, in
+  indexed columns, so entries can be expired or invalidated per function without
+  reading their values. The last access time is updated at most once per
+  access_update_interval to keep hits free of writes.
+  """
+  supports_binary_values = True
+  supports_metadata = True
+  supports_delete = True
+  supports_scan = True
+
+  def __init__(self, file_path: str,
+               table_name: str = "llm_cache",
+               access_update_interval: float = 60.0,
+               timeout: float = 30.0,
+               synchronous: str = "NORMAL",
+               **kwargs):
+    """
+    Opens the database at file_path, creating it if it does not exist.
+
+    Args:
+      file_path (str): Path of the database file.
+      table_name (str, optional): Name of the table holding the entries.
+      access_update_interval (float, optional): Minimum time in seconds between two
+        updates of the last access time of an entry.
+      timeout (float, optional): Time in seconds a connection waits for a lock held by
+        another connection.
+      synchronous (str, optional): The SQLite synchronous setting. "NORMAL" is durable
+        across application crashes in WAL mode, "FULL" also across power loss.
+      **kwargs: Options passed to LLMCache.
+
+    Raises:
+      SQLiteCacheException: If the database cannot be opened.
+    """
+    if not table_name.isidentifier():
+      raise ValueError(f"Invalid table name: {table_name}.")
+    super().__init__(**kwargs)
+    self.file_path = file_path
+    self.table_name = table_name
+    self.access_update_interval = access_update_interval
+    self.timeout = timeout
+    self.synchronous = synchronous
+    self._local = threading.local()
+    self._connections = []
+    self._connections_lock = threading.Lock()
+    self._get_sql = f"SELECT value, last_accessed FROM {table_name} WHERE key = ?"
+    self._touch_sql = f"UPDATE {table_name} SET last_accessed = ? WHERE key = ?"
+    self._put_sql = (f"INSERT OR REPLACE INTO {table_name} "
+                     "(key, value, func_name, created_at, last_accessed) VALUES (?, ?, ?, ?, ?)")
+    try:
+      connection = self._connection()
+      with connection:
+        connection.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ("
+                           "key TEXT PRIMARY KEY, value BLOB NOT NULL, func_name TEXT, "
+                           "created_at REAL NOT NULL, last_accessed REAL NOT NULL)")
+        for column in ("func_name", "created_at", "last_accessed"):
+          connection.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_{column} "
+                             f"ON {table_name} ({column})")
+    except Exception as e:
+      logger.error(f"Error opening SQLite cache: {e}")
+      raise SQLiteCacheException(f"Error opening SQLite cache: {e}") from e
+
+  def _connection(self) -> sqlite3.Connection:
+    """
+    Returns the connection of the calling thread, opening it on first use.
+    """
+    connection = getattr(self._local, "connection", None)
+    if connection is None:
+      connection = sqlite3.connect(self.file_path, timeout=self.timeout,
+                                   check_same_thread=False)
+      connection.execute("PRAGMA journal_mode=WAL")
+      connection.execute(f"PRAGMA synchronous={self.synchronous}")
+      self._local.connection = connection
+      with self._connections_lock:
+        self._connections.append(connection)
+    return connection
+
+  def _touch(self, connection: sqlite3.Connection, rows: list):
+    """
+    Updates the last access time of the rows whose last update is older than
+    access_update_interval.
+
+    Args:
+      connection (sqlite3.Connection): The connection of the calling thread.
+      rows (list): (key, last accessed) pairs of the entries read.
+    """
+    now = time.time()
+    stale = [(now, key) for key, last_accessed in rows
+             if now - last_accessed >= self.access_update_interval]
+    if stale:
+      with connection:
+        connection.executemany(self._touch_sql, stale)
+
+  def get_from_cache(self, key: str) -> Union[str, bytes]:
+    """
+    Retrieves the value associated with a given key from the database.
+
+    Args:
+      key (str): The key for which the value needs to be retrieved.
+
+    Returns:
+      Union[str, bytes]: The value associated with the key. Returns an empty string if
+      the key is not found.
+
+    Raises:
+      SQLiteCacheException: If there is an error during the retrieval process.
+    """
+    try:
+      connection = self._connection()
+      row = connection.execute(self._get_sql, (key,)).fetchone()
+      if row is None:
+        return ""
+      self._touch(connection, [(key, row[1])])
+      return row[0]
+    except Exception as e:
+      logger.error(f"Error reading from cache: {e}")
+      raise SQLiteCacheException(f"Error reading from cache: {e}") from e
+
+  def add_to_cache(self, key: str, value: Union[str, bytes], func_name: str = None) -> bool:
+    """
+    Stores a key-value pair, replacing any earlier value of the key.
+
+    Args:
+      key (str): The key under which the value should be stored.
+      value (Union[str, bytes]): The value to store in the cache.
+      func_name (str, optional): The name of the cached function.
+
+    Returns:
+      bool: True if the operation was successful.
+
+    Raises:
+      SQLiteCacheException: If there is an error during the write.
+    """
+    try:
+      now = time.time()
+      connection = self._connection()
+      with connection:
+        connection.execute(self._put_sql, (key, value, func_name, now, now))
+      return True
+    except Exception as e:
+      logger.error(f"Error writing to cache: {e}")
+      raise SQLiteCacheException(f"Error writing to cache: {e}") from e
+
+  def get_many_from_cache(self, keys: List[str]) -> List[Union[str, bytes]]:
+    """
+    Retrieves the values associated with several keys with one query per batch
+    of keys.
+
+    Args:
+      keys (List[str]): The keys for which the values need to be retrieved.
+
+    Returns:
+      List[Union[str, bytes]]: The value of each key, in the order of keys. Missing keys
+      map to an empty string.
+
+    Raises:
+      SQLiteCacheException: If there is an error during the retrieval process.
+    """
+    try:
+      connection = self._connection()
+      found = {}
+      rows = []
+      unique_keys = list(dict.fromkeys(keys))
+      for start in range(0, len(unique_keys), _MAX_VARIABLES):
+        batch = unique_keys[start:start + _MAX_VARIABLES]
+        query = (f"SELECT key, value, last_accessed FROM {self.table_name} "
+                 f"WHERE key IN ({', '.join('?' * len(batch))})")
+        for key, value, last_accessed in connection.execute(query, batch):
+          found[key] = value
+          rows.append((key, last_accessed))
+      self._touch(connection, rows)
+      return [found.get(key, "") for key in keys]
+    except Exception as e:
+      logger.error(f"Error reading from cache: {e}")
+      raise SQLiteCacheException(f"Error reading from cache: {e}") from e
+
+  def add_many_to_cache(self, items: Dict[str, Union[str, bytes]], func_name: str = None) -> bool:
+    """
+    Stores several key-value pairs in a single transaction.
+
+    Args:
+      items (Dict[str, Union[str, bytes]]): The values to store, keyed by cache key.
+      func_name (str, optional): The name of the cached function.
+
+    Returns:
+      bool: True if the operation was successful.
+
+    Raises:
+      SQLiteCacheException: If there is an error during the write.
+    """
+    try:
+      now = time.time()
+      connection = self._connection()
+      with connection:
+        connection.executemany(self._put_sql, [(key, value, func_name, now, now)
+                                               for key, value in items.items()])
+      return True
+    except Exception as e:
+      logger.error(f"Error writing to cache: {e}")
+      raise SQLiteCacheException(f"Error writing to cache: {e}") from e
+
+  def scan_cache(self, cursor: str = None, prefix: str = "",
+                 limit: int = 1000) -> Tuple[List[tuple], Optional[str]]:
+    """
+    Returns a page of the entries whose key starts with prefix, in key order, with one
+    range query on the primary key. The metadata holds the function name and the
+    creation time of the entries.
+
+    Args:
+      cursor (str, optional): The cursor returned with the previous page, or None for
+        the first page.
+      prefix (str, optional): The prefix of the listed keys.
+      limit (int, optional): Maximum number of entries of the page.
+
+    Returns:
+      List[tuple]: The (key, value, metadata) entries of the page.
+      Optional[str]: The cursor of the next page, or None if this is the last page.
+
+    Raises:
+      SQLiteCacheException: If there is an error during the scan.
+    """
+    conditions, params = ["key >= ?"], [prefix]
+    if cursor is not None:
+      conditions.append("key > ?")
+      params.append(cursor)
+    end = prefix_end(prefix)
+    if end is not None:
+      conditions.append("key < ?")
+      params.append(end)
+    try:
+      rows = self._connection().execute(
+        f"SELECT key, value, func_name, created_at FROM {self.table_name} "
+        f"WHERE {' AND '.join(conditions)} ORDER BY key LIMIT ?", params + [limit + 1]).fetchall()
+    except Exception as e:
+      logger.error(f"Error scanning cache: {e}")
+      raise SQLiteCacheException(f"Error scanning cache: {e}") from e
+    entries = [(key, value, {"func_name": func_name, "created_at": created_at})
+               for key, value, func_name, created_at in rows[:limit]]
+    return entries, entries[-1][0] if len(rows) > limit else None
+
+  def delete_from_cache(self, key: str) -> bool:
+    """
+    Removes a key from the cache.
+
+    Args:
+      key (str): The key to remove.
+
+    Returns:
+      bool: True if the key was present.
+
+    Raises:
+      SQLiteCacheException: If there is an error during the delete.
+    """
+    return self._delete("key = ?", (key,)) > 0
+
+  def delete_many_from_cache(self, keys: List[str]) -> int:
+    """
+    Removes several keys from the cache in one transaction.
+
+    Args:
+      keys (List[str]): The keys to remove.
+
+    Returns:
+      int: The number of removed keys.
+
+    Raises:
+      SQLiteCacheException: If there is an error during the delete.
+    """
+    try:
+      connection = self._connection()
+      with connection:
+        return connection.executemany(f"DELETE FROM {self.table_name} WHERE key = ?",
+                                      [(key,) for key in keys]).rowcount
+    except Exception as e:
+      logger.error(f"Error deleting from cache: {e}")
+      raise SQLiteCacheException(f"Error deleting from cache: {e}") from e
+
+  def delete_function(self, func_name: str) -> int:
+    """
+    Removes every entry of a cached function.
+
+    Args:
+      func_name (str): The name of the function.
+
+    Returns:
+      int: The number of removed entries.
+
+    Raises:
+      SQLiteCacheException: If there is an error during the delete.
+    """
+    return self._delete("func_name = ?", (func_name,))
+
+  def delete_expired(self, max_age: float, by_last_access: bool = False) -> int:
+    """
+    Removes the entries created, or last accessed, more than max_age seconds ago.
+
+    Args:
+      max_age (float): The maximum age of the entries in seconds.
+      by_last_access (bool, optional): Whether the age is measured from the last access
+        instead of the creation of the entries.
+
+    Returns:
+      int: The number of removed entries.
+
+    Raises:
+      SQLiteCacheException: If there is an error during the delete.
+    """
+    column = "last_accessed" if by_last_access else "created_at"
+    return self._delete(f"{column} < ?", (time.time() - max_age,))
+
+  def _delete(self, condition: str, params: tuple) -> int:
+    """
+    Deletes the rows matching condition and returns their number.
+    """
+    try:
+      connection = self._connection()
+      with connection:
+        return connection.execute(f"DELETE FROM {self.table_name} WHERE {condition}",
+                                  params).rowcount
+    except Exception as e:
+      logger.error(f"Error deleting from cache: {e}")
+      raise SQLiteCacheException(f"Error deleting from cache: {e}") from e
+
+  def close(self):
+    """
+    Closes the connections of every thread.
+    """
+    with self._connections_lock:
+      for connection in self._connections:
+        connection.close()
+      self._connections = []
+    self._local = threading.local()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def __len__(self):
+    return self._connection().execute(f"SELECT COUNT(*) FROM {self.table_name}").fetchone()[0]
+
+
+class SQLiteCacheException(Exception):
+  """
+  This class defines an exception for SQLiteCache.
+  """
@@ -1,9 +1,12 @@
 """Demo for FirestoreCache"""
 from ..db_integrations.firestore_cache import FirestoreCache
 from ..llm_cache import LLMCache
+import logging
 import openai
 import time
 
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
 def call_openai(model,
                 openai_messages,
                 temperature,
@@ -0,0 +1,315 @@
+"""
+This module implements the EvictionPolicy class, which removes expired entries from
+a cache and keeps it within entry count and size budgets.
+"""
+from typing import Any, Dict, List
+import heapq
+import logging
+import random
+import threading
+import time
+import weakref
+from .metrics import EVICTIONS, EXPIRATIONS
+from .streams import is_stream_data_key, stream_data_key
+from .value_codecs import decode_value, entry_size
+
+logger = logging.getLogger(__name__)
+
+LRU = "lru"
+LFU = "lfu"
+
+
+class EvictionPolicy:
+  """
+  Sweeps a cache for expired entries and evicts the least recently or least
+  frequently used entries once it exceeds max_entries or max_bytes.
+
+  Expired entries are already treated as misses when they are read; sweeps reclaim
+  their storage. A sweep lists the backend with `scan_cache` and deletes in batches
+  with `delete_many_from_cache`, from a background thread every sweep_interval
+  seconds, or earlier once sweep_after_writes new entries were written.
+
+  Accesses are tracked in memory rather than in the backend, so hits never cause
+  writes. Writes are always recorded, and hits with probability access_sample_rate:
+  frequently used entries are sampled often enough for their recency and relative
+  frequency to be known, at a fraction of the cost. Entries neither written nor
+  sampled by this process rank by their creation time where the backend records
+  it, and as least recently used otherwise. Access counts are halved at every sweep,
+  so that formerly popular entries eventually become candidates for LFU eviction.
+  """
+  def __init__(self, max_entries: int = None,
+               max_bytes: int = None,
+               policy: str = LRU,
+               sweep_interval: float = 300.0,
+               sweep_after_writes: int = None,
+               access_sample_rate: float = 0.1,
+               batch_size: int = 5000):
+    """
+    Args:
+      max_entries (int, optional): Maximum number of entries kept by sweeps.
+      max_bytes (int, optional): Maximum total size of keys and values kept by sweeps.
+      policy (str, optional): "lru" or "lfu".
+      sweep_interval (float, optional): Time in seconds between background sweeps. None
+        disables the background thread; `sweep` can then be called explicitly.
+      sweep_after_writes (int, optional): Number of new entries after which a sweep
+        starts before the interval has elapsed.
+      access_sample_rate (float, optional): Fraction of the hits that are recorded.
+      batch_size (int, optional): Number of entries per scanned page and per delete.
+
+    Raises:
+      ValueError: If the policy is unknown.
+    """
+    if policy not in (LRU, LFU):
+      raise ValueError(f"Unknown eviction policy: {policy}.")
+    self.max_entries = max_entries
+    self.max_bytes = max_bytes
+    self.policy = policy
+    self.sweep_interval = sweep_interval
+    self.sweep_after_writes = sweep_after_writes
+    self.access_sample_rate = access_sample_rate
+    self.batch_size = batch_size
+    self._cache = None
+    self._accesses: Dict[str, list] = {}
+    self._writes = 0
+    self._sweep_lock = threading.Lock()
+    self._wake = threading.Event()
+    self._closed = False
+    self._thread = None
+    self._sweeps = 0
+    self._expired = 0
+    self._evicted = 0
+    self._entries = None
+    self._bytes = None
+    self._last_sweep_seconds = None
+    self._last_error = None
+
+  def attach(self, cache: Any):
+    """
+    Binds the policy to the cache it sweeps and starts the background thread.
+
+    Args:
+      cache (LLMCache): The cache to sweep.
+
+    Raises:
+      ValueError: If the cache cannot be scanned or does not support deletes.
+    """
+    if not cache.supports_scan:
+      raise ValueError(f"{type(cache).__name__} does not support scans.")
+    if not cache.supports_delete:
+      raise ValueError(f"{type(cache).__name__} does not support deletes.")
+    self._cache = cache
+    if self.sweep_interval is not None:
+      policy_ref = weakref.ref(self)
+      self._thread = threading.Thread(target=_run, args=(policy_ref, self._wake),
+                                      name="EvictionPolicy", daemon=True)
+      self._thread.start()
+
+  def record_access(self, key: str):
+    """
+    Records a hit of the key, with probability access_sample_rate.
+    """
+    if self.access_sample_rate < 1 and random.random() >= self.access_sample_rate:
+      return
+    access = self._accesses.get(key)
+    if access is None:
+      self._accesses[key] = [time.time(), 1]
+    else:
+      access[0] = time.time()
+      access[1] += 1
+
+  def record_write(self, key: str):
+    """
+    Records a new entry, and wakes the background thread after sweep_after_writes writes.
+    """
+    self._accesses[key] = [time.time(), 0]
+    self._writes += 1
+    if self.sweep_after_writes is not None and self._writes >= self.sweep_after_writes:
+      self._wake.set()
+
+  def sweep(self) -> dict:
+    """
+    Deletes the expired entries, then evicts entries until the budgets are met.
+
+    Returns:
+      dict: The number of entries expired and evicted by the sweep, and the number of
+      entries and bytes left as listed during the sweep.
+    """
+    with self._sweep_lock:
+      started = time.perf_counter()
+      self._writes = 0
+      expired, entries, size, stream_data = self._delete_expired()
+      evicted = 0
+      excess_entries = entries - self.max_entries if self.max_entries is not None else 0
+      excess_bytes = size - self.max_bytes if self.max_bytes is not None else 0
+      if excess_entries > 0 or excess_bytes > 0:
+        evicted, evicted_bytes = self._evict(excess_entries, excess_bytes, stream_data)
+        entries -= evicted
+        size -= evicted_bytes
+      if self.policy == LFU:
+        for access in list(self._accesses.values()):
+          access[1] //= 2
+      self._sweeps += 1
+      self._expired += expired
+      self._evicted += evicted
+      self._entries, self._bytes = entries, size
+      self._last_sweep_seconds = time.perf_counter() - started
+      if expired or evicted:
+        logger.info(f"Swept cache: {expired} expired and {evicted} evicted entries, "
+                    f"{entries} entries left.")
+      return {"expired": expired, "evicted": evicted, "entries": entries, "bytes": size}
+
+  def _delete_expired(self) -> tuple:
+    """
+    Lists the cache, deleting expired entries, and keeps the access records of the
+    listed keys only.
+
+    The data keys of incrementally persisted streams are part of their stream entry:
+    they are not counted as entries, and their size is added to the size of the cache
+    only if their entry is listed. Data keys without an entry belong to streams still
+    being recorded.
+
+    Returns:
+      tuple: The number of deleted entries, the number and size of the others, and the
+      data key and its size of every listed stream entry having one, keyed by entry.
+    """
+    now = time.time()
+    accesses = self._accesses
+    listed = {}
+    expired = entries = size = 0
+    batch = []
+    data_sizes = {}
+    data_keys = {}
+    for key, value, metadata in self._cache.iter_cache(batch_size=self.batch_size):
+      if is_stream_data_key(key):
+        data_sizes[key] = entry_size(key, value)
+        continue
+      try:
+        value_dict = decode_value(value)
+        expires_at = value_dict.get("expires_at")
+        data_key = stream_data_key(value_dict.get("response"))
+      except Exception:
+        expires_at, data_key = None, None
+      if expires_at is not None and expires_at <= now:
+        batch.append(key)
+        if data_key:
+          batch.append(data_key)
+        self._count(EXPIRATIONS, metadata)
+        expired += 1
+        if len(batch) >= self.batch_size:
+          self._delete(batch)
+          batch = []
+        continue
+      entries += 1
+      size += entry_size(key, value)
+      if data_key:
+        data_keys[key] = data_key
+      access = accesses.get(key)
+      if access is not None:
+        listed[key] = access
+    self._delete(batch)
+    stream_data = {key: (data_key, data_sizes.get(data_key, 0))
+                   for key, data_key in data_keys.items()}
+    size += sum(data_size for _, data_size in stream_data.values())
+    # Accesses recorded during the scan are kept as well.
+    for key, access in list(accesses.items()):
+      if access[0] >= now:
+        listed[key] = access
+    self._accesses = listed
+    return expired, entries, size, stream_data
+
+  def _evict(self, excess_entries: int, excess_bytes: int, stream_data: Dict[str, tuple]) -> tuple:
+    """
+    Deletes the lowest-ranked entries covering both excesses. Candidates are kept in a
+    heap holding the highest-ranked candidate first, which is dropped whenever the
+    others still cover the excesses, so memory use is bounded by the evicted entries.
+    Stream data keys are ranked and deleted with their entry.
+
+    Returns:
+      tuple: The number and size of the deleted entries.
+    """
+    accesses = self._accesses
+    heap = []
+    heap_bytes = 0
+    serial = 0
+    for key, value, metadata in self._cache.iter_cache(batch_size=self.batch_size):
+      if is_stream_data_key(key):
+        continue
+      access = accesses.get(key)
+      if access is not None:
+        last_access, count = access
+      else:
+        last_access, count = metadata.get("created_at") or 0, 0
+      rank = (count, last_access) if self.policy == LFU else (last_access,)
+      data_key, data_size = stream_data.get(key, (None, 0))
+      size = entry_size(key, value) + data_size
+      serial += 1
+      heapq.heappush(heap, (tuple(-r for r in rank), serial, key, size, metadata, data_key))
+      heap_bytes += size
+      while heap and len(heap) - 1 >= excess_entries and heap_bytes - heap[0][3] >= excess_bytes:
+        heap_bytes -= heapq.heappop(heap)[3]
+    keys = []
+    for _, _, key, _, _, data_key in heap:
+      keys.append(key)
+      if data_key:
+        keys.append(data_key)
+    for start in range(0, len(keys), self.batch_size):
+      self._delete(keys[start:start + self.batch_size])
+    for _, _, key, _, metadata, _ in heap:
+      accesses.pop(key, None)
+      self._count(EVICTIONS, metadata)
+    return len(heap), heap_bytes
+
+  def _delete(self, keys: List[str]):
+    if keys:
+      self._cache.delete_many_from_cache(keys)
+
+  def _count(self, name: str, metadata: dict):
+    metrics = self._cache._metrics
+    if metrics is not None:
+      metrics.count(name, metadata.get("func_name"))
+
+  def close(self):
+    """
+    Stops the background thread.
+    """
+    self._closed = True
+    self._wake.set()
+    if self._thread is not None and self._thread is not threading.current_thread():
+      self._thread.join()
+
+  def stats(self) -> dict:
+    """
+    Returns the sweep counters and the size of the cache after the last sweep.
+    """
+    return {"sweeps": self._sweeps,
+            "expired": self._expired,
+            "evicted": self._evicted,
+            "entries": self._entries,
+            "bytes": self._bytes,
+            "tracked_keys": len(self._accesses),
+            "last_sweep_seconds": self._last_sweep_seconds,
+            "last_error": self._last_error}
+
+
+def _run(policy_ref: "weakref.ref", wake: threading.Event):
+  """
+  Runs the sweeps of a policy until it is closed or garbage collected. The thread
+  only holds a weak reference between sweeps.
+  """
+  while True:
+    policy = policy_ref()
+    if policy is None or policy._closed:
+      return
+    interval = policy.sweep_interval
+    del policy
+    wake.wait(interval)
+    wake.clear()
+    policy = policy_ref()
+    if policy is None or policy._closed:
+      return
+    try:
+      policy.sweep()
+    except Exception as e:
+      policy._last_error = repr(e)
+      logger.error(f"Error sweeping cache: {e}")
+    del policy
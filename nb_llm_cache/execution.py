@@ -0,0 +1,429 @@
+"""
+This module implements the ExecutionEngine class, which runs cache misses under
+rate limits and adaptive concurrency control.
+"""
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List
+import functools
+import json
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ExponentialBackoff:
+  """
+  Exponential backoff with full jitter: the n-th retry waits a random time between
+  zero and min(max_delay, base_delay * factor ** n) seconds.
+  """
+  def __init__(self, base_delay: float = 2.0, factor: float = 2.0, max_delay: float = 60.0,
+               jitter: bool = True):
+    """
+    Args:
+      base_delay (float, optional): Upper bound of the first wait in seconds.
+      factor (float, optional): Growth factor of the bound between retries.
+      max_delay (float, optional): Maximum wait in seconds.
+      jitter (bool, optional): Whether waits are drawn uniformly below the bound.
+    """
+    self.base_delay = base_delay
+    self.factor = factor
+    self.max_delay = max_delay
+    self.jitter = jitter
+
+  def delay(self, attempt: int) -> float:
+    """
+    Returns the wait in seconds before the retry following the given attempt.
+    """
+    bound = min(self.max_delay, self.base_delay * self.factor ** attempt)
+    return random.uniform(0, bound) if self.jitter else bound
+
+  def intervals(self, num_retries: int) -> List[float]:
+    """
+    Returns the waits before each of num_retries retries.
+    """
+    return [self.delay(attempt) for attempt in range(num_retries)]
+
+
+class TokenBucket:
+  """
+  A thread-safe token bucket refilled continuously at a per-minute rate.
+
+  Callers reserve tokens up front and wait the returned delay themselves, which lets
+  the same bucket serve threads and coroutines.
+  """
+  def __init__(self, per_minute: float, capacity: float = None):
+    """
+    Args:
+      per_minute (float): Number of tokens added per minute.
+      capacity (float, optional): Maximum number of stored tokens. Defaults to
+        one second worth of tokens, with a minimum of one.
+    """
+    self.rate = per_minute / 60.0
+    self.capacity = capacity if capacity is not None else max(1.0, self.rate)
+    self._tokens = self.capacity
+    self._updated_at = time.monotonic()
+    self._lock = threading.Lock()
+
+  def reserve(self, amount: float = 1.0) -> float:
+    """
+    Takes amount tokens from the bucket, going into debt if needed.
+
+    Args:
+      amount (float, optional): Number of tokens to take.
+
+    Returns:
+      float: Seconds to wait before the tokens are actually available.
+    """
+    with self._lock:
+      now = time.monotonic()
+      self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+      self._updated_at = now
+      self._tokens -= amount
+      if self._tokens >= 0:
+        return 0.0
+      return -self._tokens / self.rate
+
+
+class AdaptiveConcurrencyLimiter:
+  """
+  Bounds the number of concurrent calls with a limit adjusted by additive increase
+  and multiplicative decrease: the limit grows by one after a full window of
+  successful calls and is cut by decrease_factor when a call reports overload.
+
+  Threads wait for a slot with `acquire` and coroutines with `aacquire`; `release`
+  wakes both, so coroutines wait without polling or blocking their event loop.
+  """
+  def __init__(self, initial_limit: int = 8, min_limit: int = 1, max_limit: int = 64,
+               decrease_factor: float = 0.5):
+    """
+    Args:
+      initial_limit (int, optional): Starting concurrency limit.
+      min_limit (int, optional): Lowest concurrency limit.
+      max_limit (int, optional): Highest concurrency limit.
+      decrease_factor (float, optional): Factor applied to the limit on overload.
+    """
+    self.min_limit = min_limit
+    self.max_limit = max_limit
+    self.decrease_factor = decrease_factor
+    self._limit = float(initial_limit)
+    self._in_flight = 0
+    self._waiting = 0
+    self._condition = threading.Condition()
+    self._async_waiters = deque()
+
+  @property
+  def limit(self) -> int:
+    return int(self._limit)
+
+  @property
+  def in_flight(self) -> int:
+    return self._in_flight
+
+  @property
+  def waiting(self) -> int:
+    return self._waiting
+
+  def acquire(self):
+    """
+    Blocks until a concurrency slot is available and takes it.
+    """
+    with self._condition:
+      self._waiting += 1
+      try:
+        while self._in_flight >= int(self._limit):
+          self._condition.wait()
+      finally:
+        self._waiting -= 1
+      self._in_flight += 1
+
+  async def aacquire(self):
+    """
+    Waits until a concurrency slot is available and takes it, without blocking the
+    event loop.
+    """
+    import asyncio
+    loop = asyncio.get_event_loop()
+    while True:
+      with self._condition:
+        if self._in_flight < int(self._limit):
+          self._in_flight += 1
+          return
+        waiter = loop.create_future()
+        self._async_waiters.append((loop, waiter))
+        self._waiting += 1
+      try:
+        await waiter
+      except BaseException:
+        with self._condition:
+          if (loop, waiter) in self._async_waiters:
+            self._async_waiters.remove((loop, waiter))
+          else:
+            # This waiter was woken for a free slot; another one takes its place.
+            self._wake_async_waiters()
+        raise
+      finally:
+        with self._condition:
+          self._waiting -= 1
+
+  def _wake_async_waiters(self):
+    """
+    Wakes as many waiting coroutines as there are free slots. Must be called with the
+    condition held. Woken coroutines that lose their slot to another caller wait again.
+    """
+    free = int(self._limit) - self._in_flight
+    while free > 0 and self._async_waiters:
+      loop, waiter = self._async_waiters.popleft()
+      try:
+        loop.call_soon_threadsafe(_wake, waiter)
+      except RuntimeError:
+        continue
+      free -= 1
+
+  def try_acquire(self) -> bool:
+    """
+    Takes a concurrency slot if one is available without blocking.
+    """
+    with self._condition:
+      if self._in_flight >= int(self._limit):
+        return False
+      self._in_flight += 1
+      return True
+
+  def release(self, overloaded: bool = False, succeeded: bool = True):
+    """
+    Returns a concurrency slot and adjusts the limit.
+
+    Args:
+      overloaded (bool, optional): Whether the call was rejected for overload.
+      succeeded (bool, optional): Whether the call succeeded.
+    """
+    with self._condition:
+      self._in_flight -= 1
+      if overloaded:
+        self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+      elif succeeded:
+        self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+      self._condition.notify_all()
+      self._wake_async_waiters()
+
+
+def _wake(waiter):
+  if not waiter.done():
+    waiter.set_result(None)
+
+
+def is_overload_error(error: Exception) -> bool:
+  """
+  Returns whether an exception signals that the provider rejected a call for
+  exceeding its rate limits, is overloaded, or timed out.
+  """
+  status_code = getattr(error, "status_code", None)
+  if status_code is None:
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+  if status_code in (429, 503, 529):
+    return True
+  return "RateLimit" in type(error).__name__ or isinstance(error, TimeoutError)
+
+
+def _retry_after(error: Exception) -> float:
+  """
+  Returns the wait requested by a Retry-After response header, if any.
+  """
+  headers = getattr(getattr(error, "response", None), "headers", None)
+  try:
+    return float(headers.get("retry-after")) if headers is not None else 0.0
+  except (TypeError, ValueError):
+    return 0.0
+
+
+class ExecutionEngine:
+  """
+  Runs function calls under request and token rate limits with adaptive concurrency.
+
+  Every call first takes a slot from an AIMD concurrency limiter and reserves
+  request and token budget from per-minute token buckets. Calls rejected with a
+  rate limit or overload error shrink the concurrency limit and are retried after
+  the larger of their backoff interval and the provider's Retry-After hint.
+
+  Pass an engine to an LLMCache backend to run the misses of `call`, `acall`
+  and `batch_call` through it.
+  """
+  def __init__(self, max_concurrency: int = 64,
+               initial_concurrency: int = 8,
+               requests_per_minute: float = None,
+               tokens_per_minute: float = None,
+               token_counter: Callable[[dict], int] = None,
+               backoff: ExponentialBackoff = None):
+    """
+    Args:
+      max_concurrency (int, optional): Upper bound of concurrent calls, also the size
+        of the thread pool used by `submit`.
+      initial_concurrency (int, optional): Starting concurrency limit.
+      requests_per_minute (float, optional): Request rate limit.
+      tokens_per_minute (float, optional): Token rate limit.
+      token_counter (Callable[[dict], int], optional): Estimates the tokens of a call
+        from its keyword arguments. Defaults to a quarter of their JSON length.
+      backoff (ExponentialBackoff, optional): Backoff policy used for calls without
+        explicit backoff intervals.
+    """
+    self.max_concurrency = max_concurrency
+    self.limiter = AdaptiveConcurrencyLimiter(initial_limit=min(initial_concurrency, max_concurrency),
+                                              max_limit=max_concurrency)
+    self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+    self.token_bucket = (TokenBucket(tokens_per_minute, capacity=tokens_per_minute / 60.0 * 10)
+                         if tokens_per_minute else None)
+    self.token_counter = token_counter or _estimate_tokens
+    self.backoff = backoff or ExponentialBackoff()
+    self._executor = None
+    self._executor_lock = threading.Lock()
+    self._stats_lock = threading.Lock()
+    self._queued = 0
+    self._completed = 0
+    self._failed = 0
+    self._retries = 0
+    self._throttled = 0
+
+  def _reserve(self, kwargs: dict) -> float:
+    """
+    Reserves the request and token budget of a call and returns the wait before it may start.
+    """
+    delay = 0.0
+    if self.request_bucket is not None:
+      delay = max(delay, self.request_bucket.reserve(1))
+    if self.token_bucket is not None:
+      delay = max(delay, self.token_bucket.reserve(self.token_counter(kwargs)))
+    return delay
+
+  def _on_error(self, error: Exception, attempt: int, backoff_intervals: List[float]) -> tuple:
+    """
+    Records a failed attempt and returns whether it was a rate limit rejection and
+    how long to wait before retrying, or None if no retry is left.
+    """
+    throttled = is_overload_error(error)
+    with self._stats_lock:
+      if throttled:
+        self._throttled += 1
+      if attempt >= len(backoff_intervals):
+        self._failed += 1
+        return throttled, None
+      self._retries += 1
+    return throttled, max(backoff_intervals[attempt], _retry_after(error) if throttled else 0.0)
+
+  def run(self, func: Callable, kwargs: dict, backoff_intervals: List[float]) -> Any:
+    """
+    Calls func with kwargs, retrying after each backoff interval on failure.
+
+    Args:
+      func (Callable): The function to be called.
+      kwargs (dict): The keyword arguments of the call.
+      backoff_intervals (List[float]): The waits before each retry.
+
+    Returns:
+      Any: The response of the call.
+
+    Raises:
+      Exception: Propagates the exception of the last attempt after exhausting retries.
+    """
+    attempt = 0
+    while True:
+      time.sleep(self._reserve(kwargs))
+      self.limiter.acquire()
+      try:
+        response = func(**kwargs)
+      except Exception as e:
+        throttled, delay = self._on_error(e, attempt, backoff_intervals)
+        self.limiter.release(overloaded=throttled, succeeded=False)
+        logger.error(f"Error calling function with name {func.__name__}: {e}")
+        if delay is None:
+          raise
+        logger.info(f"Retrying in {delay:.2f} seconds...")
+        time.sleep(delay)
+        attempt += 1
+        continue
+      self.limiter.release()
+      with self._stats_lock:
+        self._completed += 1
+      return response
+
+  async def arun(self, func: Callable, kwargs: dict, backoff_intervals: List[float]) -> Any:
+    """
+    Asynchronous counterpart of `run`. Coroutine functions are awaited, other
+    functions run in the event loop's default executor.
+    """
+    import asyncio
+    loop = asyncio.get_event_loop()
+    attempt = 0
+    while True:
+      await asyncio.sleep(self._reserve(kwargs))
+      await self.limiter.aacquire()
+      try:
+        if asyncio.iscoroutinefunction(func):
+          response = await func(**kwargs)
+        else:
+          response = await loop.run_in_executor(None, functools.partial(func, **kwargs))
+      except Exception as e:
+        throttled, delay = self._on_error(e, attempt, backoff_intervals)
+        self.limiter.release(overloaded=throttled, succeeded=False)
+        logger.error(f"Error calling function with name {func.__name__}: {e}")
+        if delay is None:
+          raise
+        logger.info(f"Retrying in {delay:.2f} seconds...")
+        await asyncio.sleep(delay)
+        attempt += 1
+        continue
+      self.limiter.release()
+      with self._stats_lock:
+        self._completed += 1
+      return response
+
+  def submit(self, func: Callable, kwargs: dict, backoff_intervals: List[float]) -> Future:
+    """
+    Schedules `run` on the engine's thread pool.
+
+    Returns:
+      Future: The future of the call's response.
+    """
+    with self._executor_lock:
+      if self._executor is None:
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                            thread_name_prefix="ExecutionEngine")
+    with self._stats_lock:
+      self._queued += 1
+    def task():
+      with self._stats_lock:
+        self._queued -= 1
+      return self.run(func, kwargs, backoff_intervals)
+    return self._executor.submit(task)
+
+  def stats(self) -> dict:
+    """
+    Returns the queue depth, in-flight count, current concurrency limit and call counters.
+    """
+    with self._stats_lock:
+      return {"queue_depth": self._queued + self.limiter.waiting,
+              "in_flight": self.limiter.in_flight,
+              "concurrency_limit": self.limiter.limit,
+              "completed": self._completed,
+              "failed": self._failed,
+              "retries": self._retries,
+              "throttled": self._throttled}
+
+  def shutdown(self, wait: bool = True):
+    """
+    Shuts down the engine's thread pool.
+    """
+    with self._executor_lock:
+      if self._executor is not None:
+        self._executor.shutdown(wait=wait)
+        self._executor = None
+
+
+def _estimate_tokens(kwargs: dict) -> int:
+  """
+  Estimates the number of tokens of a call as a quarter of its JSON length.
+  """
+  return max(1, len(json.dumps(kwargs, default=str)) // 4)
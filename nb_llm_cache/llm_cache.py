@@ -2,13 +2,31 @@
 This module implements the LLMCache class.
 """
 from abc import ABC, abstractmethod
-from typing import Callable, Any
-import json
-import hashlib
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import (TYPE_CHECKING, AsyncIterator, Callable, Iterator, Any, Dict, List,
+                    Optional, Tuple, Union)
+import functools
 import logging
 import time
+from .cache_keys import KeyGenerator
+from .eviction import EvictionPolicy
+from .execution import ExecutionEngine
+from .metrics import (BACKEND_GET, BACKEND_SET, DESERIALIZATION, GET_ERRORS, HITS,
+                      KEY_GENERATION, MISSES, SEMANTIC_HITS, SEMANTIC_LOOKUP, SERIALIZATION,
+                      SET_ERRORS, CacheMetrics)
+from .single_flight import AsyncSingleFlight, SingleFlight
+from .streams import StreamRecorder, iter_chunks, load_stream, stream_data_key
+from .value_codecs import JsonCodec, decode_value, to_text
+from .write_behind import BLOCK, WriteBehindQueue
+
+# asyncio is imported by the asynchronous methods only, since importing it takes longer
+# than importing this module and synchronous callers never need it.
+
+if TYPE_CHECKING:
+  # The semantic cache imports numpy, which only caches using it should pay for.
+  from .semantic_cache import SemanticCache
 
-logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 
 
@@ -16,6 +34,108 @@ class LLMCache(ABC):
   """
   A caching layer that cache function responses based on the function's arguments.
   """
+  _single_flight = None
+  _async_single_flight = None
+  coalesce_timeout = None
+  execution_engine = None
+  key_generator = KeyGenerator()
+  store_cache_params = True
+  value_codec = JsonCodec()
+  stream_flush_bytes = 1024 * 1024
+  replay_stream_timing = False
+  write_behind = None
+  metrics = None
+  _metrics = None
+  semantic_cache = None
+  ttl = None
+  function_ttls = None
+  eviction = None
+  # Whether the backend stores bytes values as is. Binary encoded values are wrapped
+  # in base64 text for backends that only store strings.
+  supports_binary_values = False
+  # Whether the backend implements `append_to_cache`, `get_appended_from_cache` and
+  # `delete_from_cache`, which long streams use to be persisted incrementally.
+  supports_append = False
+  # Whether `add_to_cache` and `add_many_to_cache` accept a func_name keyword argument,
+  # which the backend stores as metadata next to the values.
+  supports_metadata = False
+  # Whether the backend implements `delete_from_cache` and `delete_many_from_cache`.
+  supports_delete = False
+  # Whether the backend implements `scan_cache`, which lists its entries page by page.
+  supports_scan = False
+  # Whether `add_to_cache` and `add_many_to_cache` accept a ttl keyword argument, after
+  # which the backend deletes the entries itself.
+  supports_ttl = False
+
+  def __init__(self, coalesce_requests: bool = False, coalesce_timeout: float = None,
+               execution_engine: ExecutionEngine = None, key_generator: KeyGenerator = None,
+               store_cache_params: bool = True, value_codec: JsonCodec = None,
+               stream_flush_bytes: int = 1024 * 1024, replay_stream_timing: bool = False,
+               write_behind: Union[bool, WriteBehindQueue] = False,
+               metrics: CacheMetrics = None, semantic_cache: "SemanticCache" = None,
+               ttl: float = None, function_ttls: Dict[str, float] = None,
+               eviction: EvictionPolicy = None):
+    """
+    Args:
+      coalesce_requests (bool, optional): Whether concurrent misses on the same cache key
+        share a single function call instead of each calling the function.
+      coalesce_timeout (float, optional): Maximum time in seconds a coalesced call waits
+        for the call it shares, or for the next chunk of a shared stream.
+      execution_engine (ExecutionEngine, optional): Engine running the misses of `call`,
+        `acall` and `batch_call` under rate limits and adaptive concurrency. Calls without
+        explicit backoff intervals then use the engine's jittered exponential backoff.
+      key_generator (KeyGenerator, optional): Derives cache keys and parameter fingerprints.
+        Defaults to a generator producing the same keys as earlier releases.
+      store_cache_params (bool, optional): Whether new entries store the cache parameters
+        next to the response. Hits are validated with the parameter fingerprint either way;
+        leaving the parameters out makes entries smaller and hits faster to decode.
+      value_codec (JsonCodec, optional): Encodes new entries. Defaults to JSON text; entries
+        written by any codec remain readable.
+      stream_flush_bytes (int, optional): On backends that support appends, streams are
+        appended to the backend every stream_flush_bytes bytes instead of being held in
+        memory until they finish. None disables incremental persistence.
+      replay_stream_timing (bool, optional): Whether cached streams are replayed with
+        the delays recorded between their chunks instead of as fast as possible.
+      write_behind (Union[bool, WriteBehindQueue], optional): Whether responses are
+        stored by a background queue, so that misses return as soon as the function
+        responds. True uses a queue with the default settings.
+      metrics (CacheMetrics, optional): Records hit and miss counters and latency
+        histograms of the calls. Without metrics, calls take no measurements.
+      semantic_cache (SemanticCache, optional): Answers exact misses of `call` and
+        `acall` with the cached response of a call with a similar prompt.
+      ttl (float, optional): Time-to-live in seconds of new entries. Expired entries are
+        misses; backends with native expiry also delete them.
+      function_ttls (Dict[str, float], optional): Time-to-live of the entries of specific
+        functions, keyed by function name, overriding ttl.
+      eviction (EvictionPolicy, optional): Deletes expired entries and evicts entries
+        beyond a size budget in the background. Requires a backend supporting scans.
+    """
+    self._single_flight = SingleFlight() if coalesce_requests else None
+    self._async_single_flight = AsyncSingleFlight() if coalesce_requests else None
+    self.coalesce_timeout = coalesce_timeout
+    self.execution_engine = execution_engine
+    if key_generator is not None:
+      self.key_generator = key_generator
+    self.store_cache_params = store_cache_params
+    if value_codec is not None:
+      self.value_codec = value_codec
+    self.stream_flush_bytes = stream_flush_bytes
+    self.replay_stream_timing = replay_stream_timing
+    if metrics is not None:
+      self.metrics = metrics
+      self._metrics = metrics.recorder(type(self).__name__)
+    self.semantic_cache = semantic_cache
+    self.ttl = ttl
+    self.function_ttls = function_ttls
+    if write_behind is True:
+      write_behind = WriteBehindQueue()
+    if write_behind:
+      write_behind.attach(self)
+      self.write_behind = write_behind
+    if eviction is not None:
+      eviction.attach(self)
+      self.eviction = eviction
+
   @abstractmethod
   def get_from_cache(self, key: str) -> str:
     """
@@ -25,7 +145,8 @@ class LLMCache(ABC):
       key: The key to get the data for.
 
     Returns:
-      str: A string containing the response
+      str: A string containing the response, or bytes for binary encoded
+      entries of backends that support binary values.
     """
     pass
 
@@ -36,17 +157,177 @@ class LLMCache(ABC):
 
     Args:
       key: The key to set the data for.
-      value: The data to set.
+      value: The data to set. A string, or bytes if the backend supports binary values.
 
     Returns:
       True if the data was successfully set.
     """
     pass
 
+  def get_many_from_cache(self, keys: List[str]) -> List[str]:
+    """
+    Returns the data associated with each of the keys.
+
+    The default implementation calls `get_from_cache` for every key. Backends that
+    support bulk reads should override it to resolve all keys in one round trip.
+
+    Args:
+      keys: The keys to get the data for.
+
+    Returns:
+      List[str]: The data of each key, in the order of keys. Missing keys map to an empty string.
+    """
+    return [self.get_from_cache(key) for key in keys]
+
+  def add_many_to_cache(self, items: Dict[str, str]) -> bool:
+    """
+    Sets the data associated with each of the keys.
+
+    The default implementation calls `add_to_cache` for every key. Backends that
+    support bulk writes should override it to write all items in one round trip.
+
+    Args:
+      items: The data to set, keyed by cache key.
+
+    Returns:
+      True if all the data was successfully set.
+    """
+    result = True
+    for key, value in items.items():
+      result = self.add_to_cache(key, value) and result
+    return result
+
+  def append_to_cache(self, key: str, data: bytes) -> bool:
+    """
+    Appends data to the bytes stored under the key, creating it if needed.
+    Implemented by backends whose `supports_append` is True.
+
+    Args:
+      key: The key to append the data to.
+      data: The data to append.
+
+    Returns:
+      True if the data was successfully appended.
+    """
+    raise NotImplementedError(f"{type(self).__name__} does not support appends.")
+
+  def get_appended_from_cache(self, key: str) -> bytes:
+    """
+    Returns the bytes appended under the key with `append_to_cache`.
+    Implemented by backends whose `supports_append` is True.
+
+    Args:
+      key: The key to get the data for.
+
+    Returns:
+      The appended bytes, or empty bytes if the key is not found.
+    """
+    raise NotImplementedError(f"{type(self).__name__} does not support appends.")
+
+  def delete_from_cache(self, key: str) -> bool:
+    """
+    Removes a key from the cache. Implemented by backends that support deletes.
+
+    Args:
+      key: The key to remove.
+
+    Returns:
+      True if the key was present.
+    """
+    raise NotImplementedError(f"{type(self).__name__} does not support deletes.")
+
+  def delete_many_from_cache(self, keys: List[str]) -> int:
+    """
+    Removes several keys from the cache.
+
+    The default implementation calls `delete_from_cache` for every key. Backends that
+    support bulk deletes should override it to remove all keys in one round trip.
+
+    Args:
+      keys: The keys to remove.
+
+    Returns:
+      The number of removed keys.
+    """
+    return sum(1 for key in keys if self.delete_from_cache(key))
+
+  def scan_cache(self, cursor: str = None, prefix: str = "",
+                 limit: int = 1000) -> Tuple[List[tuple], Optional[str]]:
+    """
+    Returns a page of the entries whose key starts with prefix. Implemented by
+    backends whose `supports_scan` is True.
+
+    Pages are resumed with the cursor returned by the previous page, which stays valid
+    across processes, so a scan can be checkpointed. Entries written during a scan
+    may or may not be listed.
+
+    Args:
+      cursor: The cursor returned with the previous page, or None for the first page.
+      prefix: The prefix of the listed keys.
+      limit: Maximum number of entries of the page.
+
+    Returns:
+      A list of (key, value, metadata) tuples, where metadata holds the "func_name"
+      and the "created_at" Unix time of the entry if the backend records them, and
+      the cursor of the next page, or None if this is the last page.
+    """
+    raise NotImplementedError(f"{type(self).__name__} does not support scans.")
+
+  def iter_cache(self, prefix: str = "", batch_size: int = 1000) -> Iterator[tuple]:
+    """
+    Iterates over the (key, value, metadata) entries whose key starts with prefix,
+    reading batch_size entries at a time with `scan_cache`.
+    """
+    cursor = None
+    while True:
+      entries, cursor = self.scan_cache(cursor, prefix, batch_size)
+      yield from entries
+      if cursor is None:
+        return
+
+  async def aget_from_cache(self, key: str) -> str:
+    """
+    Returns the data associated with the key without blocking the event loop.
+
+    The default implementation runs `get_from_cache` in the event loop's default
+    executor. Backends with a native asynchronous client should override it.
+
+    Args:
+      key: The key to get the data for.
+
+    Returns:
+      str: A string containing the response
+    """
+    import asyncio
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, self.get_from_cache, key)
+
+  async def aadd_to_cache(self, key: str, value: str, **options) -> bool:
+    """
+    Sets the data associated with the key without blocking the event loop.
+
+    The default implementation runs `add_to_cache` in the event loop's default
+    executor. Backends with a native asynchronous client should override it.
+
+    Args:
+      key: The key to set the data for.
+      value: The data to set.
+      **options: The `func_name` and `ttl` of backends whose `supports_metadata` or
+        `supports_ttl` is True.
+
+    Returns:
+      True if the data was successfully set.
+    """
+    import asyncio
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+      None, functools.partial(self.add_to_cache, key, value, **options))
+
   def call(self, func: Callable,
            exclude_cache_params=None,
            num_retries_call=3,
            backoff_intervals_call=None,
+           cache_ttl=None,
            **kwargs: Any) -> Any:
     """
     Calls the specified function with provided arguments, 
@@ -58,6 +339,8 @@ class LLMCache(ABC):
       exclude_cache_params (list, optional): A list of arguments to be excluded from cache key.
       num_retries_call (int, optional): The number of retries in case of function call failure.
       backoff_intervals_call (list, optional): A list of intervals to wait between retries.
+      cache_ttl (float, optional): Time-to-live in seconds of the cached response,
+        overriding the function and cache defaults.
       **kwargs (Any): Arbitrary keyword arguments to be passed to the function.
 
     Returns:
@@ -67,45 +350,70 @@ class LLMCache(ABC):
       ValueError: If the length of backoff_intervals does not match num_retries_call.
       Exception: Propagates exceptions from the function call after exhausting retries.
     """
-
-    if exclude_cache_params is None:
-      exclude_cache_params = []
-
-    if backoff_intervals_call is None:
-      backoff_intervals_call = [5, 30, 60]
-
-    if len(backoff_intervals_call) != num_retries_call:
-      raise ValueError(f"The length of backoff_intervals ({len(backoff_intervals_call)}) "
-                       f"must match num_retries ({num_retries_call}).")
+    exclude_cache_params, backoff_intervals_call = self._validate_call_params(
+      exclude_cache_params, num_retries_call, backoff_intervals_call)
 
     cache_params = {k: v for k, v in kwargs.items() if k not in exclude_cache_params}
     func_name = func.__name__
+    ttl = self._entry_ttl(func_name, cache_ttl)
     cached_response, cache_key = self._get_cached_response(func_name, cache_params)
+    semantic_query = None
+    if not cached_response and self.semantic_cache is not None:
+      cached_response, semantic_query = self._semantic_lookup(func_name, cache_params)
+    if self._metrics is not None:
+      self._metrics.count(HITS if cached_response else MISSES, func_name)
+    if cached_response:
+      logger.debug("Cache hit for key: %s", cache_key)
+      return cached_response
+    if self._single_flight is not None:
+      response = self._single_flight.do(
+        cache_key,
+        lambda: self._call_coalesced(func, func_name, cache_key, cache_params,
+                                     backoff_intervals_call, kwargs, ttl),
+        timeout=self.coalesce_timeout)
+    else:
+      response = self._call_function(func, func_name, cache_key, cache_params,
+                                     backoff_intervals_call, kwargs, ttl)
+    if semantic_query is not None:
+      self._semantic_add(cache_key, semantic_query)
+    return response
+
+  def _call_coalesced(self, func: Callable, func_name: str, cache_key: str, cache_params: dict,
+                      backoff_intervals_call: list, kwargs: dict, ttl: float) -> Any:
+    """
+    Runs the function as the leader of a coalesced call. The cache is checked again
+    first, since a previous leader may have stored the response in the meantime.
+    """
+    cached_response, _ = self._get_cached_response(func_name, cache_params)
     if cached_response:
-      logger.info(f"Cache hit for key: {cache_key}")
+      logger.debug("Cache hit for key: %s", cache_key)
       return cached_response
+    return self._call_function(func, func_name, cache_key, cache_params,
+                               backoff_intervals_call, kwargs, ttl)
+
+  def _call_function(self, func: Callable, func_name: str, cache_key: str, cache_params: dict,
+                     backoff_intervals_call: list, kwargs: dict, ttl: float) -> Any:
+    """
+    Calls the function, retrying after each backoff interval on failure,
+    and stores its response in the cache. Only failures of the function are
+    retried; failures to store the response are logged.
+
+    Returns:
+      Any: The response from the function call.
+
+    Raises:
+      Exception: Propagates exceptions from the function call after exhausting retries.
+    """
     logger.info("No cached result found. Calling function.")
-    try:
-      response = func(**kwargs)
-      value = json.dumps({"response": response, "cache_params": cache_params})
-      self.add_to_cache(cache_key, value)
-      return response
-    except Exception as e:
-      logger.error(f"Error calling function with name {func_name}: {e}")
-      if num_retries_call > 0:
-        logger.info(f"Sleeping Retrying in {backoff_intervals_call[0]} seconds...")
-        time.sleep(backoff_intervals_call[0])
-        return self.call(func,
-                         exclude_cache_params,
-                         num_retries_call=num_retries_call - 1,
-                         backoff_intervals_call=backoff_intervals_call[1:],
-                         **kwargs)
-      else:
-        logger.error(f"No more retries left. The last error: {e}")
-        raise
+    if self._metrics is not None:
+      func = self._metrics.timed(func, func_name)
+    response = self._invoke_with_retries(func, func_name, backoff_intervals_call, kwargs)
+    self._persist(cache_key, func_name, response, cache_params, ttl)
+    return response
 
   def stream_call(self, func: Callable, exclude_cache_params=None,
-                  num_retries_call=3, backoff_intervals_call=None, **kwargs: Any) -> Any:
+                  num_retries_call=3, backoff_intervals_call=None, cache_ttl=None,
+                  **kwargs: Any) -> Any:
     """
     Calls the specified streaming function with provided arguments, 
     caching and retrieving the response from the cache when possible.
@@ -116,6 +424,8 @@ class LLMCache(ABC):
       exclude_cache_params (list, optional): A list of arguments to be excluded from cache key.
       num_retries_call (int, optional): The number of retries in case of function call failure.
       backoff_intervals_call (list, optional): A list of intervals to wait between retries.
+      cache_ttl (float, optional): Time-to-live in seconds of the cached response,
+        overriding the function and cache defaults.
       **kwargs (Any): Arbitrary keyword arguments to be passed to the function.
 
     Returns:
@@ -125,45 +435,660 @@ class LLMCache(ABC):
       ValueError: If the length of backoff_intervals does not match num_retries_call.
       Exception: Propagates exceptions from the function call after exhausting retries.
     """
-    if exclude_cache_params is None:
-      exclude_cache_params = []
+    exclude_cache_params, backoff_intervals_call = self._validate_call_params(
+      exclude_cache_params, num_retries_call, backoff_intervals_call)
 
-    if backoff_intervals_call is None:
-      backoff_intervals_call = [5, 30, 60]
+    cache_params = {k: v for k, v in kwargs.items() if k not in exclude_cache_params}
+    func_name = func.__name__
+    ttl = self._entry_ttl(func_name, cache_ttl)
+    cached_response, cache_key = self._get_cached_response(func_name, cache_params)
+    cached_stream = self._load_cached_stream(cached_response)
+    if self._metrics is not None:
+      self._metrics.count(HITS if cached_stream is not None else MISSES, func_name)
+    if cached_stream is not None:
+      logger.debug("Cache hit for key: %s", cache_key)
+      yield from self._replay_stream(cached_stream)
+    elif self._single_flight is not None:
+      yield from self._single_flight.do_stream(
+        cache_key,
+        lambda: self._stream_coalesced(func, func_name, cache_key, cache_params,
+                                       backoff_intervals_call, kwargs, ttl),
+        timeout=self.coalesce_timeout)
+    else:
+      yield from self._stream_function(func, func_name, cache_key, cache_params,
+                                       backoff_intervals_call, kwargs, ttl)
 
-    if len(backoff_intervals_call) != num_retries_call:
-      raise ValueError(f"The length of backoff_intervals ({len(backoff_intervals_call)}) "
-                       f"must match num_retries ({num_retries_call}).")
+  def _stream_coalesced(self, func: Callable, func_name: str, cache_key: str,
+                        cache_params: dict, backoff_intervals_call: list, kwargs: dict,
+                        ttl: float) -> Any:
+    """
+    Streams the function as the leader of a coalesced call. The cache is checked
+    again first, since a previous leader may have stored the response in the meantime.
+    """
+    cached_response, _ = self._get_cached_response(func_name, cache_params)
+    cached_stream = self._load_cached_stream(cached_response)
+    if cached_stream is not None:
+      logger.debug("Cache hit for key: %s", cache_key)
+      yield from self._replay_stream(cached_stream)
+    else:
+      yield from self._stream_function(func, func_name, cache_key, cache_params,
+                                       backoff_intervals_call, kwargs, ttl)
+
+  def _stream_function(self, func: Callable, func_name: str, cache_key: str,
+                       cache_params: dict, backoff_intervals_call: list, kwargs: dict,
+                       ttl: float) -> Any:
+    """
+    Streams the function, retrying after each backoff interval on failure,
+    and stores the complete stream in the cache. Long streams are appended to
+    backends that support appends while they run.
+
+    Yields:
+      bytes: The chunks produced by the function.
+
+    Raises:
+      Exception: Propagates exceptions from the function call after exhausting retries.
+    """
+    logger.info("No cached result found. Calling function.")
+    if self._metrics is not None:
+      func = self._metrics.timed_stream(func, func_name)
+    while True:
+      recorder = StreamRecorder(self, cache_key, self.stream_flush_bytes)
+      try:
+        for chunk in func(**kwargs):
+          if recorder.add(chunk):
+            recorder.flush()
+          yield chunk
+        break
+      except GeneratorExit:
+        recorder.abort()
+        raise
+      except Exception as e:
+        recorder.abort()
+        logger.error(f"Error calling streaming function with name {func_name}: {e}")
+        if not backoff_intervals_call:
+          logger.error(f"No more retries left. Last error: {e}")
+          raise
+        logger.info(f"Retrying in {backoff_intervals_call[0]} seconds...")
+        time.sleep(backoff_intervals_call[0])
+        backoff_intervals_call = backoff_intervals_call[1:]
+    response = recorder.finish()
+    if response is not None and not self._persist(cache_key, func_name, response, cache_params,
+                                                  ttl):
+      recorder.abort()
+
+  def batch_call(self, func: Callable,
+                 kwargs_list: List[dict],
+                 exclude_cache_params=None,
+                 num_retries_call=3,
+                 backoff_intervals_call=None,
+                 max_workers=8,
+                 return_exceptions=False,
+                 write_batch_size=500,
+                 cache_ttl=None) -> List[Any]:
+    """
+    Calls the specified function once for each set of keyword arguments, resolving
+    cache hits with a single bulk lookup and running only the misses.
+
+    Misses run concurrently on a thread pool, identical calls within the batch run
+    only once, and responses are written to the cache in bulk as they complete.
+
+    Args:
+      func (Callable): The function to be called.
+      kwargs_list (List[dict]): The keyword arguments of each call.
+      exclude_cache_params (list, optional): A list of arguments to be excluded from cache key.
+      num_retries_call (int, optional): The number of retries in case of function call failure.
+      backoff_intervals_call (list, optional): A list of intervals to wait between retries.
+      max_workers (int, optional): Maximum number of misses running concurrently. Ignored
+        when an execution engine is set, which bounds concurrency itself.
+      return_exceptions (bool, optional): Whether calls that fail after exhausting their
+        retries return their exception in place of a response instead of raising it.
+      write_batch_size (int, optional): Number of responses written to the cache per bulk write.
+      cache_ttl (float, optional): Time-to-live in seconds of the cached responses,
+        overriding the function and cache defaults.
+
+    Returns:
+      List[Any]: The response of each call, in the order of kwargs_list.
+
+    Raises:
+      ValueError: If the length of backoff_intervals does not match num_retries_call.
+      Exception: Propagates the first exception from the function calls after exhausting
+        retries, unless return_exceptions is set. Successful responses are cached first.
+    """
+    exclude_cache_params, backoff_intervals_call = self._validate_call_params(
+      exclude_cache_params, num_retries_call, backoff_intervals_call)
+
+    func_name = func.__name__
+    ttl = self._entry_ttl(func_name, cache_ttl)
+    metrics = self._metrics
+    started = metrics.now() if metrics is not None else 0
+    calls = {}
+    call_keys = []
+    for kwargs in kwargs_list:
+      cache_params = {k: v for k, v in kwargs.items() if k not in exclude_cache_params}
+      cache_key, fingerprint = self.key_generator.generate(func_name, cache_params)
+      calls.setdefault(cache_key, (cache_params, kwargs, fingerprint))
+      call_keys.append(cache_key)
+    if metrics is not None:
+      started = metrics.record(KEY_GENERATION, func_name, started)
+
+    unique_keys = list(calls)
+    try:
+      values = self.get_many_from_cache(unique_keys)
+    except Exception as e:
+      logger.error(f"Error getting from cache: {e}")
+      values = [""] * len(unique_keys)
+      if metrics is not None:
+        metrics.count(GET_ERRORS, func_name)
+    if metrics is not None:
+      started = metrics.record(BACKEND_GET, func_name, started)
+    if self.write_behind is not None:
+      values = [self.write_behind.get(cache_key) or value
+                for cache_key, value in zip(unique_keys, values)]
+
+    results = {}
+    for cache_key, value in zip(unique_keys, values):
+      try:
+        response = self._parse_cached_response(value, calls[cache_key][0], calls[cache_key][2])
+      except Exception as e:
+        logger.error(f"Error getting from cache: {e}")
+        response = None
+      if response:
+        results[cache_key] = response
+        if self.eviction is not None:
+          self.eviction.record_access(cache_key)
+    misses = [cache_key for cache_key in unique_keys if cache_key not in results]
+    if metrics is not None:
+      metrics.record(DESERIALIZATION, func_name, started)
+      metrics.count(HITS, func_name, len(unique_keys) - len(misses))
+      metrics.count(MISSES, func_name, len(misses))
+      func = metrics.timed(func, func_name)
+    logger.info(f"Batch of {len(kwargs_list)} calls: {len(unique_keys) - len(misses)} cached, "
+                f"{len(misses)} to call.")
+
+    errors = {}
+    pending_writes = {}
+    if misses:
+      executor = None
+      if self.execution_engine is not None:
+        futures = {self.execution_engine.submit(func, calls[cache_key][1],
+                                                backoff_intervals_call): cache_key
+                   for cache_key in misses}
+      else:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        futures = {executor.submit(self._invoke_with_retries, func, func_name,
+                                   backoff_intervals_call, calls[cache_key][1]): cache_key
+                   for cache_key in misses}
+      try:
+        for future in as_completed(futures):
+          cache_key = futures[future]
+          try:
+            response = future.result()
+          except Exception as e:
+            errors[cache_key] = e
+            continue
+          results[cache_key] = response
+          cache_params, _, fingerprint = calls[cache_key]
+          try:
+            pending_writes[cache_key] = self._build_cache_value(func_name, response,
+                                                                 cache_params, fingerprint, ttl)
+          except Exception as e:
+            logger.error(f"Error adding to cache: {e}")
+            continue
+          if len(pending_writes) >= write_batch_size:
+            self._write_many(pending_writes, func_name, ttl)
+            pending_writes = {}
+      finally:
+        if executor is not None:
+          executor.shutdown()
+        self._write_many(pending_writes, func_name, ttl)
+
+    if errors and not return_exceptions:
+      raise next(iter(errors.values()))
+    return [results[cache_key] if cache_key in results else errors[cache_key]
+            for cache_key in call_keys]
+
+  def _invoke_with_retries(self, func: Callable, func_name: str,
+                           backoff_intervals_call: list, kwargs: dict) -> Any:
+    """
+    Calls the function, retrying after each backoff interval on failure.
+
+    Returns:
+      Any: The response from the function call.
+
+    Raises:
+      Exception: Propagates exceptions from the function call after exhausting retries.
+    """
+    if self.execution_engine is not None:
+      return self.execution_engine.run(func, kwargs, backoff_intervals_call)
+    while True:
+      try:
+        return func(**kwargs)
+      except Exception as e:
+        logger.error(f"Error calling function with name {func_name}: {e}")
+        if not backoff_intervals_call:
+          logger.error(f"No more retries left. The last error: {e}")
+          raise
+        logger.info(f"Retrying in {backoff_intervals_call[0]} seconds...")
+        time.sleep(backoff_intervals_call[0])
+        backoff_intervals_call = backoff_intervals_call[1:]
+
+  def _store_value(self, cache_key: str, value: Union[str, bytes], func_name: str,
+                   ttl: float = None) -> bool:
+    """
+    Stores a value, passing the function name to backends that keep it as metadata
+    and the time-to-live to backends that expire entries natively.
+    """
+    return self.add_to_cache(cache_key, value, **self._write_options(func_name, ttl))
+
+  async def _astore_value(self, cache_key: str, value: Union[str, bytes], func_name: str,
+                          ttl: float = None) -> bool:
+    """
+    Asynchronous counterpart of `_store_value`.
+    """
+    return await self.aadd_to_cache(cache_key, value, **self._write_options(func_name, ttl))
+
+  def _write_options(self, func_name: str, ttl: float) -> dict:
+    """
+    Returns the keyword arguments of the backend writes of a function's entries.
+    """
+    options = {}
+    if self.supports_metadata:
+      options["func_name"] = func_name
+    if self.supports_ttl and ttl is not None:
+      options["ttl"] = ttl
+    return options
+
+  def _entry_ttl(self, func_name: str, cache_ttl: float = None) -> Optional[float]:
+    """
+    Returns the time-to-live of a new entry: the one of the call, else the one of the
+    function, else the default of the cache.
+    """
+    if cache_ttl is not None:
+      return cache_ttl
+    if self.function_ttls is not None and func_name in self.function_ttls:
+      return self.function_ttls[func_name]
+    return self.ttl
+
+  def _persist(self, cache_key: str, func_name: str, response: Any, cache_params: dict,
+               ttl: float = None) -> bool:
+    """
+    Stores a response, through the write-behind queue if one is set. Failures are
+    logged instead of raised, so they never cause the function to be called again.
+
+    Returns:
+      bool: False if the response could not be stored or queued.
+    """
+    metrics = self._metrics
+    started = metrics.now() if metrics is not None else 0
+    try:
+      value = self._build_cache_value(func_name, response, cache_params, ttl=ttl)
+      if metrics is not None:
+        started = metrics.record(SERIALIZATION, func_name, started)
+      if self.eviction is not None:
+        self.eviction.record_write(cache_key)
+      if self.write_behind is not None:
+        return self.write_behind.put(cache_key, value, func_name, ttl=ttl)
+      self._store_value(cache_key, value, func_name, ttl)
+      if metrics is not None:
+        metrics.record(BACKEND_SET, func_name, started)
+      return True
+    except Exception as e:
+      logger.error(f"Error adding to cache: {e}")
+      if metrics is not None:
+        metrics.count(SET_ERRORS, func_name)
+      return False
+
+  async def _apersist(self, cache_key: str, func_name: str, response: Any,
+                      cache_params: dict, ttl: float = None) -> bool:
+    """
+    Asynchronous counterpart of `_persist`. A write that has to wait for room in the
+    write-behind queue waits in the default executor.
+    """
+    import asyncio
+    metrics = self._metrics
+    started = metrics.now() if metrics is not None else 0
+    try:
+      value = self._build_cache_value(func_name, response, cache_params, ttl=ttl)
+      if metrics is not None:
+        started = metrics.record(SERIALIZATION, func_name, started)
+      if self.eviction is not None:
+        self.eviction.record_write(cache_key)
+      if self.write_behind is None:
+        await self._astore_value(cache_key, value, func_name, ttl)
+        if metrics is not None:
+          metrics.record(BACKEND_SET, func_name, started)
+        return True
+      if self.write_behind.put(cache_key, value, func_name, block=False, ttl=ttl):
+        return True
+      if self.write_behind.backpressure != BLOCK:
+        return False
+      loop = asyncio.get_event_loop()
+      return await loop.run_in_executor(
+        None, functools.partial(self.write_behind.put, cache_key, value, func_name, ttl=ttl))
+    except Exception as e:
+      logger.error(f"Error adding to cache: {e}")
+      if metrics is not None:
+        metrics.count(SET_ERRORS, func_name)
+      return False
+
+  def _write_many(self, items: Dict[str, str], func_name: str = None, ttl: float = None):
+    """
+    Writes a batch of values to the cache, or to the write-behind queue if one is set,
+    logging failures instead of raising them.
+    """
+    if not items:
+      return
+    if self.eviction is not None:
+      for cache_key in items:
+        self.eviction.record_write(cache_key)
+    if self.write_behind is not None:
+      for cache_key, value in items.items():
+        self.write_behind.put(cache_key, value, func_name, ttl=ttl)
+      return
+    metrics = self._metrics
+    started = metrics.now() if metrics is not None else 0
+    try:
+      self.add_many_to_cache(items, **self._write_options(func_name, ttl))
+      if metrics is not None:
+        metrics.record(BACKEND_SET, func_name, started)
+    except Exception as e:
+      logger.error(f"Error adding {len(items)} entries to cache: {e}")
+      if metrics is not None:
+        metrics.count(SET_ERRORS, func_name, len(items))
+
+  async def acall(self, func: Callable,
+                  exclude_cache_params=None,
+                  num_retries_call=3,
+                  backoff_intervals_call=None,
+                  cache_ttl=None,
+                  **kwargs: Any) -> Any:
+    """
+    Asynchronous counterpart of `call`. Cache lookups and writes go through
+    `aget_from_cache` and `aadd_to_cache`, and backoff waits do not block the event loop.
+
+    Args:
+      func (Callable): The function to be called. Coroutine functions are awaited,
+        other functions run in the event loop's default executor.
+      exclude_cache_params (list, optional): A list of arguments to be excluded from cache key.
+      num_retries_call (int, optional): The number of retries in case of function call failure.
+      backoff_intervals_call (list, optional): A list of intervals to wait between retries.
+      cache_ttl (float, optional): Time-to-live in seconds of the cached response,
+        overriding the function and cache defaults.
+      **kwargs (Any): Arbitrary keyword arguments to be passed to the function.
+
+    Returns:
+      Any: The response from the function call, either from the cache or directly from the function.
+
+    Raises:
+      ValueError: If the length of backoff_intervals does not match num_retries_call.
+      Exception: Propagates exceptions from the function call after exhausting retries.
+    """
+    exclude_cache_params, backoff_intervals_call = self._validate_call_params(
+      exclude_cache_params, num_retries_call, backoff_intervals_call)
 
     cache_params = {k: v for k, v in kwargs.items() if k not in exclude_cache_params}
     func_name = func.__name__
-    cached_response, cache_key = self._get_cached_response(func_name, cache_params)
+    ttl = self._entry_ttl(func_name, cache_ttl)
+    cached_response, cache_key = await self._aget_cached_response(func_name, cache_params)
+    semantic_query = None
+    if not cached_response and self.semantic_cache is not None:
+      cached_response, semantic_query = await self._asemantic_lookup(func_name, cache_params)
+    if self._metrics is not None:
+      self._metrics.count(HITS if cached_response else MISSES, func_name)
     if cached_response:
-      logger.info(f"Cache hit for key: {cache_key}")
-      for chunk in cached_response:
-        yield chunk.encode("utf-8")
+      logger.debug("Cache hit for key: %s", cache_key)
+      return cached_response
+    if self._async_single_flight is not None:
+      response = await self._async_single_flight.do(
+        cache_key,
+        lambda: self._acall_coalesced(func, func_name, cache_key, cache_params,
+                                      backoff_intervals_call, kwargs, ttl),
+        timeout=self.coalesce_timeout)
     else:
-      logger.info("No cached result found. Calling function.")
+      response = await self._acall_function(func, func_name, cache_key, cache_params,
+                                            backoff_intervals_call, kwargs, ttl)
+    if semantic_query is not None:
+      self._semantic_add(cache_key, semantic_query)
+    return response
+
+  async def _acall_coalesced(self, func: Callable, func_name: str, cache_key: str,
+                             cache_params: dict, backoff_intervals_call: list,
+                             kwargs: dict, ttl: float) -> Any:
+    """
+    Asynchronous counterpart of `_call_coalesced`.
+    """
+    cached_response, _ = await self._aget_cached_response(func_name, cache_params)
+    if cached_response:
+      logger.debug("Cache hit for key: %s", cache_key)
+      return cached_response
+    return await self._acall_function(func, func_name, cache_key, cache_params,
+                                      backoff_intervals_call, kwargs, ttl)
+
+  async def _acall_function(self, func: Callable, func_name: str, cache_key: str,
+                            cache_params: dict, backoff_intervals_call: list,
+                            kwargs: dict, ttl: float) -> Any:
+    """
+    Asynchronous counterpart of `_call_function`.
+    """
+    logger.info("No cached result found. Calling function.")
+    if self._metrics is not None:
+      func = self._metrics.timed(func, func_name)
+    if self.execution_engine is not None:
+      response = await self.execution_engine.arun(func, kwargs, backoff_intervals_call)
+    else:
+      response = await self._ainvoke_with_retries(func, func_name, backoff_intervals_call,
+                                                  kwargs)
+    await self._apersist(cache_key, func_name, response, cache_params, ttl)
+    return response
+
+  async def _ainvoke_with_retries(self, func: Callable, func_name: str,
+                                  backoff_intervals_call: list, kwargs: dict) -> Any:
+    """
+    Asynchronous counterpart of `_invoke_with_retries`, without the execution engine.
+    """
+    import asyncio
+    while True:
       try:
-        response_stream = []
-        for chunk in func(**kwargs):
-          response_stream.append(chunk.decode("utf-8"))
+        if asyncio.iscoroutinefunction(func):
+          return await func(**kwargs)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, functools.partial(func, **kwargs))
+      except Exception as e:
+        logger.error(f"Error calling function with name {func_name}: {e}")
+        if not backoff_intervals_call:
+          logger.error(f"No more retries left. The last error: {e}")
+          raise
+        logger.info(f"Retrying in {backoff_intervals_call[0]} seconds...")
+        await asyncio.sleep(backoff_intervals_call[0])
+        backoff_intervals_call = backoff_intervals_call[1:]
+
+  async def astream_call(self, func: Callable, exclude_cache_params=None,
+                         num_retries_call=3, backoff_intervals_call=None, cache_ttl=None,
+                         **kwargs: Any) -> AsyncIterator[bytes]:
+    """
+    Asynchronous counterpart of `stream_call`.
+
+    Args:
+      func (Callable): The streaming function to be called. It may return an async
+        iterator or a regular iterator, which is then advanced in the default executor.
+      exclude_cache_params (list, optional): A list of arguments to be excluded from cache key.
+      num_retries_call (int, optional): The number of retries in case of function call failure.
+      backoff_intervals_call (list, optional): A list of intervals to wait between retries.
+      cache_ttl (float, optional): Time-to-live in seconds of the cached response,
+        overriding the function and cache defaults.
+      **kwargs (Any): Arbitrary keyword arguments to be passed to the function.
+
+    Returns:
+      AsyncIterator[bytes]: Yields the response from the function call, either from the cache or directly from the function.
+
+    Raises:
+      ValueError: If the length of backoff_intervals does not match num_retries_call.
+      Exception: Propagates exceptions from the function call after exhausting retries.
+    """
+    exclude_cache_params, backoff_intervals_call = self._validate_call_params(
+      exclude_cache_params, num_retries_call, backoff_intervals_call)
+
+    cache_params = {k: v for k, v in kwargs.items() if k not in exclude_cache_params}
+    func_name = func.__name__
+    ttl = self._entry_ttl(func_name, cache_ttl)
+    cached_response, cache_key = await self._aget_cached_response(func_name, cache_params)
+    cached_stream = await self._aload_cached_stream(cached_response)
+    if self._metrics is not None:
+      self._metrics.count(HITS if cached_stream is not None else MISSES, func_name)
+    if cached_stream is not None:
+      logger.debug("Cache hit for key: %s", cache_key)
+      async for chunk in self._areplay_stream(cached_stream):
+        yield chunk
+      return
+    if self._async_single_flight is not None:
+      stream = self._async_single_flight.do_stream(
+        cache_key,
+        lambda: self._astream_coalesced(func, func_name, cache_key, cache_params,
+                                        backoff_intervals_call, kwargs, ttl),
+        timeout=self.coalesce_timeout)
+    else:
+      stream = self._astream_function(func, func_name, cache_key, cache_params,
+                                      backoff_intervals_call, kwargs, ttl)
+    async for chunk in stream:
+      yield chunk
+
+  async def _astream_coalesced(self, func: Callable, func_name: str, cache_key: str,
+                               cache_params: dict, backoff_intervals_call: list,
+                               kwargs: dict, ttl: float) -> AsyncIterator[bytes]:
+    """
+    Asynchronous counterpart of `_stream_coalesced`.
+    """
+    cached_response, _ = await self._aget_cached_response(func_name, cache_params)
+    cached_stream = await self._aload_cached_stream(cached_response)
+    if cached_stream is not None:
+      logger.debug("Cache hit for key: %s", cache_key)
+      async for chunk in self._areplay_stream(cached_stream):
+        yield chunk
+      return
+    async for chunk in self._astream_function(func, func_name, cache_key, cache_params,
+                                              backoff_intervals_call, kwargs, ttl):
+      yield chunk
+
+  async def _astream_function(self, func: Callable, func_name: str, cache_key: str,
+                              cache_params: dict, backoff_intervals_call: list,
+                              kwargs: dict, ttl: float) -> AsyncIterator[bytes]:
+    """
+    Asynchronous counterpart of `_stream_function`.
+    """
+    import asyncio
+    logger.info("No cached result found. Calling function.")
+    if self._metrics is not None:
+      func = self._metrics.timed_stream(func, func_name)
+    loop = asyncio.get_event_loop()
+    while True:
+      recorder = StreamRecorder(self, cache_key, self.stream_flush_bytes)
+      try:
+        async for chunk in _aiterate(func(**kwargs)):
+          if recorder.add(chunk):
+            await loop.run_in_executor(None, recorder.flush)
           yield chunk
-        value = json.dumps({"response": response_stream, "cache_params": cache_params})
-        self.add_to_cache(cache_key, value)
+        break
+      except GeneratorExit:
+        recorder.abort()
+        raise
       except Exception as e:
+        recorder.abort()
         logger.error(f"Error calling streaming function with name {func_name}: {e}")
-        if num_retries_call > 0:
-          logger.info(f"Retrying in {backoff_intervals_call[0]} seconds...")
-          time.sleep(backoff_intervals_call[0])
-          yield from self.stream_call(func,
-                                      exclude_cache_params=exclude_cache_params,
-                                      num_retries_call=num_retries_call - 1,
-                                      backoff_intervals_call=backoff_intervals_call[1:],
-                                      **kwargs)
-        else:
-          logger.error("No more retries left. Last error: {e}")
+        if not backoff_intervals_call:
+          logger.error(f"No more retries left. Last error: {e}")
           raise
+        logger.info(f"Retrying in {backoff_intervals_call[0]} seconds...")
+        await asyncio.sleep(backoff_intervals_call[0])
+        backoff_intervals_call = backoff_intervals_call[1:]
+    if recorder.journaled:
+      response = await loop.run_in_executor(None, recorder.finish)
+    else:
+      response = recorder.finish()
+    if response is not None and not await self._apersist(cache_key, func_name, response,
+                                                         cache_params, ttl):
+      recorder.abort()
+
+  def _load_cached_stream(self, cached_response: Any) -> Any:
+    """
+    Decodes a cached stream, reading its data key if it was persisted incrementally.
+
+    Returns:
+      Any: The joined buffer, chunk end offsets and chunk delays of the stream, or None
+      if there is no complete cached stream.
+    """
+    if not cached_response:
+      return None
+    data_key = stream_data_key(cached_response)
+    try:
+      data = self.get_appended_from_cache(data_key) if data_key else None
+    except Exception as e:
+      logger.error(f"Error getting stream data from cache: {e}")
+      return None
+    return load_stream(cached_response, data, with_delays=self.replay_stream_timing)
+
+  async def _aload_cached_stream(self, cached_response: Any) -> Any:
+    """
+    Asynchronous counterpart of `_load_cached_stream`.
+    """
+    import asyncio
+    if not cached_response:
+      return None
+    data_key = stream_data_key(cached_response)
+    if data_key is None:
+      return load_stream(cached_response, with_delays=self.replay_stream_timing)
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, self._load_cached_stream, cached_response)
+
+  def _replay_stream(self, cached_stream: Any) -> Iterator[bytes]:
+    """
+    Returns an iterator over the chunks of a cached stream, which waits the recorded
+    delay before each one if `replay_stream_timing` is set.
+    """
+    buffer, ends, delays_ms = cached_stream
+    if not (self.replay_stream_timing and delays_ms):
+      return iter_chunks(buffer, ends)
+    return _paced(iter_chunks(buffer, ends), delays_ms)
+
+  async def _areplay_stream(self, cached_stream: Any) -> AsyncIterator[bytes]:
+    """
+    Asynchronous counterpart of `_replay_stream`.
+    """
+    import asyncio
+    buffer, ends, delays_ms = cached_stream
+    if not (self.replay_stream_timing and delays_ms):
+      for chunk in iter_chunks(buffer, ends):
+        yield chunk
+      return
+    for chunk, delay_ms in zip(iter_chunks(buffer, ends), delays_ms):
+      await asyncio.sleep(delay_ms / 1000)
+      yield chunk
+
+  def _validate_call_params(self, exclude_cache_params, num_retries_call, backoff_intervals_call):
+    """
+    Applies the defaults of the call parameters and validates the backoff intervals.
+    Without explicit intervals, the execution engine's backoff policy is used if
+    an engine is set.
+
+    Returns:
+      list: The parameters excluded from the cache key.
+      list: The backoff intervals.
+
+    Raises:
+      ValueError: If the length of backoff_intervals does not match num_retries_call.
+    """
+    if exclude_cache_params is None:
+      exclude_cache_params = []
+
+    if backoff_intervals_call is None and self.execution_engine is not None:
+      backoff_intervals_call = self.execution_engine.backoff.intervals(num_retries_call)
+
+    if backoff_intervals_call is None:
+      backoff_intervals_call = [5, 30, 60]
+
+    if len(backoff_intervals_call) != num_retries_call:
+      raise ValueError(f"The length of backoff_intervals ({len(backoff_intervals_call)}) "
+                       f"must match num_retries ({num_retries_call}).")
+    return exclude_cache_params, backoff_intervals_call
 
   def _get_cached_response(self, func_name, cache_params) -> Any:
     """
@@ -178,21 +1103,192 @@ class LLMCache(ABC):
       Any: The cached response, if available, otherwise None.
       str: The cache key used for the attempted cache retrieval.
     """
-    cache_key = self._generate_cache_key(func_name, cache_params)
+    metrics = self._metrics
+    started = metrics.now() if metrics is not None else 0
+    cache_key, fingerprint = self.key_generator.generate(func_name, cache_params)
+    if metrics is not None:
+      started = metrics.record(KEY_GENERATION, func_name, started)
     try:
-      result = self.get_from_cache(cache_key)
-      if not result:
-        return None, cache_key
-      result_dict = json.loads(result)
-      cache_params_db = result_dict["cache_params"]
-      response = result_dict["response"]
-      if cache_params_db == cache_params:
-        return response, cache_key
+      result = self.write_behind.get(cache_key) if self.write_behind is not None else None
+      if result is None:
+        result = self.get_from_cache(cache_key)
+      if metrics is not None:
+        started = metrics.record(BACKEND_GET, func_name, started)
+      response = self._parse_cached_response(result, cache_params, fingerprint)
+      if metrics is not None:
+        metrics.record(DESERIALIZATION, func_name, started)
+      if response and self.eviction is not None:
+        self.eviction.record_access(cache_key)
+      return response, cache_key
+    except Exception as e:
+      logger.error(f"Error getting from cache: {e}")
+      if metrics is not None:
+        metrics.count(GET_ERRORS, func_name)
       return None, cache_key
+
+  async def _aget_cached_response(self, func_name, cache_params) -> Any:
+    """
+    Asynchronous counterpart of `_get_cached_response`.
+    """
+    metrics = self._metrics
+    started = metrics.now() if metrics is not None else 0
+    cache_key, fingerprint = self.key_generator.generate(func_name, cache_params)
+    if metrics is not None:
+      started = metrics.record(KEY_GENERATION, func_name, started)
+    try:
+      result = self.write_behind.get(cache_key) if self.write_behind is not None else None
+      if result is None:
+        result = await self.aget_from_cache(cache_key)
+      if metrics is not None:
+        started = metrics.record(BACKEND_GET, func_name, started)
+      response = self._parse_cached_response(result, cache_params, fingerprint)
+      if metrics is not None:
+        metrics.record(DESERIALIZATION, func_name, started)
+      if response and self.eviction is not None:
+        self.eviction.record_access(cache_key)
+      return response, cache_key
     except Exception as e:
       logger.error(f"Error getting from cache: {e}")
+      if metrics is not None:
+        metrics.count(GET_ERRORS, func_name)
       return None, cache_key
 
+  def _semantic_lookup(self, func_name: str, cache_params: dict) -> Any:
+    """
+    Embeds the prompt of a call and looks up the cached response of the most similar
+    call of the semantic cache.
+
+    Returns:
+      Any: The cached response of a similar call, or None.
+      tuple: The embedding and scope of the call, to index its response under, or
+      None if the call cannot be looked up semantically.
+    """
+    started = time.perf_counter()
+    try:
+      query = self.semantic_cache.query(func_name, cache_params, self.key_generator)
+      if query is None:
+        return None, None
+      text, scope = query
+      embedding = self.semantic_cache.embedding_function(text)
+      return self._semantic_match(func_name, embedding, scope, started), (embedding, scope)
+    except Exception as e:
+      logger.error(f"Error in semantic cache lookup: {e}")
+      return None, None
+
+  async def _asemantic_lookup(self, func_name: str, cache_params: dict) -> Any:
+    """
+    Asynchronous counterpart of `_semantic_lookup`. Coroutine embedding functions are
+    awaited, the rest of the lookup runs in the default executor.
+    """
+    import asyncio
+    loop = asyncio.get_event_loop()
+    embedding_function = self.semantic_cache.embedding_function
+    if not asyncio.iscoroutinefunction(embedding_function):
+      return await loop.run_in_executor(None, self._semantic_lookup, func_name, cache_params)
+    started = time.perf_counter()
+    try:
+      query = self.semantic_cache.query(func_name, cache_params, self.key_generator)
+      if query is None:
+        return None, None
+      text, scope = query
+      embedding = await embedding_function(text)
+      response = await loop.run_in_executor(None, self._semantic_match, func_name, embedding,
+                                            scope, started)
+      return response, (embedding, scope)
+    except Exception as e:
+      logger.error(f"Error in semantic cache lookup: {e}")
+      return None, None
+
+  def _semantic_match(self, func_name: str, embedding: Any, scope: int, started: float) -> Any:
+    """
+    Returns the cached response of the closest indexed call, if it is similar enough
+    and still cached.
+    """
+    match = self.semantic_cache.search(embedding, scope)
+    response = None
+    if match is not None:
+      cache_key, similarity = match
+      result = self.write_behind.get(cache_key) if self.write_behind is not None else None
+      if result is None:
+        result = self.get_from_cache(cache_key)
+      value = decode_value(result) if result else None
+      if value and not _expired(value):
+        response = value["response"]
+        logger.debug("Semantic cache hit for key: %s (similarity %.3f)", cache_key, similarity)
+    if self._metrics is not None:
+      self._metrics.record(SEMANTIC_LOOKUP, func_name, started)
+      if response:
+        self._metrics.count(SEMANTIC_HITS, func_name)
+    return response
+
+  def _semantic_add(self, cache_key: str, semantic_query: tuple):
+    """
+    Indexes the embedding of a new response, logging failures instead of raising them.
+    """
+    embedding, scope = semantic_query
+    try:
+      self.semantic_cache.add(cache_key, embedding, scope)
+    except Exception as e:
+      logger.error(f"Error adding to semantic cache: {e}")
+
+  @staticmethod
+  def _parse_cached_response(result: Union[str, bytes], cache_params: dict,
+                             fingerprint: str = None) -> Any:
+    """
+    Extracts the response from a stored value.
+
+    Entries stored with a parameter fingerprint are validated by comparing fingerprints;
+    older entries by comparing the stored parameters. Expired entries are ignored.
+
+    Args:
+      result (Union[str, bytes]): The value returned by the backend.
+      cache_params (dict): The parameters used in the cache key.
+      fingerprint (str, optional): The parameter fingerprint of the call.
+
+    Returns:
+      Any: The cached response if the value was stored for the same parameters and has
+      not expired, otherwise None.
+    """
+    if not result:
+      return None
+    result_dict = decode_value(result)
+    if _expired(result_dict):
+      return None
+    response = result_dict["response"]
+    fingerprint_db = result_dict.get("params_fingerprint")
+    if fingerprint_db is not None and fingerprint is not None:
+      return response if fingerprint_db == fingerprint else None
+    if result_dict["cache_params"] == cache_params:
+      return response
+    return None
+
+  def _build_cache_value(self, func_name: str, response: Any, cache_params: dict,
+                         fingerprint: str = None, ttl: float = None) -> Union[str, bytes]:
+    """
+    Builds the value stored for a response.
+
+    Args:
+      func_name (str): The name of the function.
+      response (Any): The response of the function call.
+      cache_params (dict): The parameters used in the cache key.
+      fingerprint (str, optional): The parameter fingerprint, if already computed.
+      ttl (float, optional): Time-to-live in seconds, stored as the expiry time of the entry.
+
+    Returns:
+      Union[str, bytes]: The value to store in the cache.
+    """
+    if fingerprint is None:
+      _, fingerprint = self.key_generator.generate(func_name, cache_params)
+    value = {"response": response, "params_fingerprint": fingerprint}
+    if self.store_cache_params:
+      value["cache_params"] = cache_params
+    if ttl is not None:
+      value["expires_at"] = time.time() + ttl
+    encoded_value = self.value_codec.encode(value)
+    if isinstance(encoded_value, bytes) and not self.supports_binary_values:
+      return to_text(encoded_value)
+    return encoded_value
+
   def _generate_cache_key(self, func_name: str, cache_params: dict) -> str:
     """
     Generates a unique cache key based on the function name and arguments.
@@ -204,5 +1300,71 @@ class LLMCache(ABC):
     Returns:
         A unique cache key as a string.
     """
-    hash_input: str = json.dumps([func_name, cache_params], sort_keys=True)
-    return hashlib.sha256(hash_input.encode()).hexdigest()
+    return self.key_generator.generate(func_name, cache_params)[0]
+
+
+def _expired(value: dict) -> bool:
+  """
+  Returns whether a decoded entry has an expiry time in the past.
+  """
+  expires_at = value.get("expires_at")
+  return expires_at is not None and expires_at <= time.time()
+
+
+def page_sorted_keys(sorted_keys: List[str], cursor: Optional[str], prefix: str,
+                     limit: int) -> Tuple[List[str], Optional[str]]:
+  """
+  Returns a page of keys for `scan_cache` from a sorted list of keys, for backends
+  that hold their keys in memory. The cursor is the last key of the previous page.
+
+  Returns:
+    List[str]: The keys of the page.
+    Optional[str]: The cursor of the next page, or None if this is the last page.
+  """
+  start = bisect_left(sorted_keys, prefix)
+  if cursor is not None:
+    start = max(start, bisect_right(sorted_keys, cursor))
+  end = start
+  while end < len(sorted_keys) and end - start < limit and sorted_keys[end].startswith(prefix):
+    end += 1
+  more = end < len(sorted_keys) and sorted_keys[end].startswith(prefix)
+  return sorted_keys[start:end], sorted_keys[end - 1] if more else None
+
+
+def prefix_end(prefix: str) -> Optional[str]:
+  """
+  Returns the smallest string greater than every string starting with prefix, or
+  None for an empty prefix, for backends that scan key ranges.
+  """
+  if not prefix:
+    return None
+  return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _paced(chunks: Iterator[bytes], delays_ms: List[int]) -> Iterator[bytes]:
+  """
+  Yields chunks after waiting the delay recorded before each one.
+  """
+  for chunk, delay_ms in zip(chunks, delays_ms):
+    time.sleep(delay_ms / 1000)
+    yield chunk
+
+
+async def _aiterate(stream):
+  """
+  Iterates over an async iterator, or over a regular iterator by advancing it in
+  the event loop's default executor.
+  """
+  import asyncio
+  if hasattr(stream, "__aiter__"):
+    async for chunk in stream:
+      yield chunk
+    return
+  iterator = iter(stream)
+  loop = asyncio.get_event_loop()
+  done = object()
+  while True:
+    chunk = await loop.run_in_executor(None, next, iterator, done)
+    if chunk is done:
+      return
+    yield chunk
@@ -0,0 +1,393 @@
+"""
+This module implements the CacheMetrics class, which records counters and latency
+histograms of LLMCache calls and exports them through pluggable sinks.
+"""
+from bisect import bisect_left
+from typing import Any, AsyncIterator, Callable, Iterator, List, Tuple
+import functools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Names of the labels every metric carries, in the order of the label tuples.
+LABEL_NAMES = ("function", "backend")
+
+# Upper bounds in seconds of the latency histogram buckets.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+HITS = "llm_cache_hits_total"
+MISSES = "llm_cache_misses_total"
+GET_ERRORS = "llm_cache_get_errors_total"
+SET_ERRORS = "llm_cache_set_errors_total"
+FUNCTION_CALLS = "llm_cache_function_calls_total"
+FUNCTION_ERRORS = "llm_cache_function_errors_total"
+SEMANTIC_HITS = "llm_cache_semantic_hits_total"
+EXPIRATIONS = "llm_cache_expirations_total"
+EVICTIONS = "llm_cache_evictions_total"
+KEY_GENERATION = "llm_cache_key_generation_seconds"
+BACKEND_GET = "llm_cache_backend_get_seconds"
+BACKEND_SET = "llm_cache_backend_set_seconds"
+SERIALIZATION = "llm_cache_serialization_seconds"
+DESERIALIZATION = "llm_cache_deserialization_seconds"
+FUNCTION = "llm_cache_function_seconds"
+SEMANTIC_LOOKUP = "llm_cache_semantic_lookup_seconds"
+
+_DESCRIPTIONS = {
+  HITS: "Lookups answered from the cache.",
+  MISSES: "Lookups that had to call the function.",
+  GET_ERRORS: "Failed cache reads.",
+  SET_ERRORS: "Failed cache writes.",
+  FUNCTION_CALLS: "Calls of the cached function, including retries.",
+  FUNCTION_ERRORS: "Failed calls of the cached function, including retries.",
+  SEMANTIC_HITS: "Hits answered by the semantic lookup tier.",
+  EXPIRATIONS: "Expired entries deleted by sweeps.",
+  EVICTIONS: "Entries evicted by sweeps to meet the size budgets.",
+  KEY_GENERATION: "Time to derive cache keys.",
+  BACKEND_GET: "Time of backend reads.",
+  BACKEND_SET: "Time of backend writes.",
+  SERIALIZATION: "Time to encode responses.",
+  DESERIALIZATION: "Time to decode cached values.",
+  FUNCTION: "Time of the cached function.",
+  SEMANTIC_LOOKUP: "Time to embed prompts and search the semantic index.",
+}
+
+
+class MetricsSink:
+  """
+  Receives the measurements of CacheMetrics. Labels are (function, backend) tuples,
+  in the order of LABEL_NAMES.
+  """
+  def increment(self, name: str, labels: Tuple[str, str], value: float):
+    """
+    Adds value to a counter.
+    """
+    raise NotImplementedError
+
+  def observe(self, name: str, labels: Tuple[str, str], value: float):
+    """
+    Records a latency in seconds in a histogram.
+    """
+    raise NotImplementedError
+
+
+class InMemorySink(MetricsSink):
+  """
+  Aggregates counters and histograms in memory. `snapshot` returns them as plain data
+  and `prometheus_text` in the Prometheus text exposition format.
+  """
+  def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+    """
+    Args:
+      buckets (Tuple[float, ...], optional): Increasing upper bounds in seconds of the
+        histogram buckets.
+    """
+    self.buckets = tuple(buckets)
+    self._counters = {}
+    self._histograms = {}
+    self._lock = threading.Lock()
+
+  def increment(self, name: str, labels: Tuple[str, str], value: float):
+    with self._lock:
+      self._counters[name, labels] = self._counters.get((name, labels), 0) + value
+
+  def observe(self, name: str, labels: Tuple[str, str], value: float):
+    index = bisect_left(self.buckets, value)
+    with self._lock:
+      histogram = self._histograms.get((name, labels))
+      if histogram is None:
+        histogram = self._histograms[name, labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+      histogram[0][index] += 1
+      histogram[1] += value
+      histogram[2] += 1
+
+  def snapshot(self) -> dict:
+    """
+    Returns the current values.
+
+    Returns:
+      dict: "counters" maps to a list of {"name", "function", "backend", "value"}
+      dicts, "histograms" to a list of {"name", "function", "backend", "count", "sum",
+      "buckets"} dicts whose buckets map each upper bound to the cumulative count.
+    """
+    with self._lock:
+      counters = list(self._counters.items())
+      histograms = [(key, (list(counts), total, count))
+                    for key, (counts, total, count) in self._histograms.items()]
+    snapshot = {"counters": [], "histograms": []}
+    for (name, labels), value in sorted(counters):
+      snapshot["counters"].append(dict(zip(LABEL_NAMES, labels), name=name, value=value))
+    for (name, labels), (counts, total, count) in sorted(histograms):
+      cumulative = 0
+      buckets = {}
+      for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+        cumulative += bucket_count
+        buckets[bound] = cumulative
+      snapshot["histograms"].append(dict(zip(LABEL_NAMES, labels), name=name, count=count,
+                                         sum=total, buckets=buckets))
+    return snapshot
+
+  def prometheus_text(self) -> str:
+    """
+    Returns the current values in the Prometheus text exposition format.
+    """
+    snapshot = self.snapshot()
+    lines = []
+    described = set()
+
+    def describe(name, metric_type):
+      if name not in described:
+        described.add(name)
+        lines.append(f"# HELP {name} {_DESCRIPTIONS.get(name, name)}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+    for counter in snapshot["counters"]:
+      describe(counter["name"], "counter")
+      lines.append(f"{counter['name']}{{{_label_text(counter)}}} {_number(counter['value'])}")
+    for histogram in snapshot["histograms"]:
+      name = histogram["name"]
+      labels = _label_text(histogram)
+      describe(name, "histogram")
+      for bound, count in histogram["buckets"].items():
+        le = "+Inf" if bound == float("inf") else repr(bound)
+        lines.append(f'{name}_bucket{{{labels},le="{le}"}} {count}')
+      lines.append(f"{name}_sum{{{labels}}} {_number(histogram['sum'])}")
+      lines.append(f"{name}_count{{{labels}}} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+  def reset(self):
+    """
+    Clears all values.
+    """
+    with self._lock:
+      self._counters = {}
+      self._histograms = {}
+
+
+class OpenTelemetrySink(MetricsSink):
+  """
+  Forwards measurements to OpenTelemetry instruments created from a meter, for
+  example `opentelemetry.metrics.get_meter("nb_llm_cache")`. Any object with
+  `create_counter` and `create_histogram` methods returning instruments with `add`
+  and `record` methods can be used.
+  """
+  def __init__(self, meter: Any):
+    """
+    Args:
+      meter (Any): The meter creating the instruments.
+    """
+    self.meter = meter
+    self._instruments = {}
+    self._lock = threading.Lock()
+
+  def _instrument(self, name: str, create: Callable) -> Any:
+    instrument = self._instruments.get(name)
+    if instrument is None:
+      with self._lock:
+        instrument = self._instruments.get(name)
+        if instrument is None:
+          instrument = create(name, unit="s" if name.endswith("_seconds") else "1",
+                              description=_DESCRIPTIONS.get(name, name))
+          self._instruments[name] = instrument
+    return instrument
+
+  def increment(self, name: str, labels: Tuple[str, str], value: float):
+    self._instrument(name, self.meter.create_counter).add(value, dict(zip(LABEL_NAMES, labels)))
+
+  def observe(self, name: str, labels: Tuple[str, str], value: float):
+    self._instrument(name, self.meter.create_histogram).record(value,
+                                                               dict(zip(LABEL_NAMES, labels)))
+
+
+class CacheMetrics:
+  """
+  Records the counters and latency histograms of LLMCache calls, labelled by function
+  name and backend, and passes them to its sinks.
+
+  Pass an instance as the metrics option of a cache. Caches without metrics skip all
+  measurements. Sink failures are logged and never interrupt a call.
+
+  Example:
+    metrics = CacheMetrics()
+    llm_cache = LocalCache(file_path=cache_file_path, metrics=metrics)
+    print(metrics.prometheus_text())
+  """
+  def __init__(self, sinks: List[MetricsSink] = None):
+    """
+    Args:
+      sinks (List[MetricsSink], optional): The sinks receiving the measurements.
+        Defaults to a single InMemorySink.
+    """
+    self.sinks = list(sinks) if sinks is not None else [InMemorySink()]
+
+  def increment(self, name: str, labels: Tuple[str, str], value: float = 1):
+    """
+    Adds value to a counter in every sink.
+    """
+    for sink in self.sinks:
+      try:
+        sink.increment(name, labels, value)
+      except Exception as e:
+        logger.error(f"Error recording metric {name}: {e}")
+
+  def observe(self, name: str, labels: Tuple[str, str], value: float):
+    """
+    Records a latency in seconds in every sink.
+    """
+    for sink in self.sinks:
+      try:
+        sink.observe(name, labels, value)
+      except Exception as e:
+        logger.error(f"Error recording metric {name}: {e}")
+
+  def recorder(self, backend: str) -> "MetricsRecorder":
+    """
+    Returns a recorder labelling the measurements with the given backend name.
+    """
+    return MetricsRecorder(self, backend)
+
+  def _in_memory_sink(self) -> InMemorySink:
+    for sink in self.sinks:
+      if isinstance(sink, InMemorySink):
+        return sink
+    raise ValueError("CacheMetrics has no InMemorySink.")
+
+  def snapshot(self) -> dict:
+    """
+    Returns the values of the first InMemorySink. See `InMemorySink.snapshot`.
+
+    Raises:
+      ValueError: If there is no InMemorySink.
+    """
+    return self._in_memory_sink().snapshot()
+
+  def prometheus_text(self) -> str:
+    """
+    Returns the values of the first InMemorySink in the Prometheus text format.
+
+    Raises:
+      ValueError: If there is no InMemorySink.
+    """
+    return self._in_memory_sink().prometheus_text()
+
+
+class MetricsRecorder:
+  """
+  The measurement interface used by a cache, bound to its backend name.
+  """
+  def __init__(self, metrics: CacheMetrics, backend: str):
+    self.metrics = metrics
+    self.backend = backend
+
+  @staticmethod
+  def now() -> float:
+    """
+    Returns the clock value to pass to `record`.
+    """
+    return time.perf_counter()
+
+  def record(self, name: str, func_name: str, started: float) -> float:
+    """
+    Records the time elapsed since started and returns the current clock value, so
+    that consecutive stages can be timed with one clock reading each.
+    """
+    now = time.perf_counter()
+    self.metrics.observe(name, (func_name or "", self.backend), now - started)
+    return now
+
+  def count(self, name: str, func_name: str, value: float = 1):
+    """
+    Adds value to a counter.
+    """
+    if value:
+      self.metrics.increment(name, (func_name or "", self.backend), value)
+
+  def timed(self, func: Callable, func_name: str) -> Callable:
+    """
+    Wraps the cached function so that each call, including retries, is counted
+    and timed. Coroutine functions are wrapped in a coroutine function.
+    """
+    import inspect
+    if inspect.iscoroutinefunction(func):
+      @functools.wraps(func)
+      async def atimed(**kwargs):
+        started = time.perf_counter()
+        self.count(FUNCTION_CALLS, func_name)
+        try:
+          return await func(**kwargs)
+        except Exception:
+          self.count(FUNCTION_ERRORS, func_name)
+          raise
+        finally:
+          self.record(FUNCTION, func_name, started)
+      return atimed
+
+    @functools.wraps(func)
+    def timed(**kwargs):
+      started = time.perf_counter()
+      self.count(FUNCTION_CALLS, func_name)
+      try:
+        return func(**kwargs)
+      except Exception:
+        self.count(FUNCTION_ERRORS, func_name)
+        raise
+      finally:
+        self.record(FUNCTION, func_name, started)
+    return timed
+
+  def timed_stream(self, func: Callable, func_name: str) -> Callable:
+    """
+    Wraps a streaming function so that each call, including retries, is counted and
+    timed from the call until its stream ends. Async iterators stay async iterators.
+    """
+    @functools.wraps(func)
+    def timed(**kwargs):
+      started = time.perf_counter()
+      self.count(FUNCTION_CALLS, func_name)
+      try:
+        stream = func(**kwargs)
+      except Exception:
+        self.count(FUNCTION_ERRORS, func_name)
+        self.record(FUNCTION, func_name, started)
+        raise
+      if hasattr(stream, "__aiter__"):
+        return self._atime_stream(stream, func_name, started)
+      return self._time_stream(stream, func_name, started)
+    return timed
+
+  def _time_stream(self, stream: Iterator, func_name: str, started: float) -> Iterator:
+    try:
+      yield from stream
+    except Exception:
+      self.count(FUNCTION_ERRORS, func_name)
+      raise
+    finally:
+      self.record(FUNCTION, func_name, started)
+
+  async def _atime_stream(self, stream: AsyncIterator, func_name: str,
+                          started: float) -> AsyncIterator:
+    try:
+      async for chunk in stream:
+        yield chunk
+    except Exception:
+      self.count(FUNCTION_ERRORS, func_name)
+      raise
+    finally:
+      self.record(FUNCTION, func_name, started)
+
+
+def _label_text(sample: dict) -> str:
+  """
+  Formats the labels of a sample for the Prometheus text format.
+  """
+  return ",".join(f'{name}="{_escape(sample[name])}"' for name in LABEL_NAMES)
+
+
+def _escape(value: Any) -> str:
+  return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+  return repr(float(value)) if isinstance(value, float) else str(value)
@@ -0,0 +1,454 @@
+"""
+This module implements the export, import and migration of cache entries between
+backends, as a library API and as a command line tool:
+
+  python -m nb_llm_cache.migration export sqlite:cache.db dump/ --workers 8
+  python -m nb_llm_cache.migration import redis://localhost:6379/0 dump/ --checkpoint import.json
+  python -m nb_llm_cache.migration migrate local:cache.json log:cache.log
+
+A dump is a directory of gzip-compressed JSON-lines chunks, one entry per line, with a
+`manifest.json` listing the chunks. Backends are read page by page with `scan_cache`
+and dumps are read line by line, so memory use does not grow with the cache size.
+"""
+from .db_integrations import create_backend
+from .llm_cache import LLMCache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+import argparse
+import base64
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DUMP_FORMAT = "nb_llm_cache-dump"
+DUMP_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+CHECKPOINT_FILE = "checkpoint.json"
+_HEX_DIGITS = "0123456789abcdef"
+
+
+def open_cache(spec: str) -> LLMCache:
+  """
+  Opens the backend described by a cache specification:
+
+    local:PATH, log:PATH, sqlite:PATH, mmap:PATH
+    redis://HOST:PORT/DB (or rediss://)
+    mongodb://HOST:PORT#DATABASE/COLLECTION (the fragment is optional)
+    firestore:COLLECTION[:SERVICE_ACCOUNT_FILE], with default credentials if no file
+    remote:ADDRESS, a cache server at unix:PATH or HOST:PORT
+
+  Args:
+    spec (str): The cache specification.
+
+  Returns:
+    LLMCache: The opened backend.
+
+  Raises:
+    ValueError: If the specification is not recognized.
+  """
+  if spec.startswith(("redis://", "rediss://", "unix://")):
+    return create_backend("redis", spec)
+  if spec.startswith(("mongodb://", "mongodb+srv://")):
+    uri, _, location = spec.partition("#")
+    if not location:
+      return create_backend("mongo", uri)
+    database_name, _, collection_name = location.partition("/")
+    return create_backend("mongo", uri, database_name, collection_name or "llm_cache")
+  kind, _, path = spec.partition(":")
+  if not path:
+    raise ValueError(f"Invalid cache specification: {spec}.")
+  if kind in ("local", "log", "sqlite", "mmap", "remote"):
+    return create_backend(kind, path)
+  if kind == "firestore":
+    collection_name, _, service_account_file = path.partition(":")
+    return create_backend("firestore", collection_name, service_account_file or None)
+  raise ValueError(f"Invalid cache specification: {spec}.")
+
+
+def entry_filter(func_names: Iterable[str] = None,
+                 max_age: float = None) -> Optional[Callable[[dict], bool]]:
+  """
+  Returns a predicate on entry metadata keeping the entries of the given functions
+  that were created at most max_age seconds ago, or None if nothing is filtered.
+  Entries without a creation time are kept by the age filter.
+  """
+  if func_names is None and max_age is None:
+    return None
+  func_names = set(func_names) if func_names is not None else None
+  min_created_at = time.time() - max_age if max_age is not None else None
+
+  def keep(metadata: dict) -> bool:
+    if func_names is not None and metadata.get("func_name") not in func_names:
+      return False
+    created_at = metadata.get("created_at")
+    return min_created_at is None or created_at is None or created_at >= min_created_at
+  return keep
+
+
+def export_cache(source: LLMCache, dump_dir: str,
+                 workers: int = 1,
+                 partition_digits: int = 0,
+                 chunk_size: int = 10000,
+                 func_names: Iterable[str] = None,
+                 max_age: float = None,
+                 resume: bool = False) -> dict:
+  """
+  Exports the entries of a backend to a dump directory.
+
+  With partition_digits > 0, the key space is split into 16 ** partition_digits
+  partitions by hex key prefix, exported in parallel by the workers; this lists only
+  hex keys, such as the keys produced by `_generate_cache_key`. After each chunk, the
+  scan cursor of its partition is saved to a checkpoint, so an interrupted export can
+  be resumed with resume=True. Each worker holds at most one chunk in memory.
+
+  Args:
+    source (LLMCache): The backend to export. Its `supports_scan` must be True.
+    dump_dir (str): The dump directory, created if it does not exist.
+    workers (int, optional): Number of partitions exported concurrently.
+    partition_digits (int, optional): Number of hex digits of the partition prefixes.
+    chunk_size (int, optional): Number of entries per chunk.
+    func_names (Iterable[str], optional): Only export the entries of these functions.
+      Requires a backend recording metadata.
+    max_age (float, optional): Only export the entries created at most max_age seconds
+      ago. Entries of backends that do not record their creation time are all exported.
+    resume (bool, optional): Whether to resume the export recorded in the checkpoint.
+
+  Returns:
+    dict: The number of exported entries and chunks.
+
+  Raises:
+    ValueError: If the backend cannot be scanned, if func_names is given for a backend
+      without metadata, or if dump_dir holds another dump and resume is False.
+  """
+  if not source.supports_scan:
+    raise ValueError(f"{type(source).__name__} does not support scans.")
+  if func_names is not None and not source.supports_metadata:
+    raise ValueError(f"{type(source).__name__} does not record function names.")
+  os.makedirs(dump_dir, exist_ok=True)
+  checkpoint_path = os.path.join(dump_dir, CHECKPOINT_FILE)
+  prefixes = _partition_prefixes(partition_digits)
+  if resume and os.path.exists(checkpoint_path):
+    checkpoint = _read_json(checkpoint_path)
+    if sorted(checkpoint["partitions"]) != sorted(prefixes):
+      raise ValueError(f"The checkpoint in {dump_dir} uses other partitions.")
+  elif os.path.exists(checkpoint_path) or os.path.exists(os.path.join(dump_dir, MANIFEST_FILE)):
+    raise ValueError(f"{dump_dir} already holds a dump.")
+  else:
+    checkpoint = {"partitions": {prefix: {"cursor": None, "chunks": 0, "entries": 0,
+                                          "done": False}
+                                 for prefix in prefixes}}
+    _write_json(checkpoint_path, checkpoint)
+  keep = entry_filter(func_names, max_age)
+  lock = threading.Lock()
+
+  def export_partition(index: int, prefix: str):
+    state = checkpoint["partitions"][prefix]
+    cursor = state["cursor"]
+    while not state["done"]:
+      lines = []
+      while len(lines) < chunk_size:
+        entries, cursor = source.scan_cache(cursor, prefix, chunk_size)
+        lines.extend(_dump_line(key, value, metadata) for key, value, metadata in entries
+                     if keep is None or keep(metadata))
+        if cursor is None:
+          break
+      if lines:
+        _write_chunk(os.path.join(dump_dir, _chunk_name(index, state["chunks"])), lines)
+      with lock:
+        if lines:
+          state["chunks"] += 1
+        state["entries"] += len(lines)
+        state["cursor"] = cursor
+        state["done"] = cursor is None
+        _write_json(checkpoint_path, checkpoint)
+    logger.info(f"Exported partition '{prefix}': {state['entries']} entries.")
+
+  _run_all(workers, [lambda i=i, p=p: export_partition(i, p) for i, p in enumerate(prefixes)])
+  chunks = [_chunk_name(index, n) for index, prefix in enumerate(prefixes)
+            for n in range(checkpoint["partitions"][prefix]["chunks"])]
+  entries = sum(state["entries"] for state in checkpoint["partitions"].values())
+  _write_json(os.path.join(dump_dir, MANIFEST_FILE),
+              {"format": DUMP_FORMAT, "version": DUMP_VERSION, "source": type(source).__name__,
+               "created_at": time.time(), "entries": entries, "chunks": chunks})
+  os.remove(checkpoint_path)
+  return {"entries": entries, "chunks": len(chunks)}
+
+
+def read_dump(dump_dir: str, chunk: str = None) -> Iterator[tuple]:
+  """
+  Iterates over the (key, value, metadata) entries of a dump, or of one of its chunks.
+
+  Raises:
+    ValueError: If dump_dir does not hold a complete dump.
+  """
+  chunks = [chunk] if chunk is not None else _read_manifest(dump_dir)["chunks"]
+  for name in chunks:
+    with gzip.open(os.path.join(dump_dir, name), "rt", encoding="utf-8") as file:
+      for line in file:
+        yield _load_line(line)
+
+
+def import_cache(target: LLMCache, dump_dir: str,
+                 workers: int = 1,
+                 batch_size: int = 1000,
+                 func_names: Iterable[str] = None,
+                 max_age: float = None,
+                 checkpoint_path: str = None) -> dict:
+  """
+  Imports the entries of a dump into a backend with `add_many_to_cache`, batch_size
+  entries at a time. Backends recording metadata get the function name of each entry;
+  creation times are not carried over.
+
+  Args:
+    target (LLMCache): The backend receiving the entries.
+    dump_dir (str): The dump directory written by `export_cache`.
+    workers (int, optional): Number of chunks imported concurrently.
+    batch_size (int, optional): Number of entries per write.
+    func_names (Iterable[str], optional): Only import the entries of these functions.
+    max_age (float, optional): Only import the entries created at most max_age seconds ago.
+    checkpoint_path (str, optional): Path of a file recording the imported chunks. An
+      import with the same checkpoint skips them, so an interrupted import can be
+      resumed. The file is removed once the import completes.
+
+  Returns:
+    dict: The number of imported entries and chunks, and the number of entries the
+    backend did not accept.
+
+  Raises:
+    ValueError: If dump_dir does not hold a complete dump.
+  """
+  chunks = _read_manifest(dump_dir)["chunks"]
+  done = set()
+  if checkpoint_path is not None and os.path.exists(checkpoint_path):
+    done = set(_read_json(checkpoint_path)["chunks"])
+  keep = entry_filter(func_names, max_age)
+  lock = threading.Lock()
+  totals = {"entries": 0, "chunks": 0, "failed": 0}
+
+  def import_chunk(name: str):
+    written, failed = _write_entries(target, read_dump(dump_dir, name), batch_size, keep)
+    with lock:
+      done.add(name)
+      totals["entries"] += written
+      totals["chunks"] += 1
+      totals["failed"] += failed
+      if checkpoint_path is not None:
+        _write_json(checkpoint_path, {"dump": os.path.abspath(dump_dir), "chunks": sorted(done)})
+
+  _run_all(workers, [lambda name=name: import_chunk(name) for name in chunks
+                     if name not in done])
+  if checkpoint_path is not None and os.path.exists(checkpoint_path):
+    os.remove(checkpoint_path)
+  logger.info(f"Imported {totals['entries']} entries from {totals['chunks']} chunks.")
+  return totals
+
+
+def migrate_cache(source: LLMCache, target: LLMCache,
+                  workers: int = 1,
+                  partition_digits: int = 0,
+                  batch_size: int = 1000,
+                  func_names: Iterable[str] = None,
+                  max_age: float = None) -> dict:
+  """
+  Copies the entries of a backend into another without an intermediate dump. The
+  arguments are those of `export_cache` and `import_cache`.
+
+  Returns:
+    dict: The number of copied entries, and the number of entries the target did
+    not accept.
+
+  Raises:
+    ValueError: If the source cannot be scanned, or if func_names is given for a source
+      without metadata.
+  """
+  if not source.supports_scan:
+    raise ValueError(f"{type(source).__name__} does not support scans.")
+  if func_names is not None and not source.supports_metadata:
+    raise ValueError(f"{type(source).__name__} does not record function names.")
+  keep = entry_filter(func_names, max_age)
+  lock = threading.Lock()
+  totals = {"entries": 0, "failed": 0}
+
+  def migrate_partition(prefix: str):
+    written, failed = _write_entries(target, source.iter_cache(prefix, batch_size),
+                                     batch_size, keep)
+    with lock:
+      totals["entries"] += written
+      totals["failed"] += failed
+    logger.info(f"Migrated partition '{prefix}': {written} entries.")
+
+  _run_all(workers, [lambda p=p: migrate_partition(p)
+                     for p in _partition_prefixes(partition_digits)])
+  return totals
+
+
+def _write_entries(target: LLMCache, entries: Iterable[tuple], batch_size: int,
+                   keep: Optional[Callable[[dict], bool]]) -> tuple:
+  """
+  Writes entries to a backend in batches grouped by function name, and returns the
+  number of written entries and of entries the backend did not accept.
+  """
+  written = failed = 0
+  batches: Dict[Optional[str], dict] = {}
+
+  def write(func_name: Optional[str], items: dict) -> int:
+    if target.supports_metadata:
+      accepted = target.add_many_to_cache(items, func_name=func_name)
+    else:
+      accepted = target.add_many_to_cache(items)
+    return len(items) if accepted else 0
+
+  for key, value, metadata in entries:
+    if keep is not None and not keep(metadata):
+      continue
+    func_name = metadata.get("func_name")
+    batch = batches.setdefault(func_name, {})
+    batch[key] = value
+    if len(batch) >= batch_size:
+      accepted = write(func_name, batches.pop(func_name))
+      written += accepted
+      failed += len(batch) - accepted
+  for func_name, batch in batches.items():
+    accepted = write(func_name, batch)
+    written += accepted
+    failed += len(batch) - accepted
+  return written, failed
+
+
+def _run_all(workers: int, tasks: List[Callable[[], None]]):
+  """
+  Runs tasks on a pool of worker threads, raising the first failure.
+  """
+  if workers <= 1:
+    for task in tasks:
+      task()
+    return
+  with ThreadPoolExecutor(max_workers=workers) as executor:
+    for future in [executor.submit(task) for task in tasks]:
+      future.result()
+
+
+def _partition_prefixes(partition_digits: int) -> List[str]:
+  prefixes = [""]
+  for _ in range(partition_digits):
+    prefixes = [prefix + digit for prefix in prefixes for digit in _HEX_DIGITS]
+  return prefixes
+
+
+def _chunk_name(partition: int, chunk: int) -> str:
+  return f"p{partition:05d}-{chunk:06d}.jsonl.gz"
+
+
+def _dump_line(key: str, value, metadata: dict) -> str:
+  line = {"key": key}
+  if isinstance(value, bytes):
+    line["value_b64"] = base64.b64encode(value).decode("ascii")
+  else:
+    line["value"] = value
+  if metadata.get("func_name") is not None:
+    line["func_name"] = metadata["func_name"]
+  if metadata.get("created_at") is not None:
+    line["created_at"] = metadata["created_at"]
+  return json.dumps(line, ensure_ascii=False)
+
+
+def _load_line(line: str) -> tuple:
+  entry = json.loads(line)
+  value = entry.get("value")
+  if value is None:
+    value = base64.b64decode(entry["value_b64"])
+  metadata = {"func_name": entry.get("func_name"), "created_at": entry.get("created_at")}
+  return entry["key"], value, metadata
+
+
+def _write_chunk(path: str, lines: List[str]):
+  """
+  Writes a chunk under a temporary name and renames it, so a chunk is either
+  complete or absent.
+  """
+  tmp_path = path + ".tmp"
+  with gzip.open(tmp_path, "wt", encoding="utf-8") as file:
+    for line in lines:
+      file.write(line)
+      file.write("\n")
+  os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> dict:
+  with open(path, "r", encoding="utf-8") as file:
+    return json.load(file)
+
+
+def _write_json(path: str, data: dict):
+  tmp_path = path + ".tmp"
+  with open(tmp_path, "w", encoding="utf-8") as file:
+    json.dump(data, file)
+  os.replace(tmp_path, path)
+
+
+def _read_manifest(dump_dir: str) -> dict:
+  path = os.path.join(dump_dir, MANIFEST_FILE)
+  if not os.path.exists(path):
+    raise ValueError(f"{dump_dir} does not hold a complete dump.")
+  manifest = _read_json(path)
+  if manifest.get("format") != DUMP_FORMAT or manifest.get("version") != DUMP_VERSION:
+    raise ValueError(f"{dump_dir} does not hold a supported dump.")
+  return manifest
+
+
+def main(argv: List[str] = None):
+  parser = argparse.ArgumentParser(
+    prog="python -m nb_llm_cache.migration",
+    description="Exports, imports and migrates cache entries between backends.")
+  commands = parser.add_subparsers(dest="command")
+  commands.required = True
+  export_parser = commands.add_parser("export", help="Export a cache to a dump directory.")
+  export_parser.add_argument("source", help="Specification of the source cache.")
+  export_parser.add_argument("dump_dir")
+  export_parser.add_argument("--chunk-size", type=int, default=10000)
+  export_parser.add_argument("--resume", action="store_true",
+                             help="Resume an interrupted export.")
+  import_parser = commands.add_parser("import", help="Import a dump directory into a cache.")
+  import_parser.add_argument("target", help="Specification of the target cache.")
+  import_parser.add_argument("dump_dir")
+  import_parser.add_argument("--batch-size", type=int, default=1000)
+  import_parser.add_argument("--checkpoint", help="Checkpoint file of a resumable import.")
+  migrate_parser = commands.add_parser("migrate", help="Copy a cache into another.")
+  migrate_parser.add_argument("source", help="Specification of the source cache.")
+  migrate_parser.add_argument("target", help="Specification of the target cache.")
+  migrate_parser.add_argument("--batch-size", type=int, default=1000)
+  for command_parser in (export_parser, import_parser, migrate_parser):
+    command_parser.add_argument("--workers", type=int, default=1)
+    command_parser.add_argument("--function", action="append", dest="func_names",
+                                help="Only copy the entries of this function (repeatable).")
+    command_parser.add_argument("--max-age", type=float,
+                                help="Only copy the entries created in the last MAX_AGE seconds.")
+  for command_parser in (export_parser, migrate_parser):
+    command_parser.add_argument("--partition-digits", type=int, default=0,
+                                help="Split hex keys into 16 ** N partitions for the workers.")
+  args = parser.parse_args(argv)
+  logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+  if args.command == "export":
+    result = export_cache(open_cache(args.source), args.dump_dir, workers=args.workers,
+                          partition_digits=args.partition_digits, chunk_size=args.chunk_size,
+                          func_names=args.func_names, max_age=args.max_age, resume=args.resume)
+  elif args.command == "import":
+    result = import_cache(open_cache(args.target), args.dump_dir, workers=args.workers,
+                          batch_size=args.batch_size, func_names=args.func_names,
+                          max_age=args.max_age, checkpoint_path=args.checkpoint)
+  else:
+    result = migrate_cache(open_cache(args.source), open_cache(args.target),
+                           workers=args.workers, partition_digits=args.partition_digits,
+                           batch_size=args.batch_size, func_names=args.func_names,
+                           max_age=args.max_age)
+  print(json.dumps(result))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,429 @@
+"""
+This module implements the SemanticCache class, which finds cached responses of
+near-duplicate prompts with embeddings, and the VectorIndex class it searches.
+"""
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+logger = logging.getLogger(__name__)
+
+_FORMAT_VERSION = 1
+
+
+class VectorIndex:
+  """
+  An approximate nearest-neighbour index of unit vectors under cosine similarity.
+
+  Small indexes are searched exhaustively with one matrix product. Once an index
+  holds ivf_threshold vectors, it is partitioned into inverted lists around k-means
+  centroids and a search only scans the nprobe lists closest to the query. Vectors
+  are stored ordered by list, so every list is a contiguous slice of the matrix.
+  Vectors added after a partitioning are scanned exhaustively until they are
+  merged into the lists.
+
+  Each vector carries a scope, and searches only return vectors of the query's scope.
+  """
+  def __init__(self, dimension: int,
+               ivf_threshold: int = 50000,
+               nprobe: int = 16,
+               kmeans_iterations: int = 10):
+    """
+    Args:
+      dimension (int): Dimension of the vectors.
+      ivf_threshold (int, optional): Number of vectors from which the index is
+        partitioned into inverted lists. None always searches exhaustively.
+      nprobe (int, optional): Number of inverted lists scanned per search.
+      kmeans_iterations (int, optional): Number of k-means iterations of a partitioning.
+
+    Raises:
+      ValueError: If numpy is not installed.
+    """
+    if np is None:
+      raise ValueError("VectorIndex requires the numpy package: pip install numpy")
+    self.dimension = dimension
+    self.ivf_threshold = ivf_threshold
+    self.nprobe = nprobe
+    self.kmeans_iterations = kmeans_iterations
+    self._vectors = np.empty((0, dimension), dtype=np.float32)
+    self._scopes = np.empty(0, dtype=np.uint64)
+    self._keys = []
+    self._rows = None
+    self._size = 0
+    self._centroids = None
+    self._list_offsets = None
+    self._indexed = 0
+    self._trained_size = 0
+    self._lock = threading.RLock()
+
+  def __len__(self):
+    return self._size
+
+  def __contains__(self, key: str) -> bool:
+    with self._lock:
+      return key in self._key_rows()
+
+  def _key_rows(self) -> dict:
+    """
+    Returns the row of every key, built on first use so that loading stays cheap.
+    """
+    if self._rows is None:
+      self._rows = {key: row for row, key in enumerate(self._keys)}
+    return self._rows
+
+  def add(self, key: str, vector: Sequence[float], scope: int = 0) -> bool:
+    """
+    Adds a vector, normalized to unit length.
+
+    Args:
+      key (str): The key the vector stands for.
+      vector (Sequence[float]): The vector.
+      scope (int, optional): The scope of the vector, an unsigned 64-bit integer.
+
+    Returns:
+      bool: False if the key was already indexed.
+    """
+    vector = _normalize(vector)
+    with self._lock:
+      rows = self._key_rows()
+      if key in rows:
+        return False
+      if self._size == len(self._vectors) or not self._vectors.flags.writeable:
+        self._reserve(max(1024, 2 * self._size))
+      self._vectors[self._size] = vector
+      self._scopes[self._size] = scope
+      self._keys.append(key)
+      rows[key] = self._size
+      self._size += 1
+      self._maintain()
+      return True
+
+  def add_many(self, keys: List[str], vectors: Sequence[Sequence[float]],
+               scopes: Sequence[int] = None) -> int:
+    """
+    Adds several vectors at once, which is much faster than adding them one by one.
+
+    Args:
+      keys (List[str]): The keys the vectors stand for.
+      vectors (Sequence[Sequence[float]]): The vectors, one row per key.
+      scopes (Sequence[int], optional): The scope of each vector. Defaults to 0.
+
+    Returns:
+      int: The number of added vectors. Keys that were already indexed are skipped.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(len(keys), self.dimension)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms > 0, norms, 1)
+    scopes = np.zeros(len(keys), dtype=np.uint64) if scopes is None else np.asarray(
+      scopes, dtype=np.uint64)
+    with self._lock:
+      rows = self._key_rows()
+      new = list({key: i for i, key in enumerate(keys) if key not in rows}.values())
+      if not new:
+        return 0
+      if self._size + len(new) > len(self._vectors) or not self._vectors.flags.writeable:
+        self._reserve(max(1024, 2 * (self._size + len(new))))
+      end = self._size + len(new)
+      self._vectors[self._size:end] = vectors[new]
+      self._scopes[self._size:end] = scopes[new]
+      for i in new:
+        rows[keys[i]] = len(self._keys)
+        self._keys.append(keys[i])
+      self._size = end
+      self._maintain()
+      return len(new)
+
+  def _maintain(self):
+    """
+    Partitions the index once it reaches ivf_threshold vectors, recomputes the
+    centroids each time it has grown fourfold, and merges the unpartitioned vectors
+    into the lists once they exceed a tenth of the partitioned ones.
+    """
+    if self.ivf_threshold is None or self._size < self.ivf_threshold:
+      return
+    if self._centroids is None or self._size >= 4 * self._trained_size:
+      self._train()
+    elif self._size - self._indexed >= max(1024, self._indexed // 10):
+      self._partition()
+
+  def _reserve(self, capacity: int):
+    """
+    Moves the vectors into writable arrays with room for capacity vectors.
+    """
+    vectors = np.empty((capacity, self.dimension), dtype=np.float32)
+    vectors[:self._size] = self._vectors[:self._size]
+    scopes = np.empty(capacity, dtype=np.uint64)
+    scopes[:self._size] = self._scopes[:self._size]
+    self._vectors, self._scopes = vectors, scopes
+    if not isinstance(self._keys, list):
+      self._keys = [str(key) for key in self._keys]
+
+  def _train(self):
+    """
+    Computes the centroids with k-means on a sample of the vectors, then partitions.
+    """
+    nlist = max(1, int(self._size ** 0.5))
+    rng = np.random.default_rng(0)
+    sample_size = min(self._size, 64 * nlist)
+    sample = self._vectors[rng.choice(self._size, sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+    for _ in range(self.kmeans_iterations):
+      assignments = np.argmax(sample @ centroids.T, axis=1)
+      sums = np.zeros_like(centroids)
+      np.add.at(sums, assignments, sample)
+      empty = ~sums.any(axis=1)
+      sums[empty] = centroids[empty]
+      centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+    self._centroids = centroids.astype(np.float32)
+    self._trained_size = self._size
+    self._indexed = 0
+    self._list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+    self._partition()
+
+  def _partition(self):
+    """
+    Assigns the vectors added since the last partitioning to their closest centroid
+    and reorders all vectors by list.
+    """
+    size = self._size
+    assignments = np.empty(size, dtype=np.int64)
+    counts = np.diff(self._list_offsets)
+    assignments[:self._indexed] = np.repeat(np.arange(len(counts)), counts)
+    for start in range(self._indexed, size, 65536):
+      end = min(size, start + 65536)
+      assignments[start:end] = np.argmax(self._vectors[start:end] @ self._centroids.T, axis=1)
+    order = np.argsort(assignments, kind="stable")
+    self._vectors[:size] = self._vectors[order]
+    self._scopes[:size] = self._scopes[order]
+    self._keys = [self._keys[row] for row in order]
+    self._rows = None
+    self._list_offsets = np.zeros(len(self._centroids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assignments, minlength=len(self._centroids)),
+              out=self._list_offsets[1:])
+    self._indexed = size
+
+  def search(self, vector: Sequence[float], scope: int = 0,
+             k: int = 1) -> List[Tuple[str, float]]:
+    """
+    Returns the keys of the most similar vectors of a scope.
+
+    Args:
+      vector (Sequence[float]): The query vector.
+      scope (int, optional): The scope of the query.
+      k (int, optional): Maximum number of results.
+
+    Returns:
+      List[Tuple[str, float]]: (key, cosine similarity) pairs, most similar first.
+    """
+    query = _normalize(vector)
+    with self._lock:
+      vectors, scopes, keys = self._vectors, self._scopes, self._keys
+      size, indexed = self._size, self._indexed
+      if self._centroids is None:
+        ranges = [(0, size)]
+      else:
+        nprobe = min(self.nprobe, len(self._centroids))
+        lists = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+        ranges = [(self._list_offsets[i], self._list_offsets[i + 1]) for i in lists]
+        ranges.append((indexed, size))
+      best = []
+      for start, end in ranges:
+        if start == end:
+          continue
+        scores = vectors[start:end] @ query
+        scores[scopes[start:end] != scope] = -np.inf
+        top = np.argpartition(-scores, min(k, end - start) - 1)[:k]
+        best.extend((float(scores[i]), int(start + i)) for i in top if scores[i] > -np.inf)
+      best.sort(reverse=True)
+      return [(str(keys[row]), score) for score, row in best[:k]]
+
+  def save(self, path: str):
+    """
+    Writes the index to the directory at path, replacing it atomically.
+    """
+    with self._lock:
+      directory = f"{path}.tmp-{uuid.uuid4().hex}"
+      os.makedirs(directory)
+      np.save(os.path.join(directory, "vectors.npy"), self._vectors[:self._size])
+      np.save(os.path.join(directory, "scopes.npy"), self._scopes[:self._size])
+      np.save(os.path.join(directory, "keys.npy"), np.array(self._keys[:self._size], dtype=str))
+      if self._centroids is not None:
+        np.save(os.path.join(directory, "centroids.npy"), self._centroids)
+        np.save(os.path.join(directory, "list_offsets.npy"), self._list_offsets)
+      with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as file:
+        json.dump({"version": _FORMAT_VERSION, "dimension": self.dimension,
+                   "size": self._size, "indexed": self._indexed,
+                   "trained_size": self._trained_size}, file)
+    previous = None
+    if os.path.exists(path):
+      previous = f"{path}.old-{uuid.uuid4().hex}"
+      os.replace(path, previous)
+    os.replace(directory, path)
+    if previous is not None:
+      shutil.rmtree(previous, ignore_errors=True)
+
+  @classmethod
+  def load(cls, path: str, **kwargs) -> "VectorIndex":
+    """
+    Opens an index written by `save`. The vectors are memory-mapped, so loading does
+    not read them, and they are copied into memory on the first `add`.
+
+    Args:
+      path (str): The directory of the index.
+      **kwargs: Options passed to the constructor.
+
+    Raises:
+      ValueError: If the directory does not hold an index of a supported version.
+    """
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as file:
+      meta = json.load(file)
+    if meta.get("version") != _FORMAT_VERSION:
+      raise ValueError(f"{path} is not a vector index of version {_FORMAT_VERSION}.")
+    index = cls(meta["dimension"], **kwargs)
+    index._vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+    index._scopes = np.load(os.path.join(path, "scopes.npy"), mmap_mode="r")
+    index._keys = np.load(os.path.join(path, "keys.npy"), mmap_mode="r")
+    index._size = meta["size"]
+    index._indexed = meta["indexed"]
+    index._trained_size = meta["trained_size"]
+    if os.path.exists(os.path.join(path, "centroids.npy")):
+      index._centroids = np.load(os.path.join(path, "centroids.npy"))
+      index._list_offsets = np.load(os.path.join(path, "list_offsets.npy"))
+    return index
+
+
+class SemanticCache:
+  """
+  A semantic lookup tier for `LLMCache.call` and `LLMCache.acall`.
+
+  On an exact miss, the prompt parameter of the call is embedded with the given
+  function and the index is searched for a cached call with the same function and
+  other parameters whose prompt embedding is at least threshold similar. The cached
+  response of that call is then returned. Responses of new calls are indexed under
+  their cache keys.
+
+  Example:
+    semantic_cache = SemanticCache(embed, prompt_field="openai_messages", threshold=0.95,
+                                   index_path="semantic_index")
+    llm_cache = LocalCache(file_path=cache_file_path, semantic_cache=semantic_cache)
+  """
+  def __init__(self, embedding_function: Callable[[str], Sequence[float]],
+               prompt_field: str = "openai_messages",
+               threshold: float = 0.95,
+               index: VectorIndex = None,
+               index_path: str = None,
+               normalize_text: bool = True,
+               **index_kwargs):
+    """
+    Args:
+      embedding_function (Callable[[str], Sequence[float]]): Returns the embedding of a
+        prompt. A coroutine function is awaited by `acall`.
+      prompt_field (str, optional): The call parameter holding the prompt: a string or
+        a list of chat messages.
+      threshold (float, optional): Minimum cosine similarity of a semantic hit.
+      index (VectorIndex, optional): The index to search. Created on the first
+        embedding if not given.
+      index_path (str, optional): Directory the index is loaded from, if it exists,
+        and saved to by `save`.
+      normalize_text (bool, optional): Whether prompts are lowercased and their
+        whitespace collapsed before they are embedded.
+      **index_kwargs: Options passed to VectorIndex when the index is created or loaded.
+    """
+    self.embedding_function = embedding_function
+    self.prompt_field = prompt_field
+    self.threshold = threshold
+    self.index_path = index_path
+    self.normalize_text = normalize_text
+    self.index_kwargs = index_kwargs
+    if index is None and index_path is not None and os.path.exists(index_path):
+      index = VectorIndex.load(index_path, **index_kwargs)
+    self.index = index
+    self._lock = threading.Lock()
+
+  def prompt_text(self, cache_params: dict) -> Optional[str]:
+    """
+    Returns the text to embed for a call, or None if the call has no prompt parameter.
+    """
+    prompt = cache_params.get(self.prompt_field)
+    if prompt is None:
+      return None
+    if isinstance(prompt, str):
+      text = prompt
+    elif isinstance(prompt, list) and all(isinstance(message, dict) for message in prompt):
+      text = "\n".join(f"{message.get('role', '')}: {message.get('content', '')}"
+                       for message in prompt)
+    else:
+      text = json.dumps(prompt, sort_keys=True, default=str)
+    if self.normalize_text:
+      text = " ".join(text.split()).lower()
+    return text
+
+  def query(self, func_name: str, cache_params: dict,
+            key_generator: Any) -> Optional[Tuple[str, int]]:
+    """
+    Returns the text to embed for a call and its scope, derived from the function name
+    and the parameters other than the prompt, which must match exactly for a semantic
+    hit. Returns None if the call has no prompt parameter.
+    """
+    text = self.prompt_text(cache_params)
+    if text is None:
+      return None
+    scope_params = {k: v for k, v in cache_params.items() if k != self.prompt_field}
+    scope_key = key_generator.generate(func_name, scope_params)[0]
+    scope = int.from_bytes(hashlib.blake2b(scope_key.encode("utf-8"), digest_size=8).digest(),
+                           "little")
+    return text, scope
+
+  def search(self, embedding: Sequence[float], scope: int) -> Optional[Tuple[str, float]]:
+    """
+    Returns the key and similarity of the closest indexed call of the scope, if it
+    reaches the threshold.
+    """
+    if self.index is None or not len(self.index):
+      return None
+    results = self.index.search(embedding, scope)
+    if results and results[0][1] >= self.threshold:
+      return results[0]
+    return None
+
+  def add(self, cache_key: str, embedding: Sequence[float], scope: int) -> bool:
+    """
+    Indexes the embedding of a cached call.
+    """
+    if self.index is None:
+      with self._lock:
+        if self.index is None:
+          self.index = VectorIndex(len(embedding), **self.index_kwargs)
+    return self.index.add(cache_key, embedding, scope)
+
+  def save(self, path: str = None):
+    """
+    Saves the index to path, or to index_path.
+
+    Raises:
+      ValueError: If neither path nor index_path is set.
+    """
+    path = path or self.index_path
+    if path is None:
+      raise ValueError("SemanticCache.save requires a path or an index_path.")
+    if self.index is not None:
+      self.index.save(path)
+
+
+def _normalize(vector: Sequence[float]) -> Any:
+  """
+  Returns the vector as a float32 array of unit length.
+  """
+  vector = np.asarray(vector, dtype=np.float32).ravel()
+  norm = np.linalg.norm(vector)
+  return vector / norm if norm > 0 else vector
@@ -0,0 +1,684 @@
+"""
+This module implements the ShardedCache class, which spreads the keys of a cache
+over several LLMCache backends with consistent hashing.
+"""
+from .llm_cache import LLMCache
+from .value_codecs import decode_value
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import hashlib
+import json
+import logging
+import math
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(value: str) -> int:
+  return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+  """
+  Consistent hash ring mapping keys to node names. Each node is placed on the ring
+  at virtual_nodes points per unit of weight, and a key belongs to the node of the
+  first point at or after the hash of the key. Adding or removing a node only moves
+  the keys of the ring segments it gains or loses.
+
+  Rings are immutable: `with_node` and `without_node` return new rings, so readers
+  never need a lock.
+  """
+  def __init__(self, weights: Dict[str, float] = None, virtual_nodes: int = 160):
+    """
+    Args:
+      weights (Dict[str, float], optional): The relative capacity of each node, keyed by name.
+      virtual_nodes (int, optional): Number of ring points per unit of weight.
+    """
+    self.weights = dict(weights or {})
+    self.virtual_nodes = virtual_nodes
+    points = sorted((_hash(f"{name}#{i}"), name)
+                    for name, weight in self.weights.items()
+                    for i in range(max(1, int(round(virtual_nodes * weight)))))
+    self._points = [point for point, _ in points]
+    self._names = [name for _, name in points]
+
+  def with_node(self, name: str, weight: float = 1.0) -> "HashRing":
+    return HashRing(dict(self.weights, **{name: weight}), self.virtual_nodes)
+
+  def without_node(self, name: str) -> "HashRing":
+    return HashRing({n: w for n, w in self.weights.items() if n != name}, self.virtual_nodes)
+
+  def node_for(self, key: str) -> str:
+    """
+    Returns the name of the node owning the key.
+    """
+    index = bisect_right(self._points, _hash(key))
+    return self._names[index % len(self._names)]
+
+  def nodes_for(self, key: str, count: int) -> List[str]:
+    """
+    Returns the owner of the key followed by the next distinct nodes on the ring, up
+    to count nodes in total.
+    """
+    count = min(count, len(self.weights))
+    index = bisect_right(self._points, _hash(key))
+    nodes = []
+    while len(nodes) < count:
+      name = self._names[index % len(self._names)]
+      if name not in nodes:
+        nodes.append(name)
+      index += 1
+    return nodes
+
+
+def _remaining_ttl(value: Union[str, bytes], now: float) -> Optional[int]:
+  """
+  Returns the whole seconds left before an entry expires, rounded up, or None if it
+  does not expire. Moved entries are written with it, so that shards expiring entries
+  natively keep expiring them.
+  """
+  try:
+    expires_at = decode_value(value).get("expires_at")
+  except Exception:
+    return None
+  return math.ceil(expires_at - now) if expires_at is not None else None
+
+
+class ShardedCache(LLMCache):
+  """
+  Spreads the keys of a cache over several backends, so that capacity and write
+  throughput scale with the number of shards instead of being bound by a single
+  file or collection.
+
+  Keys are assigned to shards with consistent hashing on virtual nodes. Batch reads,
+  writes and deletes are grouped by shard and sent to the shards in parallel.
+
+  Keys read more than hot_key_threshold times within hot_key_window seconds are
+  copied to the hot_key_replicas next shards on the ring, and their reads are spread
+  over these copies. Writes to hot keys update every copy.
+
+  `add_shard` and `remove_shard` take effect immediately, while a background thread
+  moves the keys whose shard changed. Consistent hashing limits these to about
+  1 / N of the keys. Until they are moved, reads that miss on the new shard of a key
+  fall back to its previous shard and copy the value over. If moving the keys fails,
+  the previous shard and the fallback reads are kept, and the failed `add_shard` or
+  `remove_shard` call must be retried before the shards can be changed again.
+
+  Example:
+    llm_cache = ShardedCache({f"shard-{i}": FirestoreCache(f"llm_cache_{i}", service_account_file)
+                              for i in range(8)})
+  """
+  def __init__(self, shards: Union[Dict[str, LLMCache], List[LLMCache]],
+               virtual_nodes: int = 160,
+               hot_key_replicas: int = 0,
+               hot_key_threshold: int = 100,
+               hot_key_window: float = 10.0,
+               max_hot_keys: int = 1024,
+               max_workers: int = None,
+               rebalance_batch_size: int = 1000,
+               **kwargs):
+    """
+    Args:
+      shards (Union[Dict[str, LLMCache], List[LLMCache]]): The backends keyed by shard
+        name, or a list of backends named "shard-0", "shard-1", and so on. Names
+        determine the placement of keys, so they must stay the same across restarts.
+      virtual_nodes (int, optional): Number of ring points per shard. More points
+        spread keys more evenly.
+      hot_key_replicas (int, optional): Number of additional shards holding copies of
+        hot keys. 0 disables hot key replication.
+      hot_key_threshold (int, optional): Number of reads within hot_key_window after
+        which a key is replicated.
+      hot_key_window (float, optional): Time in seconds over which reads are counted.
+      max_hot_keys (int, optional): Maximum number of keys replicated at the same time.
+      max_workers (int, optional): Number of threads sending batches to the shards.
+        Defaults to the number of shards.
+      rebalance_batch_size (int, optional): Number of entries moved at a time by rebalancing.
+      **kwargs: Options passed to LLMCache.
+
+    Raises:
+      ValueError: If no shards are given.
+    """
+    if not shards:
+      raise ValueError("ShardedCache requires at least one shard.")
+    if not isinstance(shards, dict):
+      shards = {f"shard-{i}": shard for i, shard in enumerate(shards)}
+    self.shards: Dict[str, LLMCache] = dict(shards)
+    self.ring = HashRing(dict.fromkeys(self.shards, 1.0), virtual_nodes)
+    self.hot_key_replicas = hot_key_replicas
+    self.hot_key_threshold = hot_key_threshold
+    self.hot_key_window = hot_key_window
+    self.max_hot_keys = max_hot_keys
+    self.max_workers = max_workers
+    self.rebalance_batch_size = rebalance_batch_size
+    self._previous_ring: Optional[HashRing] = None
+    self._hot_keys = OrderedDict()
+    self._read_counts: Dict[str, int] = {}
+    self._window_started = time.monotonic()
+    self._executor = None
+    self._lock = threading.Lock()
+    self._rebalance_lock = threading.Lock()
+    self._rebalance_thread = None
+    self._moved_keys = 0
+    self._fallback_hits = 0
+    self._replica_reads = 0
+    self._last_error = None
+    self._failed_rebalance: Optional[Tuple[str, str]] = None
+    super().__init__(**kwargs)
+
+  @property
+  def supports_binary_values(self) -> bool:
+    """
+    Binary values are stored as is only if every shard supports them.
+    """
+    return all(shard.supports_binary_values for shard in self.shards.values())
+
+  @property
+  def supports_append(self) -> bool:
+    return all(shard.supports_append for shard in self.shards.values())
+
+  @property
+  def supports_metadata(self) -> bool:
+    return all(shard.supports_metadata for shard in self.shards.values())
+
+  @property
+  def supports_delete(self) -> bool:
+    return all(shard.supports_delete for shard in self.shards.values())
+
+  @property
+  def supports_scan(self) -> bool:
+    return all(shard.supports_scan for shard in self.shards.values())
+
+  @property
+  def supports_ttl(self) -> bool:
+    return all(shard.supports_ttl for shard in self.shards.values())
+
+  def shard_for(self, key: str) -> str:
+    """
+    Returns the name of the shard owning a key.
+    """
+    return self.ring.node_for(key)
+
+  def get_from_cache(self, key: str) -> str:
+    """
+    Returns the value of a key from its shard, or from a copy if the key is hot.
+
+    Args:
+      key (str): The key for which the value needs to be retrieved.
+
+    Returns:
+      str: The value, or an empty string if the key is missing.
+    """
+    ring = self.ring
+    owner = ring.node_for(key)
+    if self.hot_key_replicas and key in self._hot_keys:
+      replica = random.choice(ring.nodes_for(key, self.hot_key_replicas + 1))
+      if replica != owner:
+        value = self.shards[replica].get_from_cache(key)
+        if value:
+          with self._lock:
+            self._replica_reads += 1
+          return value
+        value = self._get_from_owner(key, owner)
+        if value:
+          self._write_copy(replica, key, value)
+        return value
+    value = self._get_from_owner(key, owner)
+    if value and self.hot_key_replicas and self._count_read(key):
+      self._replicate(key, value)
+    return value
+
+  def _get_from_owner(self, key: str, owner: str) -> str:
+    """
+    Reads a key from its shard, falling back to its previous shard while rebalancing.
+    """
+    value = self.shards[owner].get_from_cache(key)
+    previous_ring = self._previous_ring
+    if not value and previous_ring is not None:
+      previous_owner = previous_ring.node_for(key)
+      if previous_owner != owner and previous_owner in self.shards:
+        value = self.shards[previous_owner].get_from_cache(key)
+        if value:
+          with self._lock:
+            self._fallback_hits += 1
+          self._write_copy(owner, key, value)
+    return value
+
+  def add_to_cache(self, key: str, value: Union[str, bytes], **options: Any) -> bool:
+    """
+    Writes a key-value pair to its shard, and to the copies of the key if it is hot.
+
+    Args:
+      key (str): The key under which the value should be stored.
+      value (Union[str, bytes]): The value to store.
+      **options: The func_name and ttl write options, passed to the shard.
+
+    Returns:
+      bool: True if the shard accepted the value.
+    """
+    nodes = self._write_nodes(key)
+    result = self.shards[nodes[0]].add_to_cache(key, value, **options)
+    for replica in nodes[1:]:
+      self._write_copy(replica, key, value, **options)
+    return result
+
+  def get_many_from_cache(self, keys: List[str]) -> List[str]:
+    """
+    Resolves several keys with one batch read per shard, sent to the shards in parallel.
+
+    Args:
+      keys (List[str]): The keys for which the values need to be retrieved.
+
+    Returns:
+      List[str]: The value of each key, in the order of keys. Missing keys map to an
+      empty string.
+    """
+    ring = self.ring
+    found = self._get_grouped(ring, list(dict.fromkeys(keys)))
+    previous_ring = self._previous_ring
+    if previous_ring is not None:
+      missing = [key for key in keys if not found.get(key)
+                 and previous_ring.node_for(key) != ring.node_for(key)
+                 and previous_ring.node_for(key) in self.shards]
+      if missing:
+        recovered = {key: value
+                     for key, value in self._get_grouped(previous_ring, missing).items() if value}
+        if recovered:
+          with self._lock:
+            self._fallback_hits += len(recovered)
+          self._fan_out(self._group(ring, recovered),
+                        lambda name, items: self._write_copies(name, items))
+          found.update(recovered)
+    return [found.get(key, "") for key in keys]
+
+  def _get_grouped(self, ring: HashRing, keys: List[str]) -> Dict[str, str]:
+    """
+    Reads keys with one batch read per shard of the ring, sent to the shards in parallel.
+    """
+    groups = self._group(ring, keys)
+    results = self._fan_out(groups, lambda name, shard_keys:
+                            self.shards[name].get_many_from_cache(shard_keys))
+    found = {}
+    for name, shard_keys in groups.items():
+      found.update(zip(shard_keys, results[name]))
+    return found
+
+  def add_many_to_cache(self, items: Dict[str, Union[str, bytes]], **options: Any) -> bool:
+    """
+    Writes several key-value pairs with one batch write per shard, sent to the shards
+    in parallel. Hot keys are also written to their copies.
+
+    Args:
+      items (Dict[str, Union[str, bytes]]): The values to store, keyed by cache key.
+      **options: The func_name and ttl write options, passed to the shards.
+
+    Returns:
+      bool: True if every shard accepted its values.
+    """
+    groups = self._group(self.ring, items)
+    grouped_items = {name: {key: items[key] for key in keys} for name, keys in groups.items()}
+    results = self._fan_out(grouped_items,
+                            lambda name, shard_items: self.shards[name].add_many_to_cache(
+                              shard_items, **options))
+    if self._hot_keys:
+      for key in items:
+        if key in self._hot_keys:
+          for replica in self._write_nodes(key)[1:]:
+            self._write_copy(replica, key, items[key], **options)
+    return all(results.values())
+
+  def append_to_cache(self, key: str, data: bytes) -> bool:
+    """
+    Appends data to the bytes stored under the key on its shard.
+    """
+    return self.shards[self.ring.node_for(key)].append_to_cache(key, data)
+
+  def get_appended_from_cache(self, key: str) -> bytes:
+    """
+    Returns the bytes appended under the key on its shard.
+    """
+    return self.shards[self.ring.node_for(key)].get_appended_from_cache(key)
+
+  def delete_from_cache(self, key: str) -> bool:
+    """
+    Removes a key from its shard and from every copy.
+
+    Args:
+      key (str): The key to remove.
+
+    Returns:
+      bool: True if the shard of the key held it.
+    """
+    return self.delete_many_from_cache([key]) > 0
+
+  def delete_many_from_cache(self, keys: List[str]) -> int:
+    """
+    Removes several keys from their shards, their hot key copies and, while
+    rebalancing, their previous shards.
+
+    Args:
+      keys (List[str]): The keys to remove.
+
+    Returns:
+      int: The number of keys removed from their shards.
+    """
+    ring = self.ring
+    previous_ring = self._previous_ring
+    owned = self._group(ring, keys)
+    copies: Dict[str, List[str]] = {}
+    for key in keys:
+      nodes = ring.nodes_for(key, self.hot_key_replicas + 1)
+      names = set(nodes[1:])
+      if previous_ring is not None:
+        names.add(previous_ring.node_for(key))
+      names.discard(nodes[0])
+      for name in names:
+        if name in self.shards:
+          copies.setdefault(name, []).append(key)
+    with self._lock:
+      for key in keys:
+        self._hot_keys.pop(key, None)
+    results = self._fan_out(owned, lambda name, shard_keys:
+                            self.shards[name].delete_many_from_cache(shard_keys))
+    self._fan_out(copies, lambda name, shard_keys:
+                  self.shards[name].delete_many_from_cache(shard_keys))
+    return sum(results.values())
+
+  def scan_cache(self, cursor: str = None, prefix: str = "",
+                 limit: int = 1000) -> Tuple[List[tuple], Optional[str]]:
+    """
+    Returns a page of the entries whose key starts with prefix, listing the shards one
+    after the other in name order. Hot key copies are skipped, so each entry is listed
+    once.
+
+    Args:
+      cursor (str, optional): The cursor returned with the previous page, or None for
+        the first page.
+      prefix (str, optional): The prefix of the listed keys.
+      limit (int, optional): Maximum number of entries of the page.
+
+    Returns:
+      List[tuple]: The (key, value, metadata) entries of the page.
+      Optional[str]: The cursor of the next page, or None if this is the last page.
+    """
+    names = sorted(self.shards)
+    index, shard_cursor = 0, None
+    if cursor is not None:
+      name, shard_cursor = json.loads(cursor)
+      index = bisect_right(names, name) - 1
+      if index < 0 or names[index] != name:
+        # The shard of the cursor was removed; the scan continues with the next shard.
+        index, shard_cursor = index + 1, None
+    ring = self.ring
+    entries = []
+    while index < len(names) and len(entries) < limit:
+      name = names[index]
+      page, shard_cursor = self.shards[name].scan_cache(shard_cursor, prefix, limit - len(entries))
+      for key, value, metadata in page:
+        nodes = ring.nodes_for(key, self.hot_key_replicas + 1)
+        if nodes[0] == name or name not in nodes:
+          entries.append((key, value, metadata))
+      if shard_cursor is None:
+        index += 1
+    if index >= len(names):
+      return entries, None
+    return entries, json.dumps([names[index], shard_cursor])
+
+  def add_shard(self, name: str, shard: LLMCache, weight: float = 1.0):
+    """
+    Adds a shard to the ring and moves the keys it now owns from the other shards in
+    the background. Waits for a previous rebalance to finish first. Calling it again
+    after the keys failed to move resumes moving them.
+
+    Args:
+      name (str): The name of the shard.
+      shard (LLMCache): The backend.
+      weight (float, optional): The relative capacity of the shard.
+
+    Raises:
+      ValueError: If a shard with the same name exists, or if another failed
+        rebalance must be retried first.
+    """
+    with self._rebalance_lock:
+      self.wait_for_rebalance()
+      if self._failed_rebalance != ("add", name):
+        self._check_rebalanced()
+        if name in self.shards:
+          raise ValueError(f"Shard {name} already exists.")
+      sources = [source for source in self.shards if source != name]
+      self.shards[name] = shard
+      self._start_rebalance(self.ring.with_node(name, weight), sources, remove=None,
+                            operation=("add", name))
+
+  def remove_shard(self, name: str):
+    """
+    Removes a shard from the ring and moves its keys to the remaining shards in the
+    background. The shard keeps answering fallback reads until all its keys are
+    moved, and is only dropped then. Waits for a previous rebalance to finish first.
+    Calling it again after the keys failed to move resumes moving them.
+
+    Args:
+      name (str): The name of the shard.
+
+    Raises:
+      ValueError: If the shard does not exist or is the last one, or if another
+        failed rebalance must be retried first.
+    """
+    with self._rebalance_lock:
+      self.wait_for_rebalance()
+      if self._failed_rebalance != ("remove", name):
+        self._check_rebalanced()
+        if name not in self.shards:
+          raise ValueError(f"Unknown shard: {name}.")
+        if len(self.shards) == 1:
+          raise ValueError("Cannot remove the last shard.")
+      self._start_rebalance(self.ring.without_node(name), [name], remove=name,
+                            operation=("remove", name))
+
+  def wait_for_rebalance(self, timeout: float = None) -> bool:
+    """
+    Blocks until the running rebalance, if any, has finished.
+
+    Returns:
+      bool: True if no rebalance is running anymore.
+    """
+    thread = self._rebalance_thread
+    if thread is not None:
+      thread.join(timeout)
+      return not thread.is_alive()
+    return True
+
+  def _check_rebalanced(self):
+    """
+    Raises:
+      ValueError: If a failed rebalance must be retried first.
+    """
+    if self._failed_rebalance is not None:
+      operation, name = self._failed_rebalance
+      raise ValueError(f"Moving the keys of shard {name} failed: retry "
+                       f"{operation}_shard({name!r}) first.")
+
+  def _start_rebalance(self, ring: HashRing, sources: List[str], remove: Optional[str],
+                       operation: Tuple[str, str]):
+    # A retry keeps the ring from before the failed rebalance, where the keys that
+    # were not moved still are.
+    if self._failed_rebalance is None:
+      self._previous_ring = self.ring
+    self._failed_rebalance = None
+    self.ring = ring
+    with self._lock:
+      self._hot_keys.clear()
+    self._rebalance_thread = threading.Thread(target=self._rebalance,
+                                              args=(sources, remove, operation),
+                                              name="ShardedCacheRebalance", daemon=True)
+    self._rebalance_thread.start()
+
+  def _rebalance(self, sources: List[str], remove: Optional[str], operation: Tuple[str, str]):
+    """
+    Copies the entries of the source shards that belong to another shard to it,
+    unless it already holds them, and deletes them from the sources. The removed
+    shard is dropped and fallback reads stop only once every entry was moved.
+    """
+    started = time.perf_counter()
+    moved = 0
+    try:
+      for name in sources:
+        source = self.shards[name]
+        batch = []
+        for entry in source.iter_cache(batch_size=self.rebalance_batch_size):
+          if self.ring.node_for(entry[0]) != name:
+            batch.append(entry)
+          if len(batch) >= self.rebalance_batch_size:
+            moved += self._move(name, batch, delete=remove is None)
+            batch = []
+        moved += self._move(name, batch, delete=remove is None)
+      logger.info(f"Rebalanced shards: moved {moved} entries in "
+                  f"{time.perf_counter() - started:.1f} seconds.")
+    except Exception as e:
+      self._last_error = repr(e)
+      self._failed_rebalance = operation
+      logger.error(f"Error rebalancing shards, {operation[0]}_shard({operation[1]!r}) must be "
+                   f"retried: {e}")
+      return
+    if remove is not None:
+      self.shards.pop(remove, None)
+    self._previous_ring = None
+
+  def _move(self, source: str, entries: List[tuple], delete: bool) -> int:
+    """
+    Moves a batch of entries from a source shard to their shards, with their remaining
+    time-to-live. Expired entries are not copied.
+    """
+    if not entries:
+      return 0
+    ring = self.ring
+    groups: Dict[str, List[tuple]] = {}
+    for entry in entries:
+      groups.setdefault(ring.node_for(entry[0]), []).append(entry)
+
+    def move(name: str, shard_entries: List[tuple]) -> int:
+      shard = self.shards[name]
+      keys = [key for key, _, _ in shard_entries]
+      present = shard.get_many_from_cache(keys)
+      now = time.time()
+      by_options: Dict[Tuple[Optional[str], Optional[int]], Dict[str, Any]] = {}
+      for (key, value, metadata), current in zip(shard_entries, present):
+        if current:
+          continue
+        ttl = _remaining_ttl(value, now)
+        if ttl is not None and ttl <= 0:
+          continue
+        by_options.setdefault((metadata.get("func_name"), ttl), {})[key] = value
+      for (func_name, ttl), items in by_options.items():
+        shard.add_many_to_cache(items, **shard._write_options(func_name, ttl))
+      return len(keys)
+
+    moved = sum(self._fan_out(groups, move).values())
+    if delete:
+      self.shards[source].delete_many_from_cache([key for key, _, _ in entries])
+    with self._lock:
+      self._moved_keys += moved
+    return moved
+
+  def _count_read(self, key: str) -> bool:
+    """
+    Counts a read of a key and returns whether it just became hot.
+    """
+    now = time.monotonic()
+    with self._lock:
+      if now - self._window_started > self.hot_key_window:
+        self._read_counts = {}
+        self._window_started = now
+      count = self._read_counts.get(key, 0) + 1
+      self._read_counts[key] = count
+      return count == self.hot_key_threshold
+
+  def _replicate(self, key: str, value: Union[str, bytes]):
+    """
+    Marks a key as hot and copies its value to the next shards on the ring.
+    """
+    with self._lock:
+      self._hot_keys[key] = True
+      self._hot_keys.move_to_end(key)
+      while len(self._hot_keys) > self.max_hot_keys:
+        self._hot_keys.popitem(last=False)
+    for replica in self.ring.nodes_for(key, self.hot_key_replicas + 1)[1:]:
+      self._write_copy(replica, key, value)
+
+  def _write_nodes(self, key: str) -> List[str]:
+    """
+    Returns the shards a write of the key goes to: its shard, and its copies if it is hot.
+    """
+    if self.hot_key_replicas and key in self._hot_keys:
+      return self.ring.nodes_for(key, self.hot_key_replicas + 1)
+    return [self.ring.node_for(key)]
+
+  def _write_copy(self, name: str, key: str, value: Union[str, bytes], **options: Any):
+    """
+    Writes a copy of a value to a shard, logging failures instead of raising them.
+    """
+    self._write_copies(name, {key: value}, **options)
+
+  def _write_copies(self, name: str, items: Dict[str, Union[str, bytes]], **options: Any):
+    try:
+      self.shards[name].add_many_to_cache(items, **options)
+    except Exception as e:
+      logger.error(f"Error writing copies to shard {name}: {e}")
+
+  @staticmethod
+  def _group(ring: HashRing, keys) -> Dict[str, List[str]]:
+    groups: Dict[str, List[str]] = {}
+    for key in keys:
+      groups.setdefault(ring.node_for(key), []).append(key)
+    return groups
+
+  def _fan_out(self, groups: Dict[str, Any], operation: Callable[[str, Any], Any]) -> Dict[str, Any]:
+    """
+    Runs an operation on every shard of groups, in parallel if there are several.
+
+    Returns:
+      Dict[str, Any]: The result of each shard, keyed by shard name.
+    """
+    if len(groups) <= 1:
+      return {name: operation(name, group) for name, group in groups.items()}
+    if self._executor is None:
+      with self._lock:
+        if self._executor is None:
+          self._executor = ThreadPoolExecutor(max_workers=self.max_workers or len(self.shards),
+                                              thread_name_prefix="ShardedCache")
+    futures = {name: self._executor.submit(operation, name, group) for name, group in groups.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+  def stats(self) -> dict:
+    """
+    Returns the sharding counters.
+
+    Returns:
+      dict: The shard names, the number of hot keys, the reads served by hot key
+      copies and by previous shards while rebalancing, the number of moved keys,
+      whether a rebalance is running, the last rebalancing error, and the
+      add_shard or remove_shard call to retry after a failed rebalance, if any.
+    """
+    thread = self._rebalance_thread
+    return {"shards": sorted(self.shards),
+            "hot_keys": len(self._hot_keys),
+            "replica_reads": self._replica_reads,
+            "fallback_hits": self._fallback_hits,
+            "moved_keys": self._moved_keys,
+            "rebalancing": thread is not None and thread.is_alive(),
+            "last_error": self._last_error,
+            "failed_rebalance": (f"{self._failed_rebalance[0]}_shard({self._failed_rebalance[1]!r})"
+                                 if self._failed_rebalance is not None else None)}
+
+  def close(self):
+    """
+    Waits for a running rebalance and stops the fan-out threads.
+    """
+    self.wait_for_rebalance()
+    if self._executor is not None:
+      self._executor.shutdown()
+      self._executor = None
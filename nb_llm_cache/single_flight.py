@@ -0,0 +1,319 @@
+"""
+This module implements request coalescing: concurrent calls for the same key share
+the execution of a single leader call.
+"""
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator
+import threading
+import time
+
+
+class _Flight:
+  """
+  Holds the state of one in-flight call shared between its leader and followers.
+  """
+  def __init__(self):
+    self.condition = threading.Condition()
+    self.chunks = []
+    self.done = False
+    self.result = None
+    self.error = None
+
+  def publish(self, chunk: Any):
+    with self.condition:
+      self.chunks.append(chunk)
+      self.condition.notify_all()
+
+  def finish(self, result: Any = None, error: BaseException = None):
+    with self.condition:
+      self.result = result
+      self.error = error
+      self.done = True
+      self.condition.notify_all()
+
+  def _wait_for(self, predicate: Callable[[], bool], timeout: float):
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while not predicate():
+      remaining = None if deadline is None else deadline - time.monotonic()
+      if remaining is not None and remaining <= 0:
+        raise SingleFlightTimeout(f"Timed out after {timeout} seconds waiting for the leader call.")
+      self.condition.wait(remaining)
+
+  def wait(self, timeout: float) -> Any:
+    with self.condition:
+      self._wait_for(lambda: self.done, timeout)
+      if self.error is not None:
+        raise self.error
+      return self.result
+
+  def replay(self, timeout: float) -> Iterator[Any]:
+    position = 0
+    while True:
+      with self.condition:
+        self._wait_for(lambda: self.done or position < len(self.chunks), timeout)
+        chunks = self.chunks[position:]
+        done = self.done
+        error = self.error
+      for chunk in chunks:
+        yield chunk
+      position += len(chunks)
+      if done and position == len(self.chunks):
+        if error is not None:
+          raise error
+        return
+
+
+class SingleFlight:
+  """
+  Deduplicates concurrent calls that share a key.
+
+  The first caller for a key becomes the leader and runs the function; callers
+  arriving while it runs wait for and share its result, or its exception. For
+  streaming calls, followers replay the leader's chunks as they are produced.
+  """
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._flights = {}
+
+  def _join(self, key: str):
+    """
+    Returns the flight for key and whether the caller is its leader.
+    """
+    with self._lock:
+      flight = self._flights.get(key)
+      if flight is None:
+        flight = _Flight()
+        self._flights[key] = flight
+        return flight, True
+      return flight, False
+
+  def _leave(self, key: str):
+    with self._lock:
+      self._flights.pop(key, None)
+
+  def do(self, key: str, func: Callable[[], Any], timeout: float = None) -> Any:
+    """
+    Runs func unless a call with the same key is already in flight, in which case
+    the result of that call is returned.
+
+    Args:
+      key (str): The key identifying the call.
+      func (Callable[[], Any]): The function run by the leader.
+      timeout (float, optional): Maximum time in seconds a follower waits for the leader.
+
+    Returns:
+      Any: The result of the leader call.
+
+    Raises:
+      SingleFlightTimeout: If a follower waits longer than timeout.
+      Exception: Propagates the exception raised by the leader call.
+    """
+    flight, leader = self._join(key)
+    if not leader:
+      return flight.wait(timeout)
+    try:
+      result = func()
+    except BaseException as e:
+      self._leave(key)
+      flight.finish(error=e)
+      raise
+    self._leave(key)
+    flight.finish(result=result)
+    return result
+
+  def do_stream(self, key: str, func: Callable[[], Iterator[Any]],
+                timeout: float = None) -> Iterator[Any]:
+    """
+    Streams the chunks of func unless a streaming call with the same key is already
+    in flight, in which case its chunks are replayed as they arrive.
+
+    Args:
+      key (str): The key identifying the call.
+      func (Callable[[], Iterator[Any]]): The generator function run by the leader.
+      timeout (float, optional): Maximum time in seconds a follower waits for the next chunk.
+
+    Yields:
+      Any: The chunks produced by the leader call.
+
+    Raises:
+      SingleFlightTimeout: If a follower waits longer than timeout for a chunk.
+      Exception: Propagates the exception raised by the leader call.
+    """
+    flight, leader = self._join(key)
+    if not leader:
+      yield from flight.replay(timeout)
+      return
+    try:
+      for chunk in func():
+        flight.publish(chunk)
+        yield chunk
+    except GeneratorExit:
+      self._leave(key)
+      flight.finish(error=SingleFlightAbandoned("The leader stopped consuming the stream."))
+      raise
+    except BaseException as e:
+      self._leave(key)
+      flight.finish(error=e)
+      raise
+    self._leave(key)
+    flight.finish()
+
+  def in_flight(self) -> int:
+    """
+    Returns the number of keys currently in flight.
+    """
+    with self._lock:
+      return len(self._flights)
+
+
+class _AsyncFlight:
+  """
+  Holds the state of one in-flight coroutine shared between its leader and followers.
+  """
+  def __init__(self):
+    import asyncio
+    self.condition = asyncio.Condition()
+    self.chunks = []
+    self.done = False
+    self.result = None
+    self.error = None
+
+  async def publish(self, chunk: Any):
+    async with self.condition:
+      self.chunks.append(chunk)
+      self.condition.notify_all()
+
+  async def finish(self, result: Any = None, error: BaseException = None):
+    async with self.condition:
+      self.result = result
+      self.error = error
+      self.done = True
+      self.condition.notify_all()
+
+  async def _wait_for(self, predicate: Callable[[], bool], timeout: float):
+    import asyncio
+    try:
+      await asyncio.wait_for(self.condition.wait_for(predicate), timeout)
+    except asyncio.TimeoutError:
+      raise SingleFlightTimeout(
+        f"Timed out after {timeout} seconds waiting for the leader call.") from None
+
+  async def wait(self, timeout: float) -> Any:
+    async with self.condition:
+      await self._wait_for(lambda: self.done, timeout)
+      if self.error is not None:
+        raise self.error
+      return self.result
+
+  async def replay(self, timeout: float) -> AsyncIterator[Any]:
+    position = 0
+    while True:
+      async with self.condition:
+        await self._wait_for(lambda: self.done or position < len(self.chunks), timeout)
+        chunks = self.chunks[position:]
+        done = self.done
+        error = self.error
+      for chunk in chunks:
+        yield chunk
+      position += len(chunks)
+      if done and position == len(self.chunks):
+        if error is not None:
+          raise error
+        return
+
+
+class AsyncSingleFlight:
+  """
+  Deduplicates concurrent coroutine calls that share a key within an event loop.
+
+  Behaves like SingleFlight, with the leader and followers being coroutines.
+  """
+  def __init__(self):
+    self._flights = {}
+
+  def _join(self, key: str):
+    flight = self._flights.get(key)
+    if flight is None:
+      flight = _AsyncFlight()
+      self._flights[key] = flight
+      return flight, True
+    return flight, False
+
+  async def do(self, key: str, func: Callable[[], Awaitable[Any]], timeout: float = None) -> Any:
+    """
+    Awaits func unless a call with the same key is already in flight, in which case
+    the result of that call is returned.
+
+    Args:
+      key (str): The key identifying the call.
+      func (Callable[[], Awaitable[Any]]): The coroutine function run by the leader.
+      timeout (float, optional): Maximum time in seconds a follower waits for the leader.
+
+    Returns:
+      Any: The result of the leader call.
+
+    Raises:
+      SingleFlightTimeout: If a follower waits longer than timeout.
+      Exception: Propagates the exception raised by the leader call.
+    """
+    flight, leader = self._join(key)
+    if not leader:
+      return await flight.wait(timeout)
+    try:
+      result = await func()
+    except BaseException as e:
+      self._flights.pop(key, None)
+      await flight.finish(error=e)
+      raise
+    self._flights.pop(key, None)
+    await flight.finish(result=result)
+    return result
+
+  async def do_stream(self, key: str, func: Callable[[], AsyncIterator[Any]],
+                      timeout: float = None) -> AsyncIterator[Any]:
+    """
+    Streams the chunks of func unless a streaming call with the same key is already
+    in flight, in which case its chunks are replayed as they arrive.
+
+    Args:
+      key (str): The key identifying the call.
+      func (Callable[[], AsyncIterator[Any]]): The async generator function run by the leader.
+      timeout (float, optional): Maximum time in seconds a follower waits for the next chunk.
+
+    Yields:
+      Any: The chunks produced by the leader call.
+
+    Raises:
+      SingleFlightTimeout: If a follower waits longer than timeout for a chunk.
+      Exception: Propagates the exception raised by the leader call.
+    """
+    flight, leader = self._join(key)
+    if not leader:
+      async for chunk in flight.replay(timeout):
+        yield chunk
+      return
+    try:
+      async for chunk in func():
+        await flight.publish(chunk)
+        yield chunk
+    except GeneratorExit:
+      self._flights.pop(key, None)
+      await flight.finish(error=SingleFlightAbandoned("The leader stopped consuming the stream."))
+      raise
+    except BaseException as e:
+      self._flights.pop(key, None)
+      await flight.finish(error=e)
+      raise
+    self._flights.pop(key, None)
+    await flight.finish()
+
+
+class SingleFlightTimeout(TimeoutError):
+  """
+  Raised when a follower waits longer than its timeout for the leader call.
+  """
+
+
+class SingleFlightAbandoned(Exception):
+  """
+  Raised to followers when the leader of a streaming call stops consuming it.
+  """
@@ -0,0 +1,208 @@
+"""
+This module implements the recording and replay of cached streams.
+
+A finished stream is stored as a single joined buffer with packed arrays of the
+chunk lengths and of the delays in milliseconds before each chunk, instead of a
+list of chunk strings.
+
+Long streams on backends that support appends are written incrementally: their
+buffer is appended to a separate data key while the stream runs, and the cache
+entry committed at the end only references it.
+"""
+from typing import Any, Iterator, List, Optional, Tuple
+import array
+import base64
+import itertools
+import logging
+import re
+import sys
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Data keys are the cache key of their stream followed by ":stream:" and a random hex UUID.
+_DATA_KEY_PATTERN = re.compile(r":stream:[0-9a-f]{32}$")
+
+_MAX_DELAY_MS = 2 ** 32 - 1
+
+
+def _pack(values: List[int]) -> bytes:
+  """
+  Packs non-negative integers into a little-endian array of the smallest item size
+  that fits them, prefixed by its typecode.
+  """
+  maximum = max(values, default=0)
+  typecode = "B" if maximum < 2 ** 8 else "H" if maximum < 2 ** 16 else "I"
+  packed = array.array(typecode, values)
+  if sys.byteorder != "little":
+    packed.byteswap()
+  return typecode.encode("ascii") + packed.tobytes()
+
+
+def _unpack(data: bytes) -> List[int]:
+  """
+  Reverses `_pack`.
+  """
+  packed = array.array(data[:1].decode("ascii"))
+  packed.frombytes(data[1:])
+  if sys.byteorder != "little":
+    packed.byteswap()
+  return packed.tolist()
+
+
+def _as_bytes(value: Any) -> Any:
+  """
+  Returns bytes stored in an entry, which JSON entries hold as base64.
+  """
+  if isinstance(value, dict):
+    return base64.b64decode(value["__bytes__"])
+  return value
+
+
+class StreamRecorder:
+  """
+  Collects the chunks of a streamed response and builds its cached representation.
+  """
+  def __init__(self, cache: Any, cache_key: str, flush_bytes: int = None):
+    """
+    Args:
+      cache (LLMCache): The backend the stream is cached in.
+      cache_key (str): The cache key of the stream.
+      flush_bytes (int, optional): Number of buffered bytes after which the buffer is
+        appended to the backend, if the backend supports appends. None disables
+        incremental persistence.
+    """
+    self._cache = cache if flush_bytes and cache.supports_append else None
+    self._flush_bytes = flush_bytes
+    self.data_key = f"{cache_key}:stream:{uuid.uuid4().hex}"
+    self._chunks = []
+    self._pending = 0
+    self._last_chunk_at = time.monotonic()
+    self.lengths = []
+    self.delays_ms = []
+    self.journaled = False
+    self.failed = False
+
+  def add(self, chunk: bytes) -> bool:
+    """
+    Records a chunk.
+
+    Returns:
+      bool: Whether enough bytes are buffered for `flush` to be called.
+    """
+    now = time.monotonic()
+    self.delays_ms.append(min(_MAX_DELAY_MS, int((now - self._last_chunk_at) * 1000)))
+    self._last_chunk_at = now
+    self.lengths.append(len(chunk))
+    if self.failed:
+      return False
+    self._chunks.append(chunk)
+    self._pending += len(chunk)
+    return self._cache is not None and self._pending >= self._flush_bytes
+
+  def flush(self):
+    """
+    Appends the buffered chunks to the data key. A failed append abandons the
+    caching of the stream without interrupting it.
+    """
+    if self.failed or not self._chunks:
+      return
+    try:
+      self._cache.append_to_cache(self.data_key, b"".join(self._chunks))
+      self.journaled = True
+    except Exception as e:
+      logger.error(f"Error appending stream data to cache: {e}")
+      self.failed = True
+      self.abort()
+    self._chunks = []
+    self._pending = 0
+
+  def finish(self) -> Optional[dict]:
+    """
+    Returns the cached representation of the finished stream, or None if it could
+    not be persisted.
+    """
+    if self.journaled:
+      self.flush()
+      if self.failed:
+        return None
+      return {"data_key": self.data_key, "lengths": _pack(self.lengths),
+              "delays_ms": _pack(self.delays_ms)}
+    if self.failed:
+      return None
+    data = b"".join(self._chunks)
+    try:
+      data = data.decode("utf-8")
+    except UnicodeDecodeError:
+      pass
+    return {"data": data, "lengths": _pack(self.lengths), "delays_ms": _pack(self.delays_ms)}
+
+  def abort(self):
+    """
+    Deletes the data appended for an unfinished stream.
+    """
+    if not self.journaled:
+      return
+    self.journaled = False
+    try:
+      self._cache.delete_from_cache(self.data_key)
+    except Exception as e:
+      logger.error(f"Error deleting stream data from cache: {e}")
+
+
+def stream_data_key(response: Any) -> Optional[str]:
+  """
+  Returns the data key of an incrementally persisted stream, if any.
+  """
+  return response.get("data_key") if isinstance(response, dict) else None
+
+
+def is_stream_data_key(key: str) -> bool:
+  """
+  Returns whether a cache key is the data key of an incrementally persisted stream.
+  """
+  return _DATA_KEY_PATTERN.search(key) is not None
+
+
+def load_stream(response: Any, data: bytes = None,
+                with_delays: bool = False) -> Optional[Tuple[bytes, List[int], List[int]]]:
+  """
+  Decodes a cached stream.
+
+  Args:
+    response (Any): The cached response of a streaming call, in the current format
+      or as the list of chunk strings of earlier releases.
+    data (bytes, optional): The buffer read from the data key of an incrementally
+      persisted stream.
+    with_delays (bool, optional): Whether to decode the recorded chunk delays.
+
+  Returns:
+    Optional[Tuple[bytes, List[int], List[int]]]: The joined buffer, the end offset of
+    every chunk and, if requested and recorded, the delays before them. None if the
+    response is not a stream or its data is incomplete.
+  """
+  if isinstance(response, list):
+    chunks = [chunk.encode("utf-8") for chunk in response]
+    return b"".join(chunks), list(itertools.accumulate(map(len, chunks))), None
+  if not isinstance(response, dict) or "lengths" not in response:
+    return None
+  if data is None:
+    data = _as_bytes(response.get("data"))
+  if isinstance(data, str):
+    data = data.encode("utf-8")
+  ends = list(itertools.accumulate(_unpack(_as_bytes(response["lengths"]))))
+  if data is None or len(data) != (ends[-1] if ends else 0):
+    return None
+  delays_ms = _unpack(_as_bytes(response["delays_ms"])) if with_delays else None
+  return data, ends, delays_ms
+
+
+def iter_chunks(buffer: bytes, ends: List[int]) -> Iterator[bytes]:
+  """
+  Splits a joined buffer back into its chunks.
+  """
+  start = 0
+  for end in ends:
+    yield buffer[start:end]
+    start = end
@@ -0,0 +1,295 @@
+"""
+This module implements the TieredCache class, which layers several LLMCache
+backends on top of each other.
+"""
+from .llm_cache import LLMCache
+from .write_behind import WriteBehindQueue
+from typing import Dict, List, Optional, Tuple
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+WRITE_THROUGH = "write_through"
+WRITE_BEHIND = "write_behind"
+
+
+class TieredCache(LLMCache):
+  """
+  Composes LLMCache backends into a hierarchy of tiers, fastest first.
+
+  Lookups go through the tiers in order and stop at the first hit, which is then
+  copied into the faster tiers above it. Writes always go to the first tier; the
+  lower tiers are written either synchronously (write-through) or by a background
+  thread (write-behind). Hits and misses are counted per tier.
+
+  In write-behind mode each lower tier has a `WriteBehindQueue`, which coalesces
+  pending writes of a key and writes them in batches. Pending writes are flushed by
+  `close`, and at interpreter exit.
+
+  Example:
+    llm_cache = TieredCache([MemoryCache(max_bytes=256 * 1024 * 1024),
+                             FirestoreCache(collection_name, firestore_service_account_file)])
+  """
+  def __init__(self, tiers: List[LLMCache],
+               write_policy: str = WRITE_THROUGH,
+               promote_on_hit: bool = True,
+               write_behind_queue_size: int = 10000,
+               **kwargs):
+    """
+    Args:
+      tiers (List[LLMCache]): The backends, ordered from fastest to slowest.
+      write_policy (str, optional): Either "write_through" or "write_behind".
+      promote_on_hit (bool, optional): Whether hits in a lower tier are copied
+        into the tiers above it.
+      write_behind_queue_size (int, optional): Maximum number of pending writes per
+        lower tier in write-behind mode. Writers block when a queue is full.
+      **kwargs: Options passed to LLMCache.
+
+    Raises:
+      ValueError: If no tiers are given or the write policy is unknown.
+    """
+    if not tiers:
+      raise ValueError("TieredCache requires at least one tier.")
+    if write_policy not in (WRITE_THROUGH, WRITE_BEHIND):
+      raise ValueError(f"Unknown write policy: {write_policy}.")
+    super().__init__(**kwargs)
+    self.tiers = list(tiers)
+    self.write_policy = write_policy
+    self.promote_on_hit = promote_on_hit
+    self._hits = [0] * len(self.tiers)
+    self._misses = [0] * len(self.tiers)
+    self._write_errors = 0
+    self._stats_lock = threading.Lock()
+    self._queues = None
+    if write_policy == WRITE_BEHIND:
+      self._queues = []
+      for tier in self.tiers[1:]:
+        tier_queue = WriteBehindQueue(max_pending=write_behind_queue_size)
+        tier_queue.attach(tier)
+        self._queues.append(tier_queue)
+
+  @property
+  def supports_binary_values(self) -> bool:
+    """
+    Binary values are stored as is only if every tier supports them.
+    """
+    return all(tier.supports_binary_values for tier in self.tiers)
+
+  @property
+  def supports_delete(self) -> bool:
+    """
+    Deletes remove keys from every tier, so every tier must support them.
+    """
+    return all(tier.supports_delete for tier in self.tiers)
+
+  @property
+  def supports_scan(self) -> bool:
+    """
+    Scans list the last tier, which holds every entry written through the cache.
+    """
+    return self.tiers[-1].supports_scan
+
+  def delete_from_cache(self, key: str) -> bool:
+    """
+    Removes a key from every tier.
+
+    Args:
+      key (str): The key to remove.
+
+    Returns:
+      bool: True if the last tier held the key.
+    """
+    return self.delete_many_from_cache([key]) > 0
+
+  def delete_many_from_cache(self, keys: List[str]) -> int:
+    """
+    Removes several keys from every tier. Pending write-behind writes are flushed
+    first, so they cannot restore the keys afterwards.
+
+    Args:
+      keys (List[str]): The keys to remove.
+
+    Returns:
+      int: The number of keys removed from the last tier.
+    """
+    self.flush()
+    for tier in self.tiers[:-1]:
+      tier.delete_many_from_cache(keys)
+    return self.tiers[-1].delete_many_from_cache(keys)
+
+  def scan_cache(self, cursor: str = None, prefix: str = "",
+                 limit: int = 1000) -> Tuple[List[tuple], Optional[str]]:
+    """
+    Returns a page of the entries of the last tier whose key starts with prefix.
+    Entries still queued for the lower tiers by the write-behind thread are not listed.
+
+    Args:
+      cursor (str, optional): The cursor returned with the previous page, or None for
+        the first page.
+      prefix (str, optional): The prefix of the listed keys.
+      limit (int, optional): Maximum number of entries of the page.
+
+    Returns:
+      List[tuple]: The (key, value, metadata) entries of the page.
+      Optional[str]: The cursor of the next page, or None if this is the last page.
+    """
+    return self.tiers[-1].scan_cache(cursor=cursor, prefix=prefix, limit=limit)
+
+  def get_from_cache(self, key: str) -> str:
+    """
+    Returns the value from the first tier holding the key.
+
+    Args:
+      key (str): The key for which the value needs to be retrieved.
+
+    Returns:
+      str: The value, or an empty string if no tier holds the key.
+    """
+    for i, tier in enumerate(self.tiers):
+      value = tier.get_from_cache(key)
+      if value:
+        with self._stats_lock:
+          self._hits[i] += 1
+        if self.promote_on_hit:
+          for upper_tier in self.tiers[:i]:
+            self._write_tier(upper_tier, key, value)
+        return value
+      with self._stats_lock:
+        self._misses[i] += 1
+    return ""
+
+  def add_to_cache(self, key: str, value: str) -> bool:
+    """
+    Writes a key-value pair to the first tier and, depending on the write policy,
+    synchronously or asynchronously to the lower tiers.
+
+    Args:
+      key (str): The key under which the value should be stored.
+      value (str): The value to store.
+
+    Returns:
+      bool: True if the first tier accepted the value.
+    """
+    result = self.tiers[0].add_to_cache(key, value)
+    if self._queues is not None:
+      for tier_queue in self._queues:
+        tier_queue.put(key, value)
+      return result
+    for tier in self.tiers[1:]:
+      result = tier.add_to_cache(key, value) and result
+    return result
+
+  def get_many_from_cache(self, keys: List[str]) -> List[str]:
+    """
+    Resolves several keys tier by tier, asking each tier only for the keys
+    not found in the tiers above it.
+
+    Args:
+      keys (List[str]): The keys for which the values need to be retrieved.
+
+    Returns:
+      List[str]: The value of each key, in the order of keys. Keys found in no tier
+      map to an empty string.
+    """
+    found = {}
+    remaining = list(dict.fromkeys(keys))
+    for i, tier in enumerate(self.tiers):
+      if not remaining:
+        break
+      values = tier.get_many_from_cache(remaining)
+      tier_found = {key: value for key, value in zip(remaining, values) if value}
+      with self._stats_lock:
+        self._hits[i] += len(tier_found)
+        self._misses[i] += len(remaining) - len(tier_found)
+      if tier_found and self.promote_on_hit:
+        for upper_tier in self.tiers[:i]:
+          self._write_tier_many(upper_tier, tier_found)
+      found.update(tier_found)
+      remaining = [key for key in remaining if key not in tier_found]
+    return [found.get(key, "") for key in keys]
+
+  def add_many_to_cache(self, items: Dict[str, str]) -> bool:
+    """
+    Writes several key-value pairs to the first tier and, depending on the write
+    policy, synchronously or asynchronously to the lower tiers.
+
+    Args:
+      items (Dict[str, str]): The values to store, keyed by cache key.
+
+    Returns:
+      bool: True if the first tier accepted the values.
+    """
+    result = self.tiers[0].add_many_to_cache(items)
+    if self._queues is not None:
+      for tier_queue in self._queues:
+        for key, value in items.items():
+          tier_queue.put(key, value)
+      return result
+    for tier in self.tiers[1:]:
+      result = tier.add_many_to_cache(items) and result
+    return result
+
+  def _write_tier_many(self, tier: LLMCache, items: Dict[str, str]):
+    """
+    Writes several values to a tier, logging and counting failures instead of raising them.
+    """
+    try:
+      tier.add_many_to_cache(items)
+    except Exception as e:
+      with self._stats_lock:
+        self._write_errors += 1
+      logger.error(f"Error writing to cache tier {type(tier).__name__}: {e}")
+
+  def _write_tier(self, tier: LLMCache, key: str, value: str):
+    """
+    Writes to a tier, logging and counting failures instead of raising them.
+    """
+    try:
+      tier.add_to_cache(key, value)
+    except Exception as e:
+      with self._stats_lock:
+        self._write_errors += 1
+      logger.error(f"Error writing to cache tier {type(tier).__name__}: {e}")
+
+  def flush(self):
+    """
+    Blocks until every pending write-behind write has been attempted.
+    """
+    for tier_queue in self._queues or []:
+      tier_queue.flush()
+
+  def close(self):
+    """
+    Flushes the pending write-behind writes and stops their threads. Writes made
+    after closing are written synchronously.
+    """
+    for tier_queue in self._queues or []:
+      tier_queue.close()
+
+  def stats(self) -> List[dict]:
+    """
+    Returns the hit and miss counters of every tier.
+
+    Returns:
+      List[dict]: One dictionary per tier with its name, hits, misses and hit ratio.
+    """
+    with self._stats_lock:
+      stats = []
+      for i, tier in enumerate(self.tiers):
+        lookups = self._hits[i] + self._misses[i]
+        stats.append({"tier": type(tier).__name__,
+                      "hits": self._hits[i],
+                      "misses": self._misses[i],
+                      "hit_ratio": self._hits[i] / lookups if lookups else 0.0})
+      return stats
+
+  @property
+  def write_errors(self) -> int:
+    """
+    Number of failed promotion writes and write-behind batches.
+    """
+    with self._stats_lock:
+      write_errors = self._write_errors
+    return write_errors + sum(tier_queue.stats()["failed_batches"]
+                              for tier_queue in self._queues or [])
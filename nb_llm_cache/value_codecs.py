@@ -0,0 +1,216 @@
+"""
+This module implements the value codecs, which encode the entries stored by LLMCache
+backends.
+"""
+from .cache_keys import json_default
+from typing import Any, Union
+import base64
+import json
+import struct
+import zlib
+
+try:
+  import msgpack
+except ImportError:
+  msgpack = None
+
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
+# 0xC1 never occurs in UTF-8 text, so binary values cannot be mistaken for text values.
+BINARY_MAGIC = b"\xc1NB"
+TEXT_PREFIX = "nbv:"
+_FORMAT_VERSION = 1
+# magic, format version, serializer, compression
+_HEADER = struct.Struct("<3sBBB")
+
+_SERIALIZER_JSON = 0
+_SERIALIZER_MSGPACK = 1
+_SERIALIZERS = {"json": _SERIALIZER_JSON, "msgpack": _SERIALIZER_MSGPACK}
+
+_COMPRESSION_NONE = 0
+_COMPRESSION_ZLIB = 1
+_COMPRESSION_ZSTD = 2
+_COMPRESSIONS = {None: _COMPRESSION_NONE, "zlib": _COMPRESSION_ZLIB, "zstd": _COMPRESSION_ZSTD}
+
+
+def is_binary_value(data: bytes) -> bool:
+  """
+  Returns whether stored bytes hold a binary encoded value.
+  """
+  return data[:len(BINARY_MAGIC)] == BINARY_MAGIC
+
+
+def bytes_to_value(data: bytes) -> Union[str, bytes]:
+  """
+  Converts bytes read by a byte-oriented backend back into the stored value:
+  binary encoded values are returned as is and text values are decoded.
+  """
+  return data if is_binary_value(data) else data.decode("utf-8")
+
+
+def value_to_bytes(value: Union[str, bytes]) -> bytes:
+  """
+  Converts a value to the bytes stored by a byte-oriented backend.
+  """
+  return value if isinstance(value, bytes) else value.encode("utf-8")
+
+
+def entry_size(key: str, value: Union[str, bytes]) -> int:
+  """
+  Returns the size of an entry in bytes: the UTF-8 length of its key and text value,
+  or the length of its bytes value.
+  """
+  return len(key.encode("utf-8")) + len(value_to_bytes(value))
+
+
+def to_text(value: Union[str, bytes]) -> str:
+  """
+  Converts a value to text for backends that only store strings, wrapping binary
+  encoded values in base64.
+  """
+  if isinstance(value, str):
+    return value
+  return TEXT_PREFIX + base64.b64encode(value).decode("ascii")
+
+
+class JsonCodec:
+  """
+  Encodes entries as JSON text, the format of earlier releases.
+  """
+  def encode(self, payload: dict) -> Union[str, bytes]:
+    """
+    Encodes an entry.
+
+    Args:
+      payload (dict): The entry, holding the response and its metadata.
+
+    Returns:
+      Union[str, bytes]: The encoded entry.
+    """
+    return json.dumps(payload, default=json_default)
+
+  def decode(self, value: Union[str, bytes]) -> dict:
+    """
+    Decodes an entry written by any codec.
+
+    Args:
+      value (Union[str, bytes]): The encoded entry.
+
+    Returns:
+      dict: The entry.
+    """
+    return decode_value(value)
+
+
+class BinaryCodec(JsonCodec):
+  """
+  Encodes entries as a versioned binary header followed by a MessagePack (or compact
+  JSON) body, compressed with zlib or zstd when it exceeds a size threshold.
+
+  The header records the serializer and compression of every entry, so entries
+  written with other settings, and JSON entries of earlier releases, stay readable.
+  """
+  def __init__(self, serializer: str = None, compression: str = "zlib",
+               compression_threshold: int = 1024, compression_level: int = None):
+    """
+    Args:
+      serializer (str, optional): "msgpack" or "json". Defaults to "msgpack" when the
+        msgpack package is installed and "json" otherwise.
+      compression (str, optional): "zlib", "zstd" or None. The zstd option requires
+        the zstandard package.
+      compression_threshold (int, optional): Minimum body size in bytes for compression.
+      compression_level (int, optional): Compression level, defaulting to the
+        library's default.
+
+    Raises:
+      ValueError: If the serializer or compression is unknown or its package is not installed.
+    """
+    if serializer is None:
+      serializer = "msgpack" if msgpack is not None else "json"
+    if serializer not in _SERIALIZERS:
+      raise ValueError(f"Unknown serializer: {serializer}.")
+    if serializer == "msgpack" and msgpack is None:
+      raise ValueError("The msgpack serializer requires the msgpack package: pip install msgpack")
+    if compression not in _COMPRESSIONS:
+      raise ValueError(f"Unknown compression: {compression}.")
+    if compression == "zstd" and zstandard is None:
+      raise ValueError("The zstd compression requires the zstandard package: pip install zstandard")
+    self.serializer = serializer
+    self.compression = compression
+    self.compression_threshold = compression_threshold
+    self.compression_level = compression_level
+
+  def encode(self, payload: dict) -> bytes:
+    """
+    Encodes an entry.
+
+    Args:
+      payload (dict): The entry, holding the response and its metadata.
+
+    Returns:
+      bytes: The encoded entry.
+    """
+    if self.serializer == "msgpack":
+      body = msgpack.packb(payload, default=json_default, use_bin_type=True)
+    else:
+      body = json.dumps(payload, separators=(",", ":"), default=json_default).encode("utf-8")
+    compression = _COMPRESSION_NONE
+    if self.compression is not None and len(body) >= self.compression_threshold:
+      compression = _COMPRESSIONS[self.compression]
+      body = _compress(body, compression, self.compression_level)
+    return _HEADER.pack(BINARY_MAGIC, _FORMAT_VERSION, _SERIALIZERS[self.serializer],
+                        compression) + body
+
+
+def _compress(body: bytes, compression: int, level: int) -> bytes:
+  if compression == _COMPRESSION_ZLIB:
+    return zlib.compress(body, -1 if level is None else level)
+  return zstandard.ZstdCompressor(level=3 if level is None else level).compress(body)
+
+
+def _decompress(body: bytes, compression: int) -> bytes:
+  if compression == _COMPRESSION_NONE:
+    return body
+  if compression == _COMPRESSION_ZLIB:
+    return zlib.decompress(body)
+  if compression == _COMPRESSION_ZSTD:
+    if zstandard is None:
+      raise ValueError("Decoding zstd entries requires the zstandard package.")
+    return zstandard.ZstdDecompressor().decompress(body)
+  raise ValueError(f"Unknown compression id: {compression}.")
+
+
+def decode_value(value: Union[str, bytes]) -> Any:
+  """
+  Decodes an entry in any of the supported formats: binary encoded bytes, base64
+  wrapped binary text, or JSON text.
+
+  Args:
+    value (Union[str, bytes]): The encoded entry.
+
+  Returns:
+    Any: The entry.
+
+  Raises:
+    ValueError: If the entry uses an unsupported format version or a serializer or
+      compression whose package is not installed.
+  """
+  if isinstance(value, str):
+    if not value.startswith(TEXT_PREFIX):
+      return json.loads(value)
+    value = base64.b64decode(value[len(TEXT_PREFIX):])
+  value = bytes(value)
+  if not is_binary_value(value):
+    return json.loads(value.decode("utf-8"))
+  _, version, serializer, compression = _HEADER.unpack_from(value)
+  if version != _FORMAT_VERSION:
+    raise ValueError(f"Unsupported value format version: {version}.")
+  body = _decompress(value[_HEADER.size:], compression)
+  if serializer == _SERIALIZER_MSGPACK:
+    if msgpack is None:
+      raise ValueError("Decoding msgpack entries requires the msgpack package.")
+    return msgpack.unpackb(body, raw=False)
+  return json.loads(body.decode("utf-8"))
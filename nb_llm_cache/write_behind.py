@@ -0,0 +1,242 @@
+"""
+This module implements the WriteBehindQueue class, which persists cache entries
+in the background so that misses return as soon as the function responds.
+"""
+from collections import OrderedDict
+from typing import Any, Union
+import atexit
+import logging
+import threading
+import time
+import weakref
+from .metrics import BACKEND_SET, SET_ERRORS
+
+logger = logging.getLogger(__name__)
+
+BLOCK = "block"
+DROP = "drop"
+WRITE_THROUGH = "write_through"
+
+
+class WriteBehindQueue:
+  """
+  A bounded queue of pending cache writes drained by a background thread.
+
+  Writes to a key that is still pending replace the pending value, and the thread
+  writes pending entries in batches with `add_many_to_cache`. Pending and in-flight
+  entries are visible to lookups, so a miss stored through the queue is a hit for the
+  next call even before it reaches the backend. Failed batches are retried and then
+  dropped and counted; they are never raised to the caller.
+
+  When max_pending entries are pending, the backpressure policy applies: "block" waits
+  for room (up to block_timeout), "drop" discards the new write, and "write_through"
+  writes it synchronously in the caller.
+
+  Pending writes are flushed by `close`, and at interpreter exit.
+  """
+  def __init__(self, max_pending: int = 10000,
+               batch_size: int = 500,
+               backpressure: str = BLOCK,
+               block_timeout: float = None,
+               max_retries: int = 3,
+               retry_interval: float = 0.5):
+    """
+    Args:
+      max_pending (int, optional): Maximum number of pending entries.
+      batch_size (int, optional): Maximum number of entries per backend write.
+      backpressure (str, optional): One of "block", "drop" or "write_through".
+      block_timeout (float, optional): Maximum time in seconds a write waits for room
+        with the "block" policy before it is dropped. None waits indefinitely.
+      max_retries (int, optional): Number of retries of a failed batch.
+      retry_interval (float, optional): Wait in seconds before the first retry,
+        doubled for each further retry.
+
+    Raises:
+      ValueError: If the backpressure policy is unknown.
+    """
+    if backpressure not in (BLOCK, DROP, WRITE_THROUGH):
+      raise ValueError(f"Unknown backpressure policy: {backpressure}.")
+    self.max_pending = max_pending
+    self.batch_size = batch_size
+    self.backpressure = backpressure
+    self.block_timeout = block_timeout
+    self.max_retries = max_retries
+    self.retry_interval = retry_interval
+    self._cache = None
+    self._pending = OrderedDict()
+    self._in_flight = {}
+    self._condition = threading.Condition()
+    self._closed = False
+    self._thread = None
+    self._enqueued = 0
+    self._coalesced = 0
+    self._written = 0
+    self._batches = 0
+    self._failed = 0
+    self._failed_batches = 0
+    self._dropped = 0
+    self._last_error = None
+
+  def attach(self, cache: Any):
+    """
+    Binds the queue to the cache it writes to and starts the background thread.
+
+    Args:
+      cache (LLMCache): The cache whose backend receives the writes.
+    """
+    self._cache = cache
+    self._thread = threading.Thread(target=self._run, name="WriteBehindQueue", daemon=True)
+    self._thread.start()
+    queue_ref = weakref.ref(self)
+    atexit.register(lambda: queue_ref() is not None and queue_ref().close())
+
+  def put(self, key: str, value: Union[str, bytes], func_name: str = None,
+          block: bool = True, ttl: float = None) -> bool:
+    """
+    Queues a write.
+
+    Args:
+      key (str): The key under which the value should be stored.
+      value (Union[str, bytes]): The value to store.
+      func_name (str, optional): The name of the cached function.
+      block (bool, optional): Whether the "block" policy may wait for room. If False and
+        the queue is full, nothing is queued and False is returned.
+      ttl (float, optional): Time-to-live in seconds, passed to backends that expire
+        entries natively.
+
+    Returns:
+      bool: True if the write was queued or written, False if it was not.
+    """
+    with self._condition:
+      if not self._closed:
+        if key in self._pending:
+          self._pending[key] = (value, func_name, ttl)
+          self._coalesced += 1
+          return True
+        if len(self._pending) >= self.max_pending:
+          if self.backpressure == DROP:
+            self._dropped += 1
+            logger.warning(f"Dropped cache write for key {key}: write-behind queue is full.")
+            return False
+          if self.backpressure == BLOCK:
+            if not block:
+              return False
+            if not self._condition.wait_for(
+                lambda: len(self._pending) < self.max_pending or self._closed,
+                timeout=self.block_timeout):
+              self._dropped += 1
+              logger.warning(f"Dropped cache write for key {key}: write-behind queue is full.")
+              return False
+        if not self._closed and len(self._pending) < self.max_pending:
+          self._pending[key] = (value, func_name, ttl)
+          self._enqueued += 1
+          self._condition.notify_all()
+          return True
+    self._write_batch({key: (value, func_name, ttl)}, retries=0)
+    return True
+
+  def get(self, key: str) -> Union[str, bytes, None]:
+    """
+    Returns the value of a pending or in-flight write of the key, if any.
+    """
+    with self._condition:
+      entry = self._pending.get(key) or self._in_flight.get(key)
+      return entry[0] if entry is not None else None
+
+  def _run(self):
+    while True:
+      with self._condition:
+        self._condition.wait_for(lambda: self._pending or self._closed)
+        if not self._pending:
+          return
+        batch = {}
+        while self._pending and len(batch) < self.batch_size:
+          key, entry = self._pending.popitem(last=False)
+          batch[key] = entry
+        self._in_flight.update(batch)
+        self._condition.notify_all()
+      try:
+        self._write_batch(batch, self.max_retries)
+      finally:
+        with self._condition:
+          for key in batch:
+            self._in_flight.pop(key, None)
+          self._condition.notify_all()
+
+  def _write_batch(self, batch: dict, retries: int):
+    """
+    Writes a batch, grouped by function name and time-to-live, retrying failed groups.
+    Failures are logged and counted.
+    """
+    groups = {}
+    for key, (value, func_name, ttl) in batch.items():
+      groups.setdefault((func_name, ttl), {})[key] = value
+    metrics = self._cache._metrics
+    for (func_name, ttl), items in groups.items():
+      for attempt in range(retries + 1):
+        started = metrics.now() if metrics is not None else 0
+        try:
+          self._cache.add_many_to_cache(items, **self._cache._write_options(func_name, ttl))
+          if metrics is not None:
+            metrics.record(BACKEND_SET, func_name, started)
+          with self._condition:
+            self._written += len(items)
+            self._batches += 1
+          break
+        except Exception as e:
+          if attempt < retries:
+            time.sleep(self.retry_interval * 2 ** attempt)
+            continue
+          with self._condition:
+            self._failed += len(items)
+            self._failed_batches += 1
+            self._last_error = repr(e)
+          if metrics is not None:
+            metrics.count(SET_ERRORS, func_name, len(items))
+          logger.error(f"Error writing {len(items)} entries to cache: {e}")
+
+  def flush(self, timeout: float = None) -> bool:
+    """
+    Blocks until every queued write has been attempted.
+
+    Args:
+      timeout (float, optional): Maximum time to wait in seconds.
+
+    Returns:
+      bool: True if the queue was drained, False on timeout.
+    """
+    with self._condition:
+      return self._condition.wait_for(lambda: not self._pending and not self._in_flight,
+                                      timeout=timeout)
+
+  def close(self, timeout: float = None):
+    """
+    Flushes the pending writes and stops the background thread. Writes queued after
+    closing are written synchronously.
+
+    Args:
+      timeout (float, optional): Maximum time to wait for the flush in seconds.
+    """
+    with self._condition:
+      if self._closed:
+        return
+      self._closed = True
+      self._condition.notify_all()
+    if self._thread is not None:
+      self._thread.join(timeout)
+
+  def stats(self) -> dict:
+    """
+    Returns the queue depth and the write counters.
+    """
+    with self._condition:
+      return {"pending": len(self._pending),
+              "in_flight": len(self._in_flight),
+              "enqueued": self._enqueued,
+              "coalesced": self._coalesced,
+              "written": self._written,
+              "batches": self._batches,
+              "failed": self._failed,
+              "failed_batches": self._failed_batches,
+              "dropped": self._dropped,
+              "last_error": self._last_error}
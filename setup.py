@@ -14,6 +14,10 @@ setup(
     'google-cloud==0.34.0',
     'google-auth==2.27.0',
   ],
+  entry_points={
+    'console_scripts': ['nb-llm-cache-migrate=nb_llm_cache.migration:main',
+                        'nb-llm-cache-server=nb_llm_cache.cache_server:main'],
+  },
   python_requires='>=3.6',
   classifiers=[
     'Programming Language :: Python :: 3',